@@ -0,0 +1,51 @@
+"""Fixtures shared by the benchmark suite.
+
+Run the benchmarks with `pytest benchmarks`. They never touch live services.
+"""
+
+import http.server
+import json
+import threading
+import typing as t
+
+import pytest
+
+
+class _StubOpenAIHandler(http.server.BaseHTTPRequestHandler):
+    # HTTP/1.1 so that clients can keep connections alive between requests.
+    protocol_version = "HTTP/1.1"
+    # Write each response in one segment to keep delayed ACKs out of the numbers.
+    wbufsize = -1
+    disable_nagle_algorithm = True
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        payload = json.dumps(
+            {
+                "id": "msg_stub",
+                "object": "thread.message",
+                "role": body.get("role", "user"),
+                "content": [],
+                "thread_id": self.path.split("/")[-2],
+            }
+        ).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def log_message(self, format: str, *args: t.Any) -> None:
+        pass
+
+
+@pytest.fixture(scope="session")
+def stub_openai_url() -> t.Iterator[str]:
+    """Base URL of a local HTTP server that answers like the OpenAI API."""
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), _StubOpenAIHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}/v1"
+    server.shutdown()
+    server.server_close()
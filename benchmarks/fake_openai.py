@@ -0,0 +1,401 @@
+"""A local stand-in for the OpenAI API, for the end-to-end benchmarks.
+
+It answers the Assistants endpoints the app uses, streaming runs as server-sent
+events at a configurable token rate, as well as chat completions and
+embeddings. Runs either answer directly or first call a tool with the user's
+message as its query. The server runs in its own process, so that its threads
+do not compete with the app for the GIL.
+"""
+
+import base64
+import contextlib
+import dataclasses
+import hashlib
+import http.server
+import itertools
+import json
+import multiprocessing
+import re
+import threading
+import time
+import typing as t
+
+import numpy as np
+
+EMBEDDING_DIMENSIONS = 256
+
+
+@dataclasses.dataclass(frozen=True)
+class FakeOpenAIConfig:
+    """How the fake API behaves.
+
+    Attributes:
+        run_start_seconds: Delay before the first event of a run stream.
+        token_seconds: Delay between two streamed tokens.
+        answer_tokens: Tokens in every streamed answer.
+        tool_name: The tool every run calls before answering, if any.
+        request_seconds: Delay of the other requests.
+    """
+
+    run_start_seconds: float = 0.2
+    token_seconds: float = 0.01
+    answer_tokens: int = 50
+    tool_name: str | None = None
+    request_seconds: float = 0.02
+
+
+def embed(text: str) -> np.ndarray:
+    """A bag of hashed words, so that texts sharing words are similar."""
+    vector = np.zeros(EMBEDDING_DIMENSIONS, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        digest = hashlib.blake2b(word.encode(), digest_size=4).digest()
+        vector[int.from_bytes(digest, "little") % EMBEDDING_DIMENSIONS] += 1
+    norm = np.linalg.norm(vector)
+    return vector / norm if norm else vector + 1 / np.sqrt(EMBEDDING_DIMENSIONS)
+
+
+def _run(run_id: str, thread_id: str, status: str, **fields: t.Any) -> dict:
+    return {
+        "id": run_id,
+        "object": "thread.run",
+        "created_at": int(time.time()),
+        "assistant_id": "asst_fake",
+        "thread_id": thread_id,
+        "status": status,
+        "model": "gpt-4o-mini",
+        "instructions": "",
+        "tools": [],
+        "metadata": {},
+        "parallel_tool_calls": True,
+        "required_action": None,
+        "usage": None,
+        **fields,
+    }
+
+
+def _message(message_id: str, thread_id: str, role: str, text: str | None) -> dict:
+    content = []
+    if text is not None:
+        content = [{"type": "text", "text": {"value": text, "annotations": []}}]
+    return {
+        "id": message_id,
+        "object": "thread.message",
+        "created_at": int(time.time()),
+        "thread_id": thread_id,
+        "role": role,
+        "content": content,
+        "status": "completed" if text is not None else "in_progress",
+        "attachments": [],
+        "metadata": {},
+    }
+
+
+def _run_step(step_id: str, run_id: str, thread_id: str, details: dict) -> dict:
+    return {
+        "id": step_id,
+        "object": "thread.run.step",
+        "created_at": int(time.time()),
+        "assistant_id": "asst_fake",
+        "run_id": run_id,
+        "thread_id": thread_id,
+        "status": "in_progress",
+        "type": details["type"],
+        "step_details": details,
+    }
+
+
+class _State:
+    """What the server remembers between requests."""
+
+    def __init__(self, config: FakeOpenAIConfig) -> None:
+        self.config = config
+        self.ids = itertools.count()
+        self.last_user_message: dict[str, str] = {}
+        self.lock = threading.Lock()
+
+    def new_id(self, prefix: str) -> str:
+        with self.lock:
+            return f"{prefix}_{next(self.ids)}"
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    disable_nagle_algorithm = True
+    state: _State
+
+    def log_message(self, format: str, *args: t.Any) -> None:
+        pass
+
+    def _send_json(self, payload: dict) -> None:
+        time.sleep(self.state.config.request_seconds)
+        body = json.dumps(payload).encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _start_stream(self) -> None:
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+
+    def _write_chunk(self, data: bytes) -> None:
+        self.wfile.write(b"%x\r\n%s\r\n" % (len(data), data))
+
+    def _event(self, event: str | None, data: dict | str) -> None:
+        payload = data if isinstance(data, str) else json.dumps(data)
+        line = f"data: {payload}\n\n"
+        if event is not None:
+            line = f"event: {event}\n{line}"
+        self._write_chunk(line.encode())
+
+    def _end_stream(self) -> None:
+        self._write_chunk(b"")
+
+    def do_GET(self) -> None:
+        self._send_json({"id": self.path.rsplit("/", 1)[-1], "object": "unknown"})
+
+    def do_POST(self) -> None:
+        length = int(self.headers.get("Content-Length", 0))
+        body = json.loads(self.rfile.read(length) or b"{}")
+        path = self.path.split("?")[0].removeprefix("/v1")
+        parts = path.strip("/").split("/")
+        match parts:
+            case ["assistants"] | ["assistants", _]:
+                self._send_json(
+                    {
+                        "id": parts[1] if len(parts) > 1 else "asst_fake",
+                        "object": "assistant",
+                        "created_at": int(time.time()),
+                        "model": body.get("model", "gpt-4o-mini"),
+                        "name": body.get("name"),
+                        "instructions": body.get("instructions"),
+                        "tools": [],
+                        "metadata": {},
+                    }
+                )
+            case ["threads"]:
+                self._send_json(
+                    {
+                        "id": self.state.new_id("thread"),
+                        "object": "thread",
+                        "created_at": int(time.time()),
+                        "metadata": {},
+                    }
+                )
+            case ["threads", thread_id, "messages"]:
+                content = body.get("content", "")
+                self.state.last_user_message[thread_id] = content
+                self._send_json(
+                    _message(self.state.new_id("msg"), thread_id, "user", content)
+                )
+            case ["threads", thread_id, "runs"]:
+                self._stream_run(thread_id)
+            case ["threads", thread_id, "runs", run_id, "submit_tool_outputs"]:
+                self._stream_tool_outputs(thread_id, run_id)
+            case ["chat", "completions"]:
+                self._complete(body)
+            case ["embeddings"]:
+                self._embed(body)
+            case _:
+                self.send_error(404)
+
+    def _stream_answer(self, thread_id: str, run_id: str) -> None:
+        config = self.state.config
+        message_id = self.state.new_id("msg")
+        self._event(
+            "thread.message.created", _message(message_id, thread_id, "assistant", None)
+        )
+        tokens = []
+        for i in range(config.answer_tokens):
+            time.sleep(config.token_seconds)
+            tokens.append(f"token{i} ")
+            self._event(
+                "thread.message.delta",
+                {
+                    "id": message_id,
+                    "object": "thread.message.delta",
+                    "delta": {
+                        "content": [
+                            {
+                                "index": 0,
+                                "type": "text",
+                                "text": {"value": tokens[-1], "annotations": []},
+                            }
+                        ]
+                    },
+                },
+            )
+        self._event(
+            "thread.message.completed",
+            _message(message_id, thread_id, "assistant", "".join(tokens)),
+        )
+        usage = {
+            "prompt_tokens": 1000,
+            "completion_tokens": config.answer_tokens,
+            "total_tokens": 1000 + config.answer_tokens,
+        }
+        self._event(
+            "thread.run.completed",
+            _run(run_id, thread_id, "completed", usage=usage),
+        )
+        self._event("done", "[DONE]")
+        self._end_stream()
+
+    def _stream_run(self, thread_id: str) -> None:
+        config = self.state.config
+        run_id = self.state.new_id("run")
+        self._start_stream()
+        time.sleep(config.run_start_seconds)
+        self._event("thread.run.created", _run(run_id, thread_id, "queued"))
+        self._event("thread.run.in_progress", _run(run_id, thread_id, "in_progress"))
+        if config.tool_name is None:
+            self._stream_answer(thread_id, run_id)
+            return
+        call_id = self.state.new_id("call")
+        step_id = self.state.new_id("step")
+        arguments = json.dumps(
+            {"query": self.state.last_user_message.get(thread_id, "")}
+        )
+        function = {"name": config.tool_name, "arguments": arguments, "output": None}
+        self._event(
+            "thread.run.step.created",
+            _run_step(
+                step_id, run_id, thread_id, {"type": "tool_calls", "tool_calls": []}
+            ),
+        )
+        self._event(
+            "thread.run.step.delta",
+            {
+                "id": step_id,
+                "object": "thread.run.step.delta",
+                "delta": {
+                    "step_details": {
+                        "type": "tool_calls",
+                        "tool_calls": [
+                            {
+                                "index": 0,
+                                "id": call_id,
+                                "type": "function",
+                                "function": function,
+                            }
+                        ],
+                    }
+                },
+            },
+        )
+        tool_call = {"id": call_id, "type": "function", "function": function}
+        self._event(
+            "thread.run.requires_action",
+            _run(
+                run_id,
+                thread_id,
+                "requires_action",
+                required_action={
+                    "type": "submit_tool_outputs",
+                    "submit_tool_outputs": {"tool_calls": [tool_call]},
+                },
+            ),
+        )
+        self._event("done", "[DONE]")
+        self._end_stream()
+
+    def _stream_tool_outputs(self, thread_id: str, run_id: str) -> None:
+        self._start_stream()
+        time.sleep(self.state.config.run_start_seconds)
+        self._event("thread.run.in_progress", _run(run_id, thread_id, "in_progress"))
+        self._stream_answer(thread_id, run_id)
+
+    def _complete(self, body: dict) -> None:
+        config = self.state.config
+        completion_id = self.state.new_id("chatcmpl")
+        tokens = [f"word{i} " for i in range(config.answer_tokens)]
+        if not body.get("stream"):
+            time.sleep(config.token_seconds * len(tokens))
+            self._send_json(
+                {
+                    "id": completion_id,
+                    "object": "chat.completion",
+                    "created": int(time.time()),
+                    "model": body["model"],
+                    "choices": [
+                        {
+                            "index": 0,
+                            "message": {
+                                "role": "assistant",
+                                "content": "".join(tokens),
+                            },
+                            "finish_reason": "stop",
+                        }
+                    ],
+                }
+            )
+            return
+        self._start_stream()
+        time.sleep(config.run_start_seconds)
+        for i, token in enumerate([*tokens, None]):
+            time.sleep(config.token_seconds)
+            delta = {"content": token} if token is not None else {}
+            if i == 0:
+                delta["role"] = "assistant"
+            chunk = {
+                "id": completion_id,
+                "object": "chat.completion.chunk",
+                "created": int(time.time()),
+                "model": body["model"],
+                "choices": [
+                    {
+                        "index": 0,
+                        "delta": delta,
+                        "finish_reason": None if token is not None else "stop",
+                    }
+                ],
+            }
+            self._event(None, chunk)
+        self._event(None, "[DONE]")
+        self._end_stream()
+
+    def _embed(self, body: dict) -> None:
+        inputs = body["input"]
+        inputs = [inputs] if isinstance(inputs, str) else inputs
+        data = []
+        for i, text in enumerate(inputs):
+            vector = embed(text)
+            if body.get("encoding_format") == "base64":
+                embedding: t.Any = base64.b64encode(vector.tobytes()).decode()
+            else:
+                embedding = vector.tolist()
+            data.append({"object": "embedding", "index": i, "embedding": embedding})
+        self._send_json(
+            {
+                "object": "list",
+                "data": data,
+                "model": body["model"],
+                "usage": {"prompt_tokens": 0, "total_tokens": 0},
+            }
+        )
+
+
+def serve(config: FakeOpenAIConfig, ports: t.Any) -> None:
+    """Serve the fake API on a free port, which is put in the `ports` queue."""
+    handler = type("Handler", (_Handler,), {"state": _State(config)})
+    server = http.server.ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    server.daemon_threads = True
+    ports.put(server.server_address[1])
+    server.serve_forever()
+
+
+@contextlib.contextmanager
+def fake_openai_server(config: FakeOpenAIConfig) -> t.Iterator[str]:
+    """Run the fake API in a process, and yield its base URL."""
+    context = multiprocessing.get_context("spawn")
+    ports = context.Queue()
+    process = context.Process(target=serve, args=(config, ports), daemon=True)
+    process.start()
+    try:
+        yield f"http://127.0.0.1:{ports.get(timeout=30)}/v1"
+    finally:
+        process.terminate()
+        process.join()
@@ -0,0 +1,94 @@
+"""Latency of a stream of repeated questions with and without the answer cache.
+
+The tool sleeps for as long as a retrieval plus LLM call might take, and the
+questions follow a Zipf distribution over a small set of phrasings, so that
+popular questions repeat, sometimes reworded.
+"""
+
+import asyncio
+import json
+import typing as t
+
+import numpy as np
+import pytest
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.required_action_function_tool_call import Function
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.answer_cache import AnswerCache
+from copilot.ai.openai_.tool_executor import ToolExecutor
+from copilot.ai.tools import TOOL_REGISTRY
+
+TOOL_SECONDS = 0.02
+TOPICS = 20
+QUESTIONS = 200
+
+
+async def qa_tool(query: t.Annotated[str, "The question."]) -> str:
+    """Answer after a delay that stands in for retrieval and the LLM call."""
+    await asyncio.sleep(TOOL_SECONDS)
+    return f"Answer to {query}"
+
+
+async def _embed(query: str) -> list[float]:
+    # Rewordings of a question about topic i embed close to the unit vector i.
+    topic = int(query.split()[-1])
+    embedding = np.zeros(TOPICS)
+    embedding[topic] = 1.0
+    embedding[(topic + 1) % TOPICS] = 0.1 if query.startswith("tell") else 0.0
+    return embedding.tolist()
+
+
+@pytest.fixture(autouse=True)
+def register_tool(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(TOOL_REGISTRY, qa_tool.__name__, qa_tool)
+
+
+@pytest.fixture
+def tool_calls() -> list[RequiredActionFunctionToolCall]:
+    rng = np.random.default_rng(0)
+    topics = np.minimum(rng.zipf(1.5, QUESTIONS) - 1, TOPICS - 1)
+    phrasings = ["what is topic", "What is topic", "tell me about topic"]
+    return [
+        RequiredActionFunctionToolCall(
+            id=f"call_{i}",
+            type="function",
+            function=Function(
+                name="qa_tool",
+                arguments=json.dumps({"query": f"{rng.choice(phrasings)} {topic}"}),
+            ),
+        )
+        for i, topic in enumerate(topics)
+    ]
+
+
+def _replay(executor: ToolExecutor, tool_calls) -> None:
+    async def replay() -> None:
+        for tool_call in tool_calls:
+            await executor.execute_tool(tool_call)
+
+    asyncio.run(replay())
+
+
+def test_without_cache(benchmark: BenchmarkFixture, tool_calls):
+    executor = ToolExecutor()
+    benchmark.pedantic(_replay, args=(executor, tool_calls), rounds=3)
+    executor.shutdown()
+
+
+def test_with_cache(benchmark: BenchmarkFixture, tool_calls):
+    executor = ToolExecutor()
+
+    def setup():
+        executor.answer_cache = AnswerCache(
+            {"qa_tool": lambda query: "v1"}, embed=_embed
+        )
+        return (executor, tool_calls), {}
+
+    benchmark.pedantic(_replay, setup=setup, rounds=3)
+    stats = executor.answer_cache.stats
+    benchmark.extra_info["hit_rate"] = round(stats.hit_rate, 3)
+    benchmark.extra_info["exact_hits"] = stats.exact_hits
+    benchmark.extra_info["semantic_hits"] = stats.semantic_hits
+    benchmark.extra_info["seconds_saved"] = round(stats.seconds_saved, 3)
+    executor.shutdown()
@@ -0,0 +1,96 @@
+"""Concurrent CSV questions one worker serves within a target p95 latency.
+
+Every session asks `ProfiledPandasQueryEngine` a question at the same time,
+through `ToolExecutor` with its default 8 workers. The LLM answers after
+`LLM_SECONDS`. A synchronous tool calling `query` holds a worker thread while
+it waits for the LLM, so sessions queue behind the pool. An `async def` tool
+calling `aquery` awaits the LLM on the event loop, and only the evaluation of
+the pandas expression briefly takes a thread.
+"""
+
+import asyncio
+import json
+import time
+import typing as t
+
+import numpy as np
+import pandas as pd
+import pytest
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.required_action_function_tool_call import Function
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.dataframes.profile import ProfiledPandasQueryEngine, profile_dataframe
+from copilot.ai.openai_.tool_executor import ToolExecutor
+from copilot.ai.tools import TOOL_REGISTRY
+
+LLM_SECONDS = 0.2
+TARGET_P95_SECONDS = 2 * LLM_SECONDS
+SESSIONS = [8, 32, 128]
+ANSWER = "df['value'].max()"
+
+
+class SlowLLM:
+    def predict(self, prompt: t.Any, **kwargs: t.Any) -> str:
+        time.sleep(LLM_SECONDS)
+        return ANSWER
+
+    async def apredict(self, prompt: t.Any, **kwargs: t.Any) -> str:
+        await asyncio.sleep(LLM_SECONDS)
+        return ANSWER
+
+
+DF = pd.DataFrame({"city": ["Paris", "Lyon"] * 500, "value": range(1000)})
+ENGINE = ProfiledPandasQueryEngine(DF, profile_dataframe(DF), llm=SlowLLM())
+
+
+def sync_csv_tool(query: t.Annotated[str, "The question."]) -> str:
+    """Answer with `query`."""
+    return str(ENGINE.query(query))
+
+
+async def async_csv_tool(query: t.Annotated[str, "The question."]) -> str:
+    """Answer with `aquery`."""
+    return str(await ENGINE.aquery(query))
+
+
+@pytest.fixture(autouse=True)
+def register_tools(monkeypatch: pytest.MonkeyPatch) -> None:
+    for tool in [sync_csv_tool, async_csv_tool]:
+        monkeypatch.setitem(TOOL_REGISTRY, tool.__name__, tool)
+
+
+def _latencies(tool_name: str, sessions: int) -> list[float]:
+    executor = ToolExecutor(max_workers=8)
+
+    async def session(i: int) -> float:
+        tool_call = RequiredActionFunctionToolCall(
+            id=f"call_{i}",
+            type="function",
+            function=Function(
+                name=tool_name, arguments=json.dumps({"query": "Largest value?"})
+            ),
+        )
+        start = time.perf_counter()
+        output = await executor.execute_tool(tool_call)
+        assert output["output"] == "999"
+        return time.perf_counter() - start
+
+    async def main() -> list[float]:
+        return list(await asyncio.gather(*(session(i) for i in range(sessions))))
+
+    try:
+        return asyncio.run(main())
+    finally:
+        executor.shutdown()
+
+
+@pytest.mark.parametrize("sessions", SESSIONS)
+@pytest.mark.parametrize("tool_name", ["sync_csv_tool", "async_csv_tool"])
+def test_concurrent_sessions(benchmark: BenchmarkFixture, tool_name, sessions):
+    latencies = benchmark.pedantic(
+        _latencies, args=(tool_name, sessions), rounds=1, iterations=1
+    )
+    p95 = float(np.percentile(latencies, 95))
+    benchmark.extra_info["p95_seconds"] = round(p95, 3)
+    benchmark.extra_info["within_target"] = p95 <= TARGET_P95_SECONDS
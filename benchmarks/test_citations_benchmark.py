@@ -0,0 +1,64 @@
+"""Latency of resolving the citations of a heavily cited answer.
+
+The answer cites 4 files 15 times. `serial` is what `on_text_done` used to do,
+one `files.retrieve` round trip per citation. The cache resolves each file once,
+concurrently, and later turns from memory.
+"""
+
+import asyncio
+from unittest.mock import MagicMock
+
+from openai.types import FileObject
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.openai_.citations import FileMetadataCache
+
+ROUND_TRIP_SECONDS = 0.05
+CITED_FILE_IDS = [f"file-{i % 4}" for i in range(15)]
+
+
+def _client() -> MagicMock:
+    async def retrieve(file_id: str) -> FileObject:
+        await asyncio.sleep(ROUND_TRIP_SECONDS)
+        return FileObject(
+            id=file_id,
+            bytes=1,
+            created_at=0,
+            filename=f"{file_id}.pdf",
+            object="file",
+            purpose="assistants",
+            status="processed",
+        )
+
+    client = MagicMock()
+    client.files.retrieve = retrieve
+    return client
+
+
+def test_serial(benchmark: BenchmarkFixture):
+    client = _client()
+
+    async def resolve() -> None:
+        for file_id in CITED_FILE_IDS:
+            await client.files.retrieve(file_id)
+
+    benchmark.pedantic(asyncio.run, args=(resolve(),), rounds=1)
+
+
+def test_first_turn(benchmark: BenchmarkFixture):
+    client = _client()
+
+    def resolve() -> None:
+        cache = FileMetadataCache()
+        unique = list(dict.fromkeys(CITED_FILE_IDS))
+        asyncio.run(cache.retrieve_many(client, unique))
+
+    benchmark.pedantic(resolve, rounds=5)
+
+
+def test_cached_turn(benchmark: BenchmarkFixture):
+    client = _client()
+    cache = FileMetadataCache()
+    unique = list(dict.fromkeys(CITED_FILE_IDS))
+    asyncio.run(cache.retrieve_many(client, unique))
+    benchmark(lambda: asyncio.run(cache.retrieve_many(client, unique)))
@@ -0,0 +1,63 @@
+"""Per-turn latency of building clients on every turn vs. the pooled registry.
+
+The stub server speaks plain HTTP, so the numbers leave out the TLS handshake
+that a fresh connection to the real API also pays.
+"""
+
+import asyncio
+import typing as t
+
+import openai
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.client_registry import ClientRegistry
+from copilot.settings import CopilotSettings
+
+ROUNDS = 200
+
+
+@pytest.fixture
+def env(monkeypatch: pytest.MonkeyPatch, stub_openai_url: str) -> None:
+    monkeypatch.setenv("COPILOT_OPENAI_API_KEY", "stub")
+    monkeypatch.setenv("COPILOT_LLAMA_CLOUD_API_KEY", "stub")
+    monkeypatch.setenv("COPILOT_PINECONE_API_KEY", "stub")
+    monkeypatch.setenv("COPILOT_OPENAI_BASE_URL", stub_openai_url)
+
+
+@pytest.fixture
+def loop() -> t.Iterator[asyncio.AbstractEventLoop]:
+    loop = asyncio.new_event_loop()
+    yield loop
+    loop.close()
+
+
+async def _turn(client: openai.AsyncOpenAI) -> None:
+    await client.beta.threads.messages.create(
+        thread_id="thread_stub", role="user", content="hello"
+    )
+
+
+@pytest.mark.usefixtures("env")
+def test_per_turn_clients(benchmark: BenchmarkFixture, loop: asyncio.AbstractEventLoop):
+    """What every chat turn used to do: parse `.env` and build a new client."""
+
+    async def turn() -> None:
+        settings = CopilotSettings()  # type: ignore
+        async with openai.AsyncOpenAI(
+            api_key=settings.openai_api_key, base_url=settings.openai_base_url
+        ) as client:
+            await _turn(client)
+
+    benchmark.pedantic(lambda: loop.run_until_complete(turn()), rounds=ROUNDS)
+
+
+@pytest.mark.usefixtures("env")
+def test_pooled_registry(benchmark: BenchmarkFixture, loop: asyncio.AbstractEventLoop):
+    registry = ClientRegistry(CopilotSettings())  # type: ignore
+
+    async def turn() -> None:
+        await _turn(registry.async_openai_client)
+
+    benchmark.pedantic(lambda: loop.run_until_complete(turn()), rounds=ROUNDS)
+    loop.run_until_complete(registry.aclose())
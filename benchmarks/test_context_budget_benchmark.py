@@ -0,0 +1,62 @@
+"""Prompt context tokens of pdf_qa, with and without the token budget.
+
+The retrieved nodes mimic what `MarkdownElementNodeParser` produces for a
+report with tables: text chunks that overlap by a sentence, table nodes with
+the summary and the whole table, and the summary nodes of the same tables.
+The LLM's time to first token grows with the prompt, so the context tokens are
+what the budget saves, for a few milliseconds of packing.
+"""
+
+import pytest
+from llama_index.core.schema import IndexNode, MetadataMode, NodeWithScore, TextNode
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.retrieval.context_budget import TokenBudgetPostprocessor
+from copilot.ai.tokens import count_tokens
+
+
+@pytest.fixture(scope="module")
+def nodes() -> list[NodeWithScore]:
+    sentences = [
+        f"Finding {i} of the annual report is summarized here." for i in range(40)
+    ]
+    nodes = [
+        NodeWithScore(
+            node=TextNode(text=" ".join(sentences[i : i + 6])), score=1 - i / 100
+        )
+        for i in range(0, 30, 5)
+    ]
+    for t in range(4):
+        summary = f"Table {t} lists the monthly revenue of region {t}."
+        rows = "\n".join(
+            f"| 2024-{m:02d} | region {t} | {m * 1234.5:.1f} | {m * 17} |"
+            for m in range(1, 13)
+            for _ in range(10)
+        )
+        table = TextNode(
+            text=f"{summary}\n| month | region | revenue | orders |\n{rows}",
+            metadata={"table_summary": summary},
+            excluded_llm_metadata_keys=["table_summary"],
+        )
+        nodes.append(NodeWithScore(node=table, score=0.97 - t / 10))
+        nodes.append(
+            NodeWithScore(
+                node=IndexNode(text=summary, index_id=table.node_id),
+                score=0.96 - t / 10,
+            )
+        )
+    return nodes
+
+
+def _tokens(nodes: list[NodeWithScore]) -> int:
+    return sum(count_tokens(n.node.get_content(MetadataMode.LLM)) for n in nodes)
+
+
+@pytest.mark.parametrize("max_tokens", [1000, 3000])
+def test_context_budget(benchmark: BenchmarkFixture, nodes, max_tokens):
+    postprocessor = TokenBudgetPostprocessor(max_tokens=max_tokens)
+    packed = benchmark(postprocessor.postprocess_nodes, nodes)
+    benchmark.extra_info["nodes_before"] = len(nodes)
+    benchmark.extra_info["nodes_after"] = len(packed)
+    benchmark.extra_info["tokens_before"] = _tokens(nodes)
+    benchmark.extra_info["tokens_after"] = _tokens(packed)
@@ -0,0 +1,94 @@
+"""Peak memory of answering a CSV question in memory and out of core.
+
+Each run answers the same aggregate question in a fresh subprocess, so the peak
+RSS it reports belongs to that run alone. The out-of-core peak should stay
+roughly flat as the file grows, while the in-memory peak grows with it.
+"""
+
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+MEMORY_LIMIT = 64 << 20
+
+
+@pytest.fixture(scope="module", params=[250_000, 1_000_000, 2_000_000])
+def csv_path(request, tmp_path_factory: pytest.TempPathFactory) -> Path:
+    rows = request.param
+    rng = np.random.default_rng(0)
+    csv_path = tmp_path_factory.mktemp("csv") / f"{rows}.csv"
+    pd.DataFrame(
+        {
+            "id": np.arange(rows),
+            "price": rng.random(rows) * 100,
+            "region": rng.choice(["north", "south", "east", "west"], rows),
+        }
+    ).to_csv(csv_path, index=False)
+    return csv_path
+
+
+_PEAK_RSS_SCRIPT = textwrap.dedent("""
+    import resource, sys
+    from pathlib import Path
+    from unittest import mock
+
+    csv_path, spill_dir, mode, memory_limit = sys.argv[1:]
+    if mode == "pandas":
+        import pandas as pd
+        from llama_index.experimental.query_engine.pandas.output_parser import (
+            PandasInstructionParser,
+        )
+
+        df = pd.read_csv(csv_path)
+        answer = PandasInstructionParser(df).parse(
+            "df.groupby('region')['price'].mean()"
+        )
+    else:
+        from copilot.ai.dataframes.duckdb_engine import DuckDBQueryEngine
+
+        llm = mock.Mock()
+        llm.predict.return_value = (
+            "SELECT region, avg(price) FROM df GROUP BY region"
+        )
+        engine = DuckDBQueryEngine(
+            csv_path,
+            llm=llm,
+            memory_limit=int(memory_limit),
+            temp_directory=Path(spill_dir),
+        )
+        answer = str(engine.query("What is the average price per region?"))
+    assert "north" in answer
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    """)
+
+
+@pytest.mark.parametrize("mode", ["pandas", "duckdb"])
+def test_peak_rss(
+    benchmark: BenchmarkFixture, csv_path: Path, tmp_path: Path, mode: str
+):
+    def run() -> int:
+        result = subprocess.run(
+            [
+                sys.executable,
+                "-c",
+                _PEAK_RSS_SCRIPT,
+                csv_path,
+                tmp_path,
+                mode,
+                str(MEMORY_LIMIT),
+            ],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        return int(result.stdout)
+
+    peak_rss_kib = benchmark.pedantic(run, rounds=1, iterations=1)
+    benchmark.extra_info["csv_mib"] = round(csv_path.stat().st_size / (1 << 20), 1)
+    benchmark.extra_info["peak_rss_mib"] = round(peak_rss_kib / 1024, 1)
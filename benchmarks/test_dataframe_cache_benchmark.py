@@ -0,0 +1,93 @@
+"""Latency and memory of repeated `csv_qa_tool` setup over one large CSV.
+
+Each round loads the DataFrame and builds the query engine, which is the work
+that `csv_qa_tool` did on every question before the DataFrame cache. The LLM is
+never called. Peak RSS is measured in a fresh subprocess per loading strategy.
+"""
+
+import subprocess
+import sys
+import textwrap
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+from llama_index.core.llms import MockLLM
+from llama_index.experimental import PandasQueryEngine
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.dataframes.cache import DataFrameCache
+
+ROWS = 500_000
+MODEL = "gpt-4o-mini"
+
+
+@pytest.fixture(scope="module")
+def csv_path(tmp_path_factory: pytest.TempPathFactory) -> Path:
+    rng = np.random.default_rng(0)
+    csv_path = tmp_path_factory.mktemp("csv") / "large.csv"
+    pd.DataFrame(
+        {
+            "id": np.arange(ROWS),
+            "price": rng.random(ROWS) * 100,
+            "quantity": rng.integers(0, 1_000, ROWS),
+            "region": rng.choice(["north", "south", "east", "west"], ROWS),
+        }
+    ).to_csv(csv_path, index=False)
+    return csv_path
+
+
+def _build_query_engine(df: pd.DataFrame, model: str) -> PandasQueryEngine:
+    return PandasQueryEngine(df, llm=MockLLM())
+
+
+def test_uncached_setup(benchmark: BenchmarkFixture, csv_path: Path):
+    benchmark(lambda: _build_query_engine(pd.read_csv(csv_path), MODEL))
+
+
+def test_cached_setup(benchmark: BenchmarkFixture, csv_path: Path, tmp_path: Path):
+    cache = DataFrameCache(arrow_dir=tmp_path)
+    benchmark(lambda: cache.get_query_engine(csv_path, MODEL, _build_query_engine))
+
+
+def test_arrow_reload(benchmark: BenchmarkFixture, csv_path: Path, tmp_path: Path):
+    """A cold in-memory cache that finds the Arrow copy, e.g. after a restart."""
+    DataFrameCache(arrow_dir=tmp_path).get(csv_path)
+    benchmark(lambda: DataFrameCache(arrow_dir=tmp_path).get(csv_path))
+
+
+_PEAK_RSS_SCRIPT = textwrap.dedent("""
+    import resource, sys
+    import pandas as pd
+    from pathlib import Path
+    from copilot.ai.dataframes.cache import DataFrameCache
+
+    csv_path, arrow_dir, mode = sys.argv[1:]
+    for _ in range(5):
+        if mode == "pandas":
+            df = pd.read_csv(csv_path)
+        else:
+            df = DataFrameCache(arrow_dir=Path(arrow_dir)).get(csv_path)
+        df["price"].sum()
+    print(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss)
+    """)
+
+
+@pytest.mark.parametrize("mode", ["pandas", "arrow"])
+def test_peak_rss(
+    benchmark: BenchmarkFixture, csv_path: Path, tmp_path: Path, mode: str
+):
+    DataFrameCache(arrow_dir=tmp_path).get(csv_path)
+
+    def run() -> int:
+        result = subprocess.run(
+            [sys.executable, "-c", _PEAK_RSS_SCRIPT, csv_path, tmp_path, mode],
+            capture_output=True,
+            check=True,
+            text=True,
+        )
+        return int(result.stdout)
+
+    peak_rss_kib = benchmark.pedantic(run, rounds=1, iterations=1)
+    benchmark.extra_info["peak_rss_mib"] = round(peak_rss_kib / 1024, 1)
@@ -0,0 +1,101 @@
+"""Embedding calls and bytes sent for node insertion, with and without the cache.
+
+The corpus mimics `MarkdownElementNodeParser` output for a batch of PDFs that
+share headers, boilerplate and tables. The fake backend sleeps per request to
+stand in for the embeddings API, and counts requests and bytes sent, which are
+reported in the `extra_info` of each benchmark.
+"""
+
+import time
+from pathlib import Path
+
+import pytest
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.ingestion.embedding_cache import CachedEmbedding, EmbeddingStore
+
+REQUEST_LATENCY = 0.005
+BOILERPLATE = [
+    "Proceedings of the Conference on Machine Learning. All rights reserved.",
+    "| Model | Accuracy | F1 |\n|---|---|---|\n| Baseline | 0.81 | 0.79 |",
+    "This work is licensed under a Creative Commons Attribution 4.0 License.",
+]
+
+
+class FakeEmbeddingBackend(BaseEmbedding):
+    requests: int = 0
+    bytes_sent: int = 0
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_text_embeddings([query])[0]
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        time.sleep(REQUEST_LATENCY)
+        self.requests += 1
+        self.bytes_sent += sum(len(text.encode()) for text in texts)
+        return [[float(len(text)), 0.0, 1.0] for text in texts]
+
+
+def _corpus(documents: int = 20, chunks_per_document: int = 30) -> list[str]:
+    texts = []
+    for d in range(documents):
+        texts.extend(BOILERPLATE)
+        texts.extend(
+            f"Document {d}, paragraph {c}: findings about concept drift."
+            for c in range(chunks_per_document)
+        )
+    return texts
+
+
+@pytest.fixture
+def corpus() -> list[str]:
+    return _corpus()
+
+
+def _report(benchmark: BenchmarkFixture, backend: FakeEmbeddingBackend, rounds: int):
+    benchmark.extra_info["requests_per_run"] = backend.requests / rounds
+    benchmark.extra_info["bytes_sent_per_run"] = backend.bytes_sent / rounds
+
+
+def test_uncached(benchmark: BenchmarkFixture, corpus: list[str]):
+    backend = FakeEmbeddingBackend(model_name="fake", embed_batch_size=100)
+    benchmark.pedantic(backend.get_text_embedding_batch, (corpus,), rounds=5)
+    _report(benchmark, backend, rounds=5)
+
+
+def test_cached_first_run(
+    benchmark: BenchmarkFixture, corpus: list[str], tmp_path: Path
+):
+    """Deduplication within the batch and concurrent requests, on an empty cache."""
+    backend = FakeEmbeddingBackend(model_name="fake", embed_batch_size=100)
+    runs = iter(range(5))
+
+    def setup():
+        store = EmbeddingStore(tmp_path / f"embeddings-{next(runs)}.sqlite3")
+        return (CachedEmbedding(backend, store=store), corpus), {}
+
+    benchmark.pedantic(
+        lambda embed_model, texts: embed_model.get_text_embedding_batch(texts),
+        setup=setup,
+        rounds=5,
+    )
+    _report(benchmark, backend, rounds=5)
+
+
+def test_cached_rerun(benchmark: BenchmarkFixture, corpus: list[str], tmp_path: Path):
+    """Re-ingesting the same content, e.g. after rebuilding the vector store."""
+    backend = FakeEmbeddingBackend(model_name="fake", embed_batch_size=100)
+    embed_model = CachedEmbedding(
+        backend, store=EmbeddingStore(tmp_path / "embeddings.sqlite3")
+    )
+    embed_model.get_text_embedding_batch(corpus)
+    backend.requests = backend.bytes_sent = 0
+    benchmark.pedantic(embed_model.get_text_embedding_batch, (corpus,), rounds=5)
+    _report(benchmark, backend, rounds=5)
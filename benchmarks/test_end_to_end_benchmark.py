@@ -0,0 +1,224 @@
+"""Throughput, time to first token and latency of whole chat turns, offline.
+
+Simulated sessions run `on_chat_start` and then `TURNS` turns of `on_message`,
+concurrently, through the real `EventHandler`, tool executor and query engines.
+The stand-ins are:
+- OpenAI: the fake API of `benchmarks.fake_openai`, in its own process, which
+  streams runs at a fixed token rate and, in the `pdf_qa` scenario, first calls
+  `pdf_qa_tool` with the user's question.
+- LlamaParse: a parser that returns `fixtures/concept_drift.md` for
+  `concept_drift.pdf`.
+- Pinecone: the local vector store, in a temporary directory.
+The emitter of every session records when the first token of an answer is sent
+to the UI.
+
+Tracing is on, and the p95 of every traced stage is reported with the results.
+Compare commits with `pytest benchmarks/test_end_to_end_benchmark.py
+--benchmark-json=<file>`: the numbers are in the `extra_info` of each result.
+"""
+
+import asyncio
+import dataclasses
+import time
+import typing as t
+from pathlib import Path
+
+import chainlit as cl
+import numpy as np
+import pytest
+from chainlit.context import ChainlitContext, context_var
+from chainlit.emitter import BaseChainlitEmitter
+from chainlit.session import HTTPSession
+from llama_index.core import Document
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from benchmarks.fake_openai import FakeOpenAIConfig, fake_openai_server
+from copilot import app, constants, kv_store, tracing
+from copilot.ai import answer_cache, client_registry, llama_index_
+from copilot.ai.ingestion import manifest, parse_cache, pipeline
+from copilot.ai.openai_ import citations, clients, threads, tool_executor
+from copilot.ai.retrieval import keyword_index
+from copilot.resources import RESOURCES_ROOT
+from copilot.settings import get_settings
+
+FIXTURES = Path(__file__).parent / "fixtures"
+PARSE_SECONDS = 0.5
+TURNS = 2
+SESSIONS = [1, 8, 32]
+SCENARIOS = {
+    "answer": FakeOpenAIConfig(),
+    "pdf_qa": FakeOpenAIConfig(tool_name="pdf_qa_tool"),
+}
+TOPICS = ["the method", "the experiments", "Waterbirds", "CelebA", "the biases"]
+
+
+class FixtureParser:
+    """Parse PDFs into the markdown fixture of the same name."""
+
+    async def aload_data(
+        self, file_path: str, extra_info: dict[str, t.Any] | None = None
+    ) -> list[Document]:
+        await asyncio.sleep(PARSE_SECONDS)
+        text = (FIXTURES / Path(file_path).with_suffix(".md").name).read_text()
+        return [Document(text=text, metadata=dict(extra_info or {}))]
+
+
+class RecordingEmitter(BaseChainlitEmitter):
+    """Record when the first token of an assistant message is sent."""
+
+    def __init__(self, session: HTTPSession) -> None:
+        super().__init__(session)
+        self.assistant_message_ids: set[str] = set()
+        self.first_token_at: float | None = None
+
+    async def stream_start(self, step_dict: t.Any) -> None:
+        if step_dict["type"] == "assistant_message":
+            self.assistant_message_ids.add(step_dict["id"])
+
+    async def send_token(
+        self, id: str, token: str, is_sequence: bool = False, is_input: bool = False
+    ) -> None:
+        if id in self.assistant_message_ids and self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+
+
+@dataclasses.dataclass
+class Turn:
+    seconds: float
+    first_token_seconds: float | None
+
+
+@pytest.fixture
+def offline_app(monkeypatch: pytest.MonkeyPatch, tmp_path: Path) -> t.Iterator[None]:
+    """Point the app at temporary storage and start from fresh singletons."""
+    # Ingestion persists the storage context in the working directory.
+    monkeypatch.chdir(tmp_path)
+    persistence_dir = constants.PERSISTENCE_DIR
+    for name, value in vars(constants).copy().items():
+        if isinstance(value, Path) and value.is_relative_to(persistence_dir):
+            monkeypatch.setattr(
+                constants, name, tmp_path / value.relative_to(persistence_dir)
+            )
+    for name in [
+        "COPILOT_OPENAI_API_KEY",
+        "COPILOT_LLAMA_CLOUD_API_KEY",
+        "COPILOT_PINECONE_API_KEY",
+    ]:
+        monkeypatch.setenv(name, "fake")
+    monkeypatch.setenv("COPILOT_VECTOR_STORE_BACKEND", "local")
+    monkeypatch.setenv("COPILOT_TRACING_ENABLED", "true")
+    # Every question is asked once, so answers come from the tools.
+    monkeypatch.setenv("COPILOT_ANSWER_CACHE_SIMILARITY_THRESHOLD", "1.1")
+    singletons = [
+        (client_registry, "_registry"),
+        (kv_store, "_kv_store"),
+        (threads, "_thread_manager"),
+        (tool_executor, "_tool_executor"),
+        (citations, "_file_metadata_cache"),
+        (parse_cache, "_parse_cache"),
+        (manifest, "_manifest"),
+        (pipeline, "_queue"),
+        (pipeline, "_worker"),
+        (answer_cache, "_answer_cache"),
+        (tracing, "_tracer"),
+    ]
+    for module, name in singletons:
+        monkeypatch.setattr(module, name, None)
+    monkeypatch.setattr(clients, "_assistant_ids", {})
+    monkeypatch.setattr(clients, "_assistant_locks", {})
+    monkeypatch.setattr(keyword_index, "_keyword_indexes", {})
+    monkeypatch.setattr(llama_index_, "_llama_index_initialized", False)
+    monkeypatch.setattr(
+        llama_index_,
+        "_index_cache",
+        llama_index_.IndexCache(query_engine_factory=llama_index_.build_query_engine),
+    )
+    monkeypatch.setattr(pipeline, "load_parser", FixtureParser)
+    get_settings.cache_clear()
+    yield
+    get_settings.cache_clear()
+
+
+async def _session(index: int) -> list[Turn]:
+    session = HTTPSession(
+        id=f"session-{index}",
+        thread_id=None,
+        user=None,
+        token=None,
+        user_env={},
+        client_type="webapp",
+    )
+    session.chat_profile = constants.ChatProfiles.GPT4oMini.value
+    emitter = RecordingEmitter(session)
+    context_var.set(ChainlitContext(session, emitter))
+    await app.on_chat_start()
+    turns = []
+    for turn in range(TURNS):
+        topic = TOPICS[(index + turn) % len(TOPICS)]
+        message = cl.Message(
+            content=f"Session {index} asks, turn {turn}: what about {topic}?",
+            author="User",
+            type="user_message",
+        )
+        emitter.first_token_at = None
+        start = time.perf_counter()
+        await app.on_message(message)
+        end = time.perf_counter()
+        first_token = emitter.first_token_at
+        turns.append(
+            Turn(end - start, None if first_token is None else first_token - start)
+        )
+    return turns
+
+
+async def _sessions(count: int) -> tuple[list[Turn], float]:
+    start = time.perf_counter()
+    results = await asyncio.gather(*(_session(i) for i in range(count)))
+    return [turn for turns in results for turn in turns], time.perf_counter() - start
+
+
+def _percentiles(values: list[float]) -> dict[str, float]:
+    return {
+        "p50": round(float(np.percentile(values, 50)), 3),
+        "p95": round(float(np.percentile(values, 95)), 3),
+    }
+
+
+@pytest.mark.usefixtures("offline_app")
+@pytest.mark.parametrize("sessions", SESSIONS)
+@pytest.mark.parametrize("scenario", list(SCENARIOS))
+def test_end_to_end(
+    benchmark: BenchmarkFixture,
+    monkeypatch: pytest.MonkeyPatch,
+    scenario: str,
+    sessions: int,
+):
+    with fake_openai_server(SCENARIOS[scenario]) as url:
+        monkeypatch.setenv("COPILOT_OPENAI_BASE_URL", url)
+        get_settings.cache_clear()
+        loop = asyncio.new_event_loop()
+        try:
+            start = time.perf_counter()
+            pdf = RESOURCES_ROOT / "concept_drift.pdf"
+            loop.run_until_complete(pipeline.ingest_pdfs({pdf.name: str(pdf)}))
+            ingest_seconds = time.perf_counter() - start
+            turns, seconds = benchmark.pedantic(
+                lambda: loop.run_until_complete(_sessions(sessions)), rounds=1
+            )
+        finally:
+            loop.run_until_complete(pipeline.stop_ingestion_worker())
+            tool_executor.shutdown_tool_executor()
+            loop.run_until_complete(client_registry.close_client_registry())
+            loop.close()
+    first_tokens = [t.first_token_seconds for t in turns if t.first_token_seconds]
+    assert len(first_tokens) == len(turns) == sessions * TURNS
+    stages = tracing.summarize_traces(constants.TRACES_PATH)
+    benchmark.extra_info.update(
+        {
+            "ingest_seconds": round(ingest_seconds, 3),
+            "turns_per_second": round(len(turns) / seconds, 3),
+            "first_token_seconds": _percentiles(first_tokens),
+            "turn_seconds": _percentiles([turn.seconds for turn in turns]),
+            "stage_p95_ms": {name: stats["p95_ms"] for name, stats in stages.items()},
+        }
+    )
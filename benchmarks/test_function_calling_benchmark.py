@@ -0,0 +1,61 @@
+"""Tool metadata compilation and tool-call dispatch throughput."""
+
+import json
+import typing as t
+
+import pytest
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.required_action_function_tool_call import Function
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.openai_.function_calling import (
+    compile_tool,
+    execute_tool,
+    get_assistant_tool_metadata,
+    get_compiled_tool,
+)
+from copilot.ai.tools import TOOL_REGISTRY
+
+
+def get_forecast(
+    location: t.Annotated[str, "The city and state, e.g., San Francisco, CA"],
+    unit: t.Annotated[t.Literal["Celsius", "Fahrenheit"], "The temperature unit."],
+    days: t.Annotated[int, "The number of days to forecast."],
+    hourly: t.Annotated[bool, "Whether to return hourly forecasts."],
+) -> str:
+    """Get the weather forecast for a location."""
+    return "sunny"
+
+
+ARGUMENTS = {"location": "Paris", "unit": "Celsius", "days": 3, "hourly": False}
+TOOL_CALL = RequiredActionFunctionToolCall(
+    id="call_1",
+    type="function",
+    function=Function(name=get_forecast.__name__, arguments=json.dumps(ARGUMENTS)),
+)
+
+
+@pytest.fixture(autouse=True)
+def register_forecast(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(TOOL_REGISTRY, get_forecast.__name__, get_forecast)
+
+
+def test_build_metadata(benchmark: BenchmarkFixture):
+    """The work `execute_tool` used to do on every tool call."""
+    benchmark(lambda: get_assistant_tool_metadata(get_forecast).as_openai_tool_spec())
+
+
+def test_compiled_lookup(benchmark: BenchmarkFixture):
+    compile_tool(get_forecast)
+    benchmark(lambda: get_compiled_tool(get_forecast.__name__).spec)
+
+
+def test_validate_arguments(benchmark: BenchmarkFixture):
+    validator = compile_tool(get_forecast).validator
+    assert benchmark(validator.validate, ARGUMENTS) is None
+
+
+def test_dispatch(benchmark: BenchmarkFixture):
+    compile_tool(get_forecast)
+    result = benchmark(execute_tool, TOOL_CALL)
+    assert result["output"] == "sunny"
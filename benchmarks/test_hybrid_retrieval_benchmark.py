@@ -0,0 +1,127 @@
+"""Recall and latency of dense retrieval against hybrid retrieval.
+
+The corpus mimics technical manuals: chunks about a few components that differ
+mostly by part number. Dense embeddings are stood in for by hashed bags of
+words that ignore tokens with digits, as real embeddings blur them. Questions
+ask about a specific part number, and a retriever recalls the question if the
+chunk of that part number is among the returned chunks. Fewer chunks mean a
+shorter and cheaper prompt for the same recall.
+"""
+
+import re
+import zlib
+from pathlib import Path
+
+import numpy as np
+import pytest
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.retrieval.hybrid import HybridRetriever, TermCoverageReranker
+from copilot.ai.retrieval.keyword_index import KeywordIndex
+
+DIM = 256
+PARTS = 2000
+QUESTIONS = 200
+COMPONENTS = ["pump", "valve", "bearing", "gasket", "impeller", "seal", "shaft"]
+PROPERTIES = ["torque", "pressure", "temperature", "flow rate", "tolerance"]
+
+
+def _embed(text: str) -> np.ndarray:
+    embedding = np.zeros(DIM, dtype=np.float32)
+    for word in re.findall(r"\w+", text.lower()):
+        if not any(c.isdigit() for c in word):
+            embedding[zlib.crc32(word.encode()) % DIM] += 1
+    return embedding / (np.linalg.norm(embedding) or 1.0)
+
+
+class DenseRetriever(BaseRetriever):
+    """Exhaustive cosine similarity over `_embed` embeddings."""
+
+    def __init__(self, nodes: list[TextNode], similarity_top_k: int) -> None:
+        super().__init__()
+        self._nodes = nodes
+        self._embeddings = np.stack([_embed(n.text) for n in nodes])
+        self._similarity_top_k = similarity_top_k
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        scores = self._embeddings @ _embed(query_bundle.query_str)
+        top = np.argsort(-scores)[: self._similarity_top_k]
+        return [NodeWithScore(node=self._nodes[i], score=float(scores[i])) for i in top]
+
+
+@pytest.fixture(scope="module")
+def nodes() -> list[TextNode]:
+    rng = np.random.default_rng(0)
+    nodes = []
+    for i in range(PARTS):
+        component = COMPONENTS[i % len(COMPONENTS)]
+        properties = rng.choice(PROPERTIES, 3, replace=False)
+        values = ", ".join(f"{p} {rng.integers(1, 500)}" for p in properties)
+        nodes.append(
+            TextNode(
+                id_=f"PN-{1000 + i}",
+                text=f"The {component} PN-{1000 + i} is rated for {values}. "
+                f"Replace the {component} during scheduled maintenance.",
+            )
+        )
+    return nodes
+
+
+@pytest.fixture(scope="module")
+def keyword_index(nodes: list[TextNode], tmp_path_factory) -> KeywordIndex:
+    path: Path = tmp_path_factory.mktemp("keywords") / "keywords.sqlite3"
+    keyword_index = KeywordIndex(path)
+    keyword_index.add(nodes)
+    return keyword_index
+
+
+@pytest.fixture(scope="module")
+def questions(nodes: list[TextNode]) -> list[tuple[str, str]]:
+    rng = np.random.default_rng(1)
+    questions = []
+    for i in rng.integers(0, PARTS, QUESTIONS):
+        component = COMPONENTS[i % len(COMPONENTS)]
+        prop = rng.choice(PROPERTIES)
+        question = f"What is the {prop} of the {component} PN-{1000 + i}?"
+        questions.append((question, nodes[i].node_id))
+    return questions
+
+
+def _run(retrieve, questions: list[tuple[str, str]]) -> float:
+    recalled = [
+        expected in {n.node.node_id for n in retrieve(question)}
+        for question, expected in questions
+    ]
+    return float(np.mean(recalled))
+
+
+@pytest.mark.parametrize("top_k", [3, 10, 50])
+def test_dense(benchmark: BenchmarkFixture, nodes, questions, top_k):
+    retriever = DenseRetriever(nodes, similarity_top_k=top_k)
+    recall = benchmark.pedantic(_run, args=(retriever.retrieve, questions), rounds=3)
+    benchmark.extra_info["chunks"] = top_k
+    benchmark.extra_info["recall"] = round(recall, 3)
+
+
+@pytest.mark.parametrize("rerank", [False, True])
+def test_hybrid(benchmark: BenchmarkFixture, nodes, keyword_index, questions, rerank):
+    top_k, candidates = 3, 20
+    retriever = HybridRetriever(
+        DenseRetriever(nodes, similarity_top_k=candidates),
+        keyword_index,
+        similarity_top_k=candidates if rerank else top_k,
+        keyword_top_k=candidates,
+    )
+    reranker = TermCoverageReranker(keyword_index, top_n=top_k)
+
+    def retrieve(question: str) -> list[NodeWithScore]:
+        results = retriever.retrieve(question)
+        if rerank:
+            results = reranker.postprocess_nodes(results, query_str=question)
+        return results
+
+    recall = benchmark.pedantic(_run, args=(retrieve, questions), rounds=3)
+    benchmark.extra_info["chunks"] = top_k
+    benchmark.extra_info["recall"] = round(recall, 3)
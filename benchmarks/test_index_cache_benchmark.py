@@ -0,0 +1,67 @@
+"""Per-call cost of `pdf_qa_tool` setup with and without the index cache.
+
+The vector store is an in-memory stand-in and the LLM and embeddings are mocks,
+so the difference between the two benchmarks is the setup that the cache
+removes from every tool call.
+"""
+
+import pytest
+from llama_index.core import Settings, StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.llms import MockLLM
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import SimpleVectorStore
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.llama_index_ import IndexCache
+
+MODEL = "gpt-4o-mini"
+QUERY = "What is concept drift?"
+
+
+@pytest.fixture(autouse=True)
+def mock_models(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setattr(Settings, "_embed_model", MockEmbedding(embed_dim=8))
+    monkeypatch.setattr(Settings, "_llm", MockLLM(max_tokens=8))
+
+
+@pytest.fixture
+def vector_store() -> SimpleVectorStore:
+    vector_store = SimpleVectorStore()
+    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    VectorStoreIndex(
+        [TextNode(text=f"Chunk {i} about concept drift.") for i in range(32)],
+        storage_context=storage_context,
+    )
+    return vector_store
+
+
+def _load_index(vector_store: SimpleVectorStore) -> VectorStoreIndex:
+    storage_context = StorageContext.from_defaults(vector_store=vector_store)
+    return VectorStoreIndex(nodes=[], storage_context=storage_context)
+
+
+def test_uncached_tool_call(benchmark: BenchmarkFixture, vector_store):
+    def tool_call() -> str:
+        index = _load_index(vector_store)
+        return str(index.as_query_engine(llm=MockLLM(max_tokens=8)).query(QUERY))
+
+    benchmark(tool_call)
+
+
+def test_cached_tool_call(benchmark: BenchmarkFixture, vector_store):
+    index_cache = IndexCache(
+        index_factory=lambda _: _load_index(vector_store),
+        llm_factory=lambda _: MockLLM(max_tokens=8),
+    )
+
+    def tool_call() -> str:
+        return str(index_cache.get_query_engine(MODEL).query(QUERY))
+
+    benchmark(tool_call)
+
+
+def test_uncached_setup_only(benchmark: BenchmarkFixture, vector_store):
+    benchmark(
+        lambda: _load_index(vector_store).as_query_engine(llm=MockLLM(max_tokens=8))
+    )
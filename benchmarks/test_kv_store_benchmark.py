@@ -0,0 +1,104 @@
+"""Write throughput and lost updates of the key-value store.
+
+`json_file` is how settings used to be persisted: every write reads and rewrites
+a JSON file of all the values. Single process writes are timed against a store
+that already holds `EXISTING` values. Then `PROCESSES` processes each increment
+a shared counter `INCREMENTS` times, and the increments that were lost are
+counted.
+"""
+
+import json
+import multiprocessing
+import time
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.kv_store import KVStore, Namespace
+
+EXISTING = 1000
+PROCESSES = 4
+INCREMENTS = 200
+
+
+def _json_put(path: Path, key: str, value: str) -> None:
+    data = json.loads(path.read_text()) if path.exists() else {}
+    data[key] = value
+    path.write_text(json.dumps(data, indent=2))
+
+
+def _json_increment(path: Path, barrier) -> None:
+    barrier.wait()
+    for _ in range(INCREMENTS):
+        while True:
+            try:
+                data = json.loads(path.read_text())
+                break
+            except json.JSONDecodeError:
+                # Read while another process was writing.
+                continue
+        data["total"] = str(int(data["total"]) + 1)
+        path.write_text(json.dumps(data))
+
+
+def _kv_increment(path: Path, barrier) -> None:
+    counters = Namespace(KVStore(path), "counters")
+    barrier.wait()
+    for _ in range(INCREMENTS):
+        counters.update("total", lambda total: (total or 0) + 1)
+
+
+def _run_processes(target, path: Path) -> float:
+    """Run `target` in processes that start together, return the seconds it took."""
+    context = multiprocessing.get_context("spawn")
+    barrier = context.Barrier(PROCESSES + 1)
+    processes = [
+        context.Process(target=target, args=(path, barrier)) for _ in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for process in processes:
+        process.join()
+    return time.perf_counter() - start
+
+
+def test_json_file_put(benchmark: BenchmarkFixture, tmp_path: Path):
+    path = tmp_path / "settings.json"
+    path.write_text(json.dumps({f"key-{i}": "x" * 64 for i in range(EXISTING)}))
+    benchmark(_json_put, path, "thread", "thread_1")
+
+
+def test_kv_store_put(benchmark: BenchmarkFixture, tmp_path: Path):
+    settings = Namespace(KVStore(tmp_path / "kv.sqlite3"), "settings", str, str)
+    settings.put_many({f"key-{i}": "x" * 64 for i in range(EXISTING)})
+    benchmark(settings.put, "thread", "thread_1")
+
+
+def test_kv_store_cached_get(benchmark: BenchmarkFixture, tmp_path: Path):
+    settings = Namespace(KVStore(tmp_path / "kv.sqlite3"), "settings", str, str)
+    settings.put("thread", "thread_1")
+    benchmark(settings.get, "thread")
+
+
+@pytest.mark.parametrize("backend", ["json_file", "kv_store"])
+def test_concurrent_increments(benchmark: BenchmarkFixture, tmp_path: Path, backend):
+    def run() -> tuple[float, int]:
+        if backend == "json_file":
+            path = tmp_path / "settings.json"
+            path.write_text(json.dumps({"total": "0"}))
+            seconds = _run_processes(_json_increment, path)
+            total = int(json.loads(path.read_text())["total"])
+        else:
+            path = tmp_path / "kv.sqlite3"
+            path.unlink(missing_ok=True)
+            KVStore(path)
+            seconds = _run_processes(_kv_increment, path)
+            total = Namespace(KVStore(path), "counters").get("total")
+        return seconds, total
+
+    seconds, total = benchmark.pedantic(run, rounds=1)
+    benchmark.extra_info["lost_updates"] = PROCESSES * INCREMENTS - total
+    benchmark.extra_info["writes_per_second"] = round(PROCESSES * INCREMENTS / seconds)
@@ -0,0 +1,78 @@
+"""Query latency of the local vector store, exhaustive and with the IVF index.
+
+Pinecone answers the same queries over the network, which costs a round trip
+(tens of milliseconds) per query on top of the search itself. The store is
+filled with clustered random embeddings of the size OpenAI's
+`text-embedding-3-small` returns, and the recall of the IVF index is measured
+against the exhaustive search.
+"""
+
+from pathlib import Path
+
+import numpy as np
+import pytest
+from llama_index.core.schema import TextNode
+from llama_index.core.vector_stores import VectorStoreQuery
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.retrieval.local_vector_store import LocalVectorStore
+
+DIM = 1536
+NODES = 50_000
+TOP_K = 10
+
+
+@pytest.fixture(scope="module")
+def embeddings() -> np.ndarray:
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(200, DIM)).astype(np.float32)
+    noise = rng.normal(scale=0.5, size=(NODES, DIM)).astype(np.float32)
+    return centers[rng.integers(0, 200, NODES)] + noise
+
+
+@pytest.fixture(scope="module")
+def store_dir(embeddings: np.ndarray, tmp_path_factory) -> Path:
+    store_dir = tmp_path_factory.mktemp("store")
+    store = LocalVectorStore(store_dir, ann_threshold=NODES + 1)
+    for start in range(0, NODES, 5000):
+        store.add(
+            [
+                TextNode(id_=str(i), text=f"Node {i}", embedding=e.tolist())
+                for i, e in enumerate(embeddings[start : start + 5000], start)
+            ]
+        )
+    return store_dir
+
+
+def _queries(embeddings: np.ndarray) -> list[VectorStoreQuery]:
+    rng = np.random.default_rng(1)
+    rows = rng.integers(0, NODES, 50)
+    noise = rng.normal(scale=0.3, size=(50, DIM))
+    return [
+        VectorStoreQuery(query_embedding=e.tolist(), similarity_top_k=TOP_K)
+        for e in embeddings[rows] + noise
+    ]
+
+
+def _run(store: LocalVectorStore, queries: list[VectorStoreQuery]) -> list[set[str]]:
+    return [set(store.query(query).ids) for query in queries]
+
+
+def test_exhaustive_query(benchmark: BenchmarkFixture, store_dir, embeddings):
+    store = LocalVectorStore(store_dir, ann_threshold=NODES + 1)
+    queries = _queries(embeddings)
+    benchmark.pedantic(_run, args=(store, queries), rounds=5)
+    benchmark.extra_info["queries"] = len(queries)
+
+
+def test_ivf_query(benchmark: BenchmarkFixture, store_dir, embeddings):
+    exact = _run(
+        LocalVectorStore(store_dir, ann_threshold=NODES + 1), _queries(embeddings)
+    )
+    store = LocalVectorStore(store_dir, ann_threshold=NODES)
+    store._maybe_build_ivf()
+    queries = _queries(embeddings)
+    results = benchmark.pedantic(_run, args=(store, queries), rounds=5)
+    recall = np.mean([len(a & b) / TOP_K for a, b in zip(exact, results)])
+    benchmark.extra_info["queries"] = len(queries)
+    benchmark.extra_info["recall_at_10"] = round(float(recall), 3)
@@ -0,0 +1,32 @@
+"""Table context tokens and profiling time for CSVs of growing width.
+
+`before` is the `df.head()` context `PandasQueryEngine` sends, with pandas set
+to show every column, and `after` is the profile rendered in the default budget.
+"""
+
+import numpy as np
+import pandas as pd
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.dataframes.profile import profile_dataframe
+from copilot.ai.tokens import count_tokens
+
+MAX_CONTEXT_TOKENS = 1000
+
+
+@pytest.fixture(params=[10, 100, 500])
+def df(request) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    columns = request.param
+    return pd.DataFrame(
+        {f"column_{i}": rng.random(100_000) for i in range(columns - 1)}
+        | {"category": rng.choice(["a", "b", "c"], 100_000)}
+    )
+
+
+def test_profile(benchmark: BenchmarkFixture, df: pd.DataFrame):
+    with pd.option_context("display.max_columns", None):
+        profile = benchmark(profile_dataframe, df)
+    benchmark.extra_info["before"] = profile.head_tokens
+    benchmark.extra_info["after"] = count_tokens(profile.render(MAX_CONTEXT_TOKENS))
@@ -0,0 +1,92 @@
+"""Prompt size and modelled run latency over a long-lived conversation.
+
+`TURNS` turns of `TOKENS_PER_TURN` tokens each go to one owner. With a single
+thread the prompt of every run holds the whole history. With rollover it is
+bounded by the configured limits plus the summary seeded into new threads. Run
+latency is modelled as a fixed overhead plus a cost per prompt token, since the
+OpenAI API is not called.
+"""
+
+import asyncio
+import itertools
+import typing as t
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.openai_.threads import ThreadManager
+from copilot.kv_store import KVStore
+
+TURNS = 500
+TOKENS_PER_TURN = 300
+SUMMARY_TOKENS = 400
+RUN_OVERHEAD_SECONDS = 0.8
+SECONDS_PER_PROMPT_TOKEN = 20e-6
+
+
+def _client() -> MagicMock:
+    client = MagicMock()
+    ids = itertools.count()
+    client.beta.threads.create = AsyncMock(
+        side_effect=lambda messages: MagicMock(id=f"thread_{next(ids)}")
+    )
+
+    async def list_messages(thread_id: str, order: str) -> t.AsyncIterator[MagicMock]:
+        block = MagicMock(type="text")
+        block.text.value = "..."
+        yield MagicMock(role="user", content=[block])
+
+    client.beta.threads.messages.list = list_messages
+    completion = MagicMock()
+    completion.choices[0].message.content = "Summary."
+    client.chat.completions.create = AsyncMock(return_value=completion)
+    return client
+
+
+def _simulate(threads: ThreadManager | None) -> list[int]:
+    """Return the prompt tokens of every run."""
+    client = _client()
+    prompts = []
+
+    async def main() -> None:
+        thread_tokens: dict[str, int] = {}
+        for _ in range(TURNS):
+            if threads is None:
+                thread_id = "thread_global"
+            else:
+                thread_id = await threads.get_thread_id(client, "user:alice")
+            if thread_id not in thread_tokens:
+                has_summary = threads is not None and thread_id != "thread_0"
+                thread_tokens[thread_id] = SUMMARY_TOKENS if has_summary else 0
+            thread_tokens[thread_id] += TOKENS_PER_TURN
+            prompts.append(thread_tokens[thread_id])
+            if threads is not None:
+                usage = MagicMock(prompt_tokens=thread_tokens[thread_id])
+                threads.record_run("user:alice", thread_id, MagicMock(usage=usage))
+
+    asyncio.run(main())
+    return prompts
+
+
+@pytest.mark.parametrize("rollover", [False, True])
+def test_long_conversation(benchmark: BenchmarkFixture, tmp_path: Path, rollover):
+    def run() -> list[int]:
+        threads = None
+        if rollover:
+            (tmp_path / "kv.sqlite3").unlink(missing_ok=True)
+            threads = ThreadManager(
+                KVStore(tmp_path / "kv.sqlite3"), max_prompt_tokens=8000
+            )
+        return _simulate(threads)
+
+    prompts = np.array(benchmark.pedantic(run, rounds=1))
+    latency = RUN_OVERHEAD_SECONDS + SECONDS_PER_PROMPT_TOKEN * prompts
+    benchmark.extra_info["mean_prompt_tokens"] = int(prompts.mean())
+    benchmark.extra_info["max_prompt_tokens"] = int(prompts.max())
+    benchmark.extra_info["p95_run_seconds"] = round(
+        float(np.percentile(latency, 95)), 2
+    )
+    benchmark.extra_info["last_run_seconds"] = round(float(latency[-1]), 2)
@@ -0,0 +1,69 @@
+"""Websocket messages and CPU of streaming answers, with and without coalescing.
+
+Many sessions stream an answer at once, each delta a few characters apart by
+`DELTA_SECONDS`, like the Assistants API. Sending a token costs what Chainlit
+does per `stream_token`: serializing a step dictionary for the websocket. The
+CPU of the whole process includes the simulated API stream, which is the same
+with and without coalescing.
+"""
+
+import asyncio
+import json
+import time
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.token_coalescer import TokenCoalescer
+
+SESSIONS = 50
+DELTAS = 200
+DELTA_SECONDS = 0.005
+
+
+async def _session(coalesce: bool, messages: list[str], send_cpu: list[float]) -> None:
+    output = ""
+
+    async def send(token: str) -> None:
+        nonlocal output
+        start = time.thread_time()
+        output += token
+        # What the emitter sends for every streamed token.
+        messages.append(json.dumps({"id": "step", "token": token, "output": output}))
+        send_cpu.append(time.thread_time() - start)
+
+    coalescer = TokenCoalescer(send) if coalesce else None
+    for i in range(DELTAS):
+        delta = f" tok{i % 10}"
+        if coalescer is None:
+            await send(delta)
+        else:
+            await coalescer.push(delta)
+        await asyncio.sleep(DELTA_SECONDS)
+    if coalescer is not None:
+        await coalescer.flush()
+
+
+def _run(coalesce: bool) -> dict[str, float]:
+    messages: list[str] = []
+    send_cpu: list[float] = []
+
+    async def main() -> None:
+        await asyncio.gather(
+            *(_session(coalesce, messages, send_cpu) for _ in range(SESSIONS))
+        )
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    asyncio.run(main())
+    seconds, cpu = time.perf_counter() - start, time.process_time() - cpu_start
+    return {
+        "messages_per_second": len(messages) / seconds,
+        "cpu_ms_per_session": 1000 * cpu / SESSIONS,
+        "send_cpu_ms_per_session": 1000 * sum(send_cpu) / SESSIONS,
+    }
+
+
+@pytest.mark.parametrize("coalesce", [False, True])
+def test_streaming(benchmark: BenchmarkFixture, coalesce):
+    stats = benchmark.pedantic(_run, args=(coalesce,), rounds=3)
+    benchmark.extra_info.update({k: round(v, 2) for k, v in stats.items()})
@@ -0,0 +1,77 @@
+"""Time until the user sees something of a slow tool call.
+
+The tool stands in for `pdf_qa_tool`: retrieval, then an LLM that streams its
+answer token by token. Without progress, the UI shows nothing until the tool
+returns. With progress, the first status line and the first answer token show
+up as soon as they are reported.
+"""
+
+import asyncio
+import json
+import time
+import typing as t
+
+import pytest
+from llama_index.core.base.response.schema import StreamingResponse
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.required_action_function_tool_call import Function
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.ai.openai_.tool_executor import ToolExecutor
+from copilot.ai.tools import TOOL_REGISTRY
+from copilot.ai.tools.progress import report_progress, stream_response
+
+RETRIEVAL_SECONDS = 0.3
+TOKENS = 50
+TOKEN_SECONDS = 0.01
+
+
+def _generate() -> t.Iterator[str]:
+    for i in range(TOKENS):
+        time.sleep(TOKEN_SECONDS)
+        yield f"token{i} "
+
+
+def slow_pdf_tool(query: t.Annotated[str, "The question."]) -> str:
+    """Retrieve, then stream an answer."""
+    report_progress("Searching the PDFs.\n\n")
+    time.sleep(RETRIEVAL_SECONDS)
+    return stream_response(StreamingResponse(response_gen=_generate()))
+
+
+@pytest.fixture(autouse=True)
+def register_tool(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(TOOL_REGISTRY, slow_pdf_tool.__name__, slow_pdf_tool)
+
+
+def _run(stream_progress: bool) -> dict[str, float]:
+    tool_call = RequiredActionFunctionToolCall(
+        id="call_1",
+        type="function",
+        function=Function(name="slow_pdf_tool", arguments=json.dumps({"query": "?"})),
+    )
+    executor = ToolExecutor()
+    seen: list[float] = []
+
+    async def on_progress(tool_call_id: str, text: str) -> None:
+        seen.append(time.perf_counter())
+
+    start = time.perf_counter()
+    asyncio.run(
+        executor.execute_tools(
+            [tool_call], on_progress=on_progress if stream_progress else None
+        )
+    )
+    done = time.perf_counter()
+    executor.shutdown()
+    return {
+        "first_visible_seconds": (seen[0] if seen else done) - start,
+        "first_token_seconds": (seen[1] if seen else done) - start,
+        "output_seconds": done - start,
+    }
+
+
+@pytest.mark.parametrize("stream_progress", [False, True])
+def test_time_to_first_output(benchmark: BenchmarkFixture, stream_progress):
+    timings = benchmark.pedantic(_run, args=(stream_progress,), rounds=3)
+    benchmark.extra_info.update({k: round(v, 3) for k, v in timings.items()})
@@ -0,0 +1,54 @@
+"""Overhead of tracing a chat turn.
+
+A turn opens about ten spans: the turn, the thread, the message, the run, the
+first token, the tool calls and their tools, and the tool outputs. With
+tracing disabled they are no-ops; enabled, the trace is also written as one
+JSON line by the `LocalSpanExporter`.
+"""
+
+from pathlib import Path
+
+import pytest
+from pytest_benchmark.fixture import BenchmarkFixture
+
+from copilot.tracing import LocalSpanExporter, Tracer, summarize_traces
+
+TOOLS = 3
+
+
+def _turn(tracer: Tracer) -> None:
+    with tracer.span("turn", new_trace=True, owner="user:alice") as turn:
+        with tracer.span("get_thread"):
+            pass
+        turn.add_event("thread_locked")
+        with tracer.span("create_message"):
+            pass
+        with tracer.span("run") as run:
+            first_token = tracer.start_span("time_to_first_token")
+            run.add_event("thread.run.created")
+            with tracer.span("tool_calls", count=TOOLS):
+                for i in range(TOOLS):
+                    with tracer.span("tool pdf_qa_tool", tool_call_id=f"call_{i}"):
+                        pass
+            with tracer.span("submit_tool_outputs"):
+                first_token.end()
+            run.set_attribute("prompt_tokens", 1000)
+
+
+@pytest.mark.parametrize("mode", ["disabled", "in_memory", "local_exporter"])
+def test_turn_overhead(benchmark: BenchmarkFixture, tmp_path: Path, mode: str):
+    class NullExporter:
+        def export(self, spans) -> None:
+            pass
+
+    path = tmp_path / "traces.jsonl"
+    exporters = {
+        "disabled": [],
+        "in_memory": [NullExporter()],
+        "local_exporter": [LocalSpanExporter(path)],
+    }[mode]
+    benchmark(_turn, Tracer(exporters))
+    benchmark.extra_info["spans_per_turn"] = 6 + TOOLS
+    if mode == "local_exporter":
+        summary = summarize_traces(path)
+        benchmark.extra_info["turns_written"] = summary["turn"]["count"]
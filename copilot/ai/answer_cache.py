@@ -0,0 +1,253 @@
+"""Cache of tool answers, in front of tool dispatch.
+
+`pdf_qa_tool` and `csv_qa_tool` retrieve context and call an LLM for every
+question, even when the same question was just answered about the same data.
+Answers are cached per tool and corpus version, e.g. the file a CSV question is
+about or the version of the ingestion manifest, which changes with every
+ingestion. Questions match exactly after normalization, or by embedding
+similarity if they also name the same numbers and identifiers: the embeddings
+of "XJ-200 spec" and "XJ-300 spec" are close, but their answers are not.
+
+The outcome of every lookup is recorded on the current span, so that hit rates
+can be read from the traces.
+"""
+
+import asyncio
+import collections
+import dataclasses
+import logging
+import re
+import time
+import typing as t
+import unicodedata
+
+import numpy as np
+from llama_index.core import Settings
+
+from copilot.ai.llama_index_ import initialize_llama_index
+from copilot.ai.retrieval.keyword_index import tokenize
+from copilot.ai.tools import CORPUS_VERSIONS
+from copilot.settings import get_settings
+from copilot.tracing import Span, current_span
+
+logger = logging.getLogger(__name__)
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?.!]+$")
+
+CorpusVersion = t.Callable[..., str | None]
+"""Returns the version of the data a tool call is about, from the call's arguments.
+
+`None` means that the call must not be answered from the cache.
+"""
+
+
+def normalize_query(query: str) -> str:
+    """Normalize Unicode, case, whitespace and trailing punctuation of `query`."""
+    query = unicodedata.normalize("NFC", query).casefold()
+    return _TRAILING_PUNCTUATION.sub("", _WHITESPACE.sub(" ", query).strip())
+
+
+def key_terms(query: str) -> frozenset[str]:
+    """Return the numbers and identifiers of `query`, e.g. `xj-200` and `200`."""
+    return frozenset(
+        term for term in tokenize(query) if not term.isalpha() or "_" in term
+    )
+
+
+def _record(span: Span, outcome: str) -> None:
+    # `summarize_traces` counts the events of each span name.
+    span.set_attribute("answer_cache", outcome)
+    span.add_event(f"answer_cache_{outcome}")
+
+
+@dataclasses.dataclass
+class AnswerCacheStats:
+    """Counters of the answer cache, for monitoring."""
+
+    exact_hits: int = 0
+    semantic_hits: int = 0
+    misses: int = 0
+    bypasses: int = 0
+    seconds_saved: float = 0.0
+
+    @property
+    def hits(self) -> int:
+        return self.exact_hits + self.semantic_hits
+
+    @property
+    def hit_rate(self) -> float:
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+
+@dataclasses.dataclass
+class _Entry:
+    answer: str
+    embedding: np.ndarray | None
+    key_terms: frozenset[str]
+    compute_seconds: float
+    expires_at: float
+
+
+class AnswerCache:
+    """In-memory LRU cache of tool answers with a time to live.
+
+    Args:
+        corpus_versions: The corpus version function of each cacheable tool.
+        max_entries: The number of answers to keep.
+        ttl: Seconds an answer stays valid.
+        similarity_threshold: Cosine similarity above which a cached question
+            with the same tool, corpus version and key terms counts as the same
+            question.
+        embed: Embeds a normalized question. Without it only exact matches hit.
+    """
+
+    def __init__(
+        self,
+        corpus_versions: dict[str, CorpusVersion],
+        max_entries: int = 1024,
+        ttl: float = 3600.0,
+        similarity_threshold: float = 0.95,
+        embed: t.Callable[[str], t.Awaitable[list[float]]] | None = None,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.corpus_versions = corpus_versions
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.similarity_threshold = similarity_threshold
+        self.embed = embed
+        self.clock = clock
+        self.stats = AnswerCacheStats()
+        self._entries: collections.OrderedDict[tuple[str, str, str], _Entry] = (
+            collections.OrderedDict()
+        )
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _evict(self) -> None:
+        now = self.clock()
+        for key in [k for k, e in self._entries.items() if e.expires_at <= now]:
+            del self._entries[key]
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _similar(
+        self,
+        tool_name: str,
+        version: str,
+        embedding: np.ndarray,
+        terms: frozenset[str],
+    ) -> _Entry | None:
+        candidates = [
+            (key, entry)
+            for key, entry in self._entries.items()
+            if key[:2] == (tool_name, version)
+            and entry.embedding is not None
+            and entry.key_terms == terms
+        ]
+        if not candidates:
+            return None
+        embeddings = np.stack([entry.embedding for _, entry in candidates])
+        similarities = embeddings @ embedding
+        best = int(np.argmax(similarities))
+        if similarities[best] < self.similarity_threshold:
+            return None
+        key, entry = candidates[best]
+        self._entries.move_to_end(key)
+        return entry
+
+    async def _embed(self, query: str) -> np.ndarray | None:
+        if self.embed is None:
+            return None
+        try:
+            embedding = np.asarray(await self.embed(query), dtype=np.float32)
+        except Exception:
+            logger.warning(
+                "Could not embed %r, matching it exactly.", query, exc_info=True
+            )
+            return None
+        return embedding / (np.linalg.norm(embedding) or 1.0)
+
+    async def get_or_compute(
+        self,
+        tool_name: str,
+        kwargs: dict[str, t.Any],
+        compute: t.Callable[[], t.Awaitable[str]],
+    ) -> str:
+        """Return the cached answer of the tool call, or `compute` and cache it.
+
+        Only calls of tools with a corpus version and a `query` argument are
+        cached. Answers are only cached if `compute` returns.
+        """
+        span = current_span()
+        corpus_version = self.corpus_versions.get(tool_name)
+        try:
+            # Corpus versions read files and databases.
+            version = (
+                await asyncio.to_thread(corpus_version, **kwargs)
+                if corpus_version
+                else None
+            )
+        except Exception:
+            # Let the tool itself report the problem, e.g. a missing file.
+            version = None
+        if version is None or not isinstance(kwargs.get("query"), str):
+            self.stats.bypasses += 1
+            _record(span, "bypass")
+            return await compute()
+        self._evict()
+        query = normalize_query(kwargs["query"])
+        terms = key_terms(query)
+        key = (tool_name, version, query)
+        entry = self._entries.get(key)
+        embedding = None
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.stats.exact_hits += 1
+            _record(span, "exact_hit")
+        elif (embedding := await self._embed(query)) is not None:
+            entry = self._similar(tool_name, version, embedding, terms)
+            if entry is not None:
+                self.stats.semantic_hits += 1
+                _record(span, "semantic_hit")
+        if entry is not None:
+            self.stats.seconds_saved += entry.compute_seconds
+            span.set_attribute("answer_cache_seconds_saved", entry.compute_seconds)
+            return entry.answer
+        self.stats.misses += 1
+        _record(span, "miss")
+        start = self.clock()
+        answer = await compute()
+        now = self.clock()
+        self._entries[key] = _Entry(
+            answer, embedding, terms, now - start, now + self.ttl
+        )
+        self._evict()
+        return answer
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+
+async def _embed_query(query: str) -> list[float]:
+    initialize_llama_index()
+    return await Settings.embed_model.aget_query_embedding(query)
+
+
+_answer_cache: AnswerCache | None = None
+
+
+def get_answer_cache() -> AnswerCache:
+    """Return the process-wide answer cache, configured from the settings."""
+    global _answer_cache
+    if _answer_cache is None:
+        settings = get_settings()
+        _answer_cache = AnswerCache(
+            CORPUS_VERSIONS,
+            max_entries=settings.answer_cache_max_entries,
+            ttl=settings.answer_cache_ttl,
+            similarity_threshold=settings.answer_cache_similarity_threshold,
+            embed=_embed_query,
+        )
+    return _answer_cache
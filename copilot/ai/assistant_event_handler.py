@@ -1,5 +1,6 @@
 import datetime
 import traceback
+import typing as t
 
 import chainlit as cl
 import openai
@@ -10,8 +11,16 @@ from openai.types.beta.threads.runs import RunStep, ToolCall, ToolCallDelta
 
 from copilot import REPO_ROOT
 from copilot import constants
-from copilot.ai.openai_.function_calling import execute_tools
+from copilot.ai.openai_.citations import (
+    cited_file_ids,
+    get_file_metadata_cache,
+    replace_annotations,
+)
+from copilot.ai.openai_.tool_executor import get_tool_executor
+from copilot.ai.token_coalescer import TokenCoalescer
 from copilot.resources import RESOURCES_ROOT
+from copilot.settings import get_settings
+from copilot.tracing import current_span, get_tracer
 
 
 class EventHandler(openai.AsyncAssistantEventHandler):
@@ -20,13 +29,38 @@ class EventHandler(openai.AsyncAssistantEventHandler):
         self.current_message: cl.Message | None = None
         self.current_step: cl.Step | None = None
         self.current_tool_call_id: str | None = None
+        self.tool_call_steps: dict[str, cl.Step] = {}
+        self.tool_progress: dict[str, TokenCoalescer] = {}
+        # The latest run, with the token usage of the thread once it completes.
+        self.last_run: Run | None = None
         self.assistant_name = assistant_name
         self.client = client
+        self.text_stream = self._coalescer(self._stream_text)
+        # Ends when the first token is sent to the UI.
+        self.first_token_span = get_tracer().start_span("time_to_first_token")
+
+    def _coalescer(self, send: t.Callable[[str], t.Awaitable[t.Any]]) -> TokenCoalescer:
+        settings = get_settings()
+        return TokenCoalescer(
+            send,
+            interval=settings.stream_flush_interval,
+            max_chars=settings.stream_flush_chars,
+        )
+
+    async def _stream_text(self, text: str) -> None:
+        if self.current_message is None:
+            self.current_message = await cl.Message(
+                author=self.assistant_name,
+                content="",
+            ).send()
+        await self.current_message.stream_token(text)
+        self.first_token_span.end()
 
     async def on_run_step_start(self, step: RunStep) -> None:
         cl.user_session.set(constants.CURRENT_RUN_STEP_KEY, step)
 
     async def on_text_created(self, text: str) -> None:
+        await self.text_stream.flush()
         self.current_message = await cl.Message(
             author=self.assistant_name,
             content="",
@@ -34,18 +68,17 @@ class EventHandler(openai.AsyncAssistantEventHandler):
 
     async def on_text_delta(self, delta: TextDelta, snapshot: Text) -> None:
         if delta.value:
-            assert self.current_message is not None
-            await self.current_message.stream_token(delta.value)
+            await self.text_stream.push(delta.value)
 
     async def on_text_done(self, text: Text) -> None:
+        await self.text_stream.flush()
         assert self.current_message is not None
         await self.current_message.update()
-        citations = []
-        for index, annotation in enumerate(text.annotations):
-            text.value = text.value.replace(annotation.text, f"[{index}]")
-            if file_citation := getattr(annotation, "file_citation", None):
-                cited_file = await self.client.files.retrieve(file_citation.file_id)
-                citations.append(cited_file)
+        with get_tracer().span("resolve_citations"):
+            citations = await get_file_metadata_cache().retrieve_many(
+                self.client, cited_file_ids(text)
+            )
+        text.value = replace_annotations(text)
         elements = []
         for citation in citations:
             if (RESOURCES_ROOT / citation.filename).exists():
@@ -68,6 +101,7 @@ class EventHandler(openai.AsyncAssistantEventHandler):
             await cl.Message(content="", elements=elements).send()
 
     async def on_tool_call_created(self, tool_call: ToolCall) -> None:
+        await self.text_stream.flush()
         self.current_tool_call_id = tool_call.id
         self.current_step = cl.Step(
             name=tool_call.function.name
@@ -78,6 +112,7 @@ class EventHandler(openai.AsyncAssistantEventHandler):
         )
         self.current_step.show_input = "python"
         self.current_step.start = str(datetime.datetime.now())
+        self.tool_call_steps[tool_call.id] = self.current_step
         await self.current_step.send()
 
     async def on_tool_call_delta(
@@ -96,6 +131,7 @@ class EventHandler(openai.AsyncAssistantEventHandler):
             if snapshot.type == "function":
                 self.current_step.name = snapshot.function.name
                 self.current_step.language = "json"
+            self.tool_call_steps[snapshot.id] = self.current_step
             await self.current_step.send()
 
     async def on_tool_call_done(self, tool_call: ToolCall) -> None:
@@ -103,6 +139,13 @@ class EventHandler(openai.AsyncAssistantEventHandler):
         self.current_step.end = str(datetime.datetime.now())
         await self.current_step.update()
 
+    async def on_tool_progress(self, tool_call_id: str, text: str) -> None:
+        """Stream the progress of a running tool into the step of its call."""
+        if (step := self.tool_call_steps.get(tool_call_id)) is not None:
+            if tool_call_id not in self.tool_progress:
+                self.tool_progress[tool_call_id] = self._coalescer(step.stream_token)
+            await self.tool_progress[tool_call_id].push(text)
+
     async def handle_requires_action(
         self,
         data: Run,
@@ -110,24 +153,36 @@ class EventHandler(openai.AsyncAssistantEventHandler):
     ) -> None:
         assert data.required_action is not None
         tool_calls = data.required_action.submit_tool_outputs.tool_calls
-        tool_outputs = list(execute_tools(tool_calls))
-        async with self.client.beta.threads.runs.submit_tool_outputs_stream(
-            thread_id=data.thread_id,
-            run_id=run_id,
-            tool_outputs=tool_outputs,
-        ) as stream:
-            async for delta in stream.text_deltas:
-                if self.current_message is None:
-                    self.current_message = await cl.Message(
-                        author=self.assistant_name,
-                        content="",
-                    ).send()
-                await self.current_message.stream_token(delta)
+        tracer = get_tracer()
+        with tracer.span("tool_calls", count=len(tool_calls)):
+            tool_outputs = await get_tool_executor().execute_tools(
+                tool_calls, on_progress=self.on_tool_progress
+            )
+        for tool_call in tool_calls:
+            if (progress := self.tool_progress.pop(tool_call.id, None)) is not None:
+                await progress.flush()
+            step = self.tool_call_steps.get(tool_call.id)
+            if step is not None and step.streaming:
+                await step.update()
+        with tracer.span("submit_tool_outputs"):
+            async with self.client.beta.threads.runs.submit_tool_outputs_stream(
+                thread_id=data.thread_id,
+                run_id=run_id,
+                tool_outputs=tool_outputs,
+            ) as stream:
+                async for delta in stream.text_deltas:
+                    await self.text_stream.push(delta)
+                await self.text_stream.flush()
+                self.last_run = await stream.get_final_run()
 
     async def on_event(
         self,
         event: AssistantStreamEvent,
     ) -> None:
+        if event.event in ("thread.run.created", "thread.run.requires_action"):
+            current_span().add_event(event.event)
+        if event.event == "thread.run.completed":
+            self.last_run = event.data
         if event.event == "thread.run.requires_action":
             run_id = event.data.id
             await self.handle_requires_action(event.data, run_id)
@@ -136,6 +191,12 @@ class EventHandler(openai.AsyncAssistantEventHandler):
                 content=event.data.message,
             ).send()
 
+    async def on_end(self) -> None:
+        await self.text_stream.flush()
+        if self.first_token_span.is_recording:
+            self.first_token_span.set_attribute("no_tokens", True)
+            self.first_token_span.end()
+
     async def on_exception(self, exception: Exception) -> None:
         await cl.ErrorMessage(
             content="\n".join(
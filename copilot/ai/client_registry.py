@@ -0,0 +1,172 @@
+"""Process-wide registry of pooled API clients.
+
+Every chat turn used to build new OpenAI, Pinecone and LlamaParse clients, and
+with them a new HTTP connection pool and TLS handshake. The registry builds each
+client once, on first use, on top of keep-alive connection pools and closes
+them all together on shutdown.
+"""
+
+import dataclasses
+import functools
+
+import httpx
+import openai
+from llama_parse import LlamaParse, ResultType
+from pinecone import Pinecone
+from pinecone.data import Index
+
+from copilot.settings import CopilotSettings, get_settings
+
+
+@dataclasses.dataclass(frozen=True)
+class PoolLimits:
+    """Connection pool limits shared by the HTTP clients of the registry."""
+
+    max_connections: int = 100
+    max_keepalive_connections: int = 20
+    keepalive_expiry: float = 30.0
+    timeout: float = 600.0
+
+    @classmethod
+    def from_settings(cls, settings: CopilotSettings) -> "PoolLimits":
+        return cls(
+            max_connections=settings.http_max_connections,
+            max_keepalive_connections=settings.http_max_keepalive_connections,
+            keepalive_expiry=settings.http_keepalive_expiry,
+            timeout=settings.http_timeout,
+        )
+
+    def as_httpx_limits(self) -> httpx.Limits:
+        return httpx.Limits(
+            max_connections=self.max_connections,
+            max_keepalive_connections=self.max_keepalive_connections,
+            keepalive_expiry=self.keepalive_expiry,
+        )
+
+
+class ClientRegistry:
+    """Lazily builds and caches the API clients used by the app."""
+
+    def __init__(
+        self,
+        settings: CopilotSettings | None = None,
+        limits: PoolLimits | None = None,
+    ) -> None:
+        self.settings = settings or get_settings()
+        self.limits = limits or PoolLimits.from_settings(self.settings)
+        self._pinecone_indexes: dict[str, Index] = {}
+        self._closed = False
+
+    def _check_open(self) -> None:
+        if self._closed:
+            raise RuntimeError("The client registry has been closed.")
+
+    @functools.cached_property
+    def async_http_client(self) -> httpx.AsyncClient:
+        self._check_open()
+        return openai.DefaultAsyncHttpxClient(
+            limits=self.limits.as_httpx_limits(),
+            timeout=self.limits.timeout,
+        )
+
+    @functools.cached_property
+    def http_client(self) -> httpx.Client:
+        self._check_open()
+        return openai.DefaultHttpxClient(
+            limits=self.limits.as_httpx_limits(),
+            timeout=self.limits.timeout,
+        )
+
+    @functools.cached_property
+    def llama_parse_http_client(self) -> httpx.AsyncClient:
+        # LlamaParse sets its base URL, timeout and API key on the client it is
+        # given, so it cannot share the pool of the OpenAI clients.
+        self._check_open()
+        return httpx.AsyncClient(
+            limits=self.limits.as_httpx_limits(),
+            timeout=self.limits.timeout,
+        )
+
+    @functools.cached_property
+    def async_openai_client(self) -> openai.AsyncOpenAI:
+        self._check_open()
+        return openai.AsyncOpenAI(
+            api_key=self.settings.openai_api_key,
+            base_url=self.settings.openai_base_url,
+            http_client=self.async_http_client,
+        )
+
+    @functools.cached_property
+    def openai_client(self) -> openai.OpenAI:
+        self._check_open()
+        return openai.OpenAI(
+            api_key=self.settings.openai_api_key,
+            base_url=self.settings.openai_base_url,
+            http_client=self.http_client,
+        )
+
+    @functools.cached_property
+    def pinecone(self) -> Pinecone:
+        self._check_open()
+        return Pinecone(
+            api_key=self.settings.pinecone_api_key,
+            pool_threads=self.settings.pinecone_pool_threads,
+        )
+
+    def pinecone_index(self, name: str) -> Index:
+        """Return the (cached) handle of the Pinecone index called `name`."""
+        self._check_open()
+        try:
+            return self._pinecone_indexes[name]
+        except KeyError:
+            index = self.pinecone.Index(
+                name, pool_threads=self.settings.pinecone_pool_threads
+            )
+            return self._pinecone_indexes.setdefault(name, index)
+
+    @functools.cached_property
+    def llama_parse(self) -> LlamaParse:
+        self._check_open()
+        return LlamaParse(
+            api_key=self.settings.llama_cloud_api_key,
+            result_type=ResultType.MD,
+            custom_client=self.llama_parse_http_client,
+        )
+
+    async def aclose(self) -> None:
+        """Close every client that was built and its connection pool."""
+        if self._closed:
+            return
+        self._closed = True
+        built = self.__dict__
+        for index in self._pinecone_indexes.values():
+            # `Index.__exit__` closes the thread pool of its API client.
+            index.__exit__(None, None, None)
+        self._pinecone_indexes.clear()
+        if "pinecone" in built:
+            built["pinecone"].index_api.api_client.close()
+        if "async_http_client" in built:
+            await built["async_http_client"].aclose()
+        if "llama_parse_http_client" in built:
+            await built["llama_parse_http_client"].aclose()
+        if "http_client" in built:
+            built["http_client"].close()
+
+
+_registry: ClientRegistry | None = None
+
+
+def get_client_registry() -> ClientRegistry:
+    """Return the process-wide client registry, creating it on first use."""
+    global _registry
+    if _registry is None:
+        _registry = ClientRegistry()
+    return _registry
+
+
+async def close_client_registry() -> None:
+    """Close the process-wide client registry. The next use builds a new one."""
+    global _registry
+    registry, _registry = _registry, None
+    if registry is not None:
+        await registry.aclose()
@@ -0,0 +1 @@
+"""Loading and querying the tabular files the user uploads."""
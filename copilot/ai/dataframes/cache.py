@@ -0,0 +1,174 @@
+"""Cache of the DataFrames and query engines built from uploaded CSV files.
+
+`csv_qa_tool` used to parse the CSV and build a new query engine on every
+question, so follow-up questions about the same file paid the full load again.
+"""
+
+import collections
+import dataclasses
+import hashlib
+import os
+import threading
+import typing as t
+from pathlib import Path
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.feather
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+
+from copilot import constants
+from copilot.ai.dataframes.profile import TableProfile, profile_dataframe
+from copilot.settings import get_settings
+
+
+@dataclasses.dataclass(frozen=True)
+class FileKey:
+    """Identifies one version of a file by its path, modification time and size."""
+
+    path: str
+    mtime_ns: int
+    size: int
+
+    @classmethod
+    def from_path(cls, path: str | Path) -> "FileKey":
+        resolved = Path(path).resolve()
+        stat = resolved.stat()
+        return cls(str(resolved), stat.st_mtime_ns, stat.st_size)
+
+    @property
+    def path_hash(self) -> str:
+        return hashlib.sha256(self.path.encode()).hexdigest()[:32]
+
+
+@dataclasses.dataclass
+class _Entry:
+    df: pd.DataFrame
+    nbytes: int
+    query_engines: dict[str, BaseQueryEngine] = dataclasses.field(default_factory=dict)
+    profile: TableProfile | None = None
+    # Guards building the profile and query engines of this entry only.
+    lock: threading.Lock = dataclasses.field(default_factory=threading.Lock)
+
+
+class DataFrameCache:
+    """Memory-bounded LRU cache of the DataFrames loaded from CSV files.
+
+    On first load a CSV is converted to an uncompressed Arrow IPC (Feather)
+    file next to the cache, which later loads, e.g. after eviction or a
+    restart, memory-map instead of parsing the CSV again. The query engines
+    built over a DataFrame are cached with it.
+    """
+
+    def __init__(self, max_bytes: int = 2 << 30, arrow_dir: Path | None = None):
+        self.max_bytes = max_bytes
+        self.arrow_dir = arrow_dir or constants.DATAFRAME_CACHE_DIR
+        self._entries: collections.OrderedDict[FileKey, _Entry] = (
+            collections.OrderedDict()
+        )
+        # `_lock` only guards `_entries` and `_key_locks`; loading a file holds
+        # the lock of its key, so other files are served meanwhile.
+        self._lock = threading.RLock()
+        self._key_locks: dict[FileKey, threading.Lock] = {}
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(entry.nbytes for entry in self._entries.values())
+
+    def __contains__(self, csv_path: str | Path) -> bool:
+        return FileKey.from_path(csv_path) in self._entries
+
+    def arrow_path(self, key: FileKey) -> Path:
+        return self.arrow_dir / f"{key.path_hash}-{key.mtime_ns}-{key.size}.arrow"
+
+    def _load(self, key: FileKey) -> pd.DataFrame:
+        arrow_path = self.arrow_path(key)
+        if arrow_path.exists():
+            table = pyarrow.feather.read_table(arrow_path, memory_map=True)
+            # `split_blocks` lets columns share the memory-mapped buffers.
+            return table.to_pandas(split_blocks=True)
+        # Parse with pandas so dtypes match what the tool has always seen.
+        df = pd.read_csv(key.path)
+        try:
+            self._write_arrow(key, pa.Table.from_pandas(df, preserve_index=False))
+        except (pa.ArrowException, OSError):
+            # Mixed-type object columns cannot be stored; keep them in memory only.
+            pass
+        return df
+
+    def _write_arrow(self, key: FileKey, table: pa.Table) -> None:
+        self.arrow_dir.mkdir(parents=True, exist_ok=True)
+        # Older versions of the same CSV will not be read again.
+        for stale in self.arrow_dir.glob(f"{key.path_hash}-*.arrow"):
+            stale.unlink(missing_ok=True)
+        arrow_path = self.arrow_path(key)
+        tmp_path = arrow_path.with_suffix(f".{os.getpid()}.tmp")
+        pyarrow.feather.write_feather(table, tmp_path, compression="uncompressed")
+        tmp_path.replace(arrow_path)
+
+    def _get_entry(self, csv_path: str | Path) -> _Entry:
+        key = FileKey.from_path(csv_path)
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        with key_lock:
+            with self._lock:
+                # Loaded by another thread while this one waited for the key.
+                if key in self._entries:
+                    self._entries.move_to_end(key)
+                    return self._entries[key]
+            df = self._load(key)
+            entry = _Entry(df, int(df.memory_usage(deep=True).sum()))
+            with self._lock:
+                self._entries[key] = entry
+                while self.total_bytes > self.max_bytes and len(self._entries) > 1:
+                    evicted, _ = self._entries.popitem(last=False)
+                    self._key_locks.pop(evicted, None)
+            return entry
+
+    def get(self, csv_path: str | Path) -> pd.DataFrame:
+        return self._get_entry(csv_path).df
+
+    def get_profile(self, csv_path: str | Path) -> TableProfile:
+        """Return the profile of the DataFrame of `csv_path`, computing it once."""
+        entry = self._get_entry(csv_path)
+        with entry.lock:
+            if entry.profile is None:
+                entry.profile = profile_dataframe(entry.df)
+            return entry.profile
+
+    def get_query_engine(
+        self,
+        csv_path: str | Path,
+        model: str,
+        factory: t.Callable[[pd.DataFrame, str], BaseQueryEngine],
+    ) -> BaseQueryEngine:
+        """Return the query engine for `model` over the DataFrame of `csv_path`.
+
+        `factory` builds the query engine from the DataFrame and model on a miss.
+        """
+        entry = self._get_entry(csv_path)
+        with entry.lock:
+            if model not in entry.query_engines:
+                entry.query_engines[model] = factory(entry.df, model)
+            return entry.query_engines[model]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._key_locks.clear()
+
+
+_dataframe_cache: DataFrameCache | None = None
+
+
+def get_dataframe_cache() -> DataFrameCache:
+    """Return the process-wide DataFrame cache, creating it on first use."""
+    global _dataframe_cache
+    if _dataframe_cache is None:
+        _dataframe_cache = DataFrameCache(
+            max_bytes=get_settings().dataframe_cache_max_bytes
+        )
+    return _dataframe_cache
@@ -0,0 +1,182 @@
+"""Out-of-core question answering over CSV files that do not fit in memory.
+
+`PandasQueryEngine` needs the whole CSV as a DataFrame. For large files the LLM
+instead writes a DuckDB query over a view of the CSV file, which DuckDB streams
+from disk within a memory limit, spilling to disk when it has to.
+"""
+
+import asyncio
+import re
+import threading
+import typing as t
+from pathlib import Path
+
+import duckdb
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.base.response.schema import Response
+from llama_index.core.llms.llm import LLM
+from llama_index.core.prompts import BasePromptTemplate, PromptTemplate
+from llama_index.core.prompts.mixin import PromptDictType, PromptMixinType
+from llama_index.core.schema import QueryBundle
+from llama_index.core.settings import Settings
+
+from copilot import constants
+
+DEFAULT_DUCKDB_PROMPT = PromptTemplate(
+    "You are working with a DuckDB table called `df`.\n"
+    "These are its columns and types:\n"
+    "{schema_str}\n\n"
+    "This is the result of `SELECT * FROM df LIMIT {head}`:\n"
+    "{df_str}\n\n"
+    "Follow these instructions:\n"
+    "{instruction_str}\n"
+    "Query: {query_str}\n\n"
+    "SQL:"
+)
+DEFAULT_INSTRUCTION_STR = (
+    "1. Convert the query to a single DuckDB SQL SELECT statement over `df`.\n"
+    "2. The statement should represent a solution to the query.\n"
+    "3. PRINT ONLY THE SQL STATEMENT.\n"
+    "4. Do not quote the statement.\n"
+)
+# Rough ratio of the memory taken by a DataFrame to the size of its CSV file.
+CSV_MEMORY_EXPANSION = 4
+_CODE_FENCE = re.compile(r"```(?:sql)?\s*(.*?)```", re.DOTALL | re.IGNORECASE)
+
+
+def fits_in_memory(csv_path: str | Path, memory_budget: int) -> bool:
+    """Whether the CSV can be loaded as a DataFrame within `memory_budget` bytes."""
+    return Path(csv_path).stat().st_size * CSV_MEMORY_EXPANSION <= memory_budget
+
+
+def parse_sql(response: str, connection: duckdb.DuckDBPyConnection) -> str:
+    """Extract the single SELECT statement from the LLM's `response`.
+
+    Raises:
+        ValueError: If the response is not exactly one SELECT statement.
+    """
+    match = _CODE_FENCE.search(response)
+    sql = (match.group(1) if match else response).strip()
+    statements = connection.extract_statements(sql)
+    if len(statements) != 1 or statements[0].type != duckdb.StatementType.SELECT:
+        raise ValueError(f"Expected a single SELECT statement, got: {sql}")
+    return statements[0].query
+
+
+class DuckDBQueryEngine(BaseQueryEngine):
+    """Convert natural language to DuckDB SQL run directly on a CSV file.
+
+    Args:
+        csv_path: The CSV file to query.
+        llm: Language model to use.
+        memory_limit: Memory DuckDB may use before spilling to `temp_directory`.
+        head: Number of rows to show in the table context.
+        max_rows: Maximum number of result rows to return.
+        temp_directory: Where DuckDB spills intermediate results.
+    """
+
+    def __init__(
+        self,
+        csv_path: str | Path,
+        llm: LLM | None = None,
+        memory_limit: int = 1 << 30,
+        head: int = 5,
+        max_rows: int = 100,
+        temp_directory: Path | None = None,
+        duckdb_prompt: BasePromptTemplate | None = None,
+        instruction_str: str | None = None,
+    ) -> None:
+        self._csv_path = Path(csv_path)
+        self._llm = llm or Settings.llm
+        self._head = head
+        self._max_rows = max_rows
+        self._duckdb_prompt = duckdb_prompt or DEFAULT_DUCKDB_PROMPT
+        self._instruction_str = instruction_str or DEFAULT_INSTRUCTION_STR
+        temp_directory = temp_directory or constants.DUCKDB_TEMP_DIR
+        temp_directory.mkdir(parents=True, exist_ok=True)
+        self._connection = duckdb.connect(
+            config={
+                "memory_limit": f"{memory_limit}B",
+                "temp_directory": str(temp_directory),
+            }
+        )
+        # The SQL comes from the LLM, so the connection may read the CSV file
+        # only: no other files (e.g. `read_text('/etc/passwd')`), no URLs, and
+        # the configuration is locked so queries cannot lift the restriction.
+        csv_path_str = str(self._csv_path.resolve())
+        self._connection.execute("SET allowed_paths = ?", [[csv_path_str]])
+        self._connection.execute("SET enable_external_access = false")
+        self._connection.execute("SET lock_configuration = true")
+        # Views cannot take prepared parameters, so the path is quoted inline.
+        quoted_path = csv_path_str.replace("'", "''")
+        self._connection.execute(
+            f"CREATE VIEW df AS SELECT * FROM read_csv_auto('{quoted_path}')"
+        )
+        # Connections are not thread-safe, so every query takes its own cursor.
+        self._lock = threading.Lock()
+        self._table_context: tuple[str, str] | None = None
+        super().__init__(callback_manager=Settings.callback_manager)
+
+    def _get_prompt_modules(self) -> PromptMixinType:
+        return {}
+
+    def _get_prompts(self) -> dict[str, t.Any]:
+        return {"duckdb_prompt": self._duckdb_prompt}
+
+    def _update_prompts(self, prompts: PromptDictType) -> None:
+        if "duckdb_prompt" in prompts:
+            self._duckdb_prompt = prompts["duckdb_prompt"]
+
+    def _cursor(self) -> duckdb.DuckDBPyConnection:
+        with self._lock:
+            return self._connection.cursor()
+
+    def _get_table_context(self) -> tuple[str, str]:
+        """Return the schema and the first rows of the CSV, reading only those rows."""
+        if self._table_context is None:
+            with self._cursor() as cursor:
+                schema = cursor.sql("DESCRIBE df").df()[["column_name", "column_type"]]
+                head = cursor.sql(f"SELECT * FROM df LIMIT {self._head}").df()
+            self._table_context = (
+                schema.to_string(index=False, header=False),
+                str(head),
+            )
+        return self._table_context
+
+    def _predict_kwargs(self, query_bundle: QueryBundle) -> dict[str, t.Any]:
+        schema_str, df_str = self._get_table_context()
+        return {
+            "schema_str": schema_str,
+            "head": self._head,
+            "df_str": df_str,
+            "query_str": query_bundle.query_str,
+            "instruction_str": self._instruction_str,
+        }
+
+    def _run_sql(self, sql_response_str: str) -> Response:
+        with self._cursor() as cursor:
+            try:
+                sql = parse_sql(sql_response_str, cursor)
+                result = cursor.sql(sql).limit(self._max_rows).df()
+                output = result.to_string(index=False)
+            except (duckdb.Error, ValueError) as e:
+                output = (
+                    f"There was an error running the query: {sql_response_str}\n{e}"
+                )
+        return Response(
+            response=output,
+            metadata={"sql_instruction_str": sql_response_str},
+        )
+
+    def _query(self, query_bundle: QueryBundle) -> Response:
+        sql_response_str = self._llm.predict(
+            self._duckdb_prompt, **self._predict_kwargs(query_bundle)
+        )
+        return self._run_sql(sql_response_str)
+
+    async def _aquery(self, query_bundle: QueryBundle) -> Response:
+        # Reading the table context and running the query scan the CSV, so they
+        # run in a thread, while the LLM is awaited on the event loop.
+        kwargs = await asyncio.to_thread(self._predict_kwargs, query_bundle)
+        sql_response_str = await self._llm.apredict(self._duckdb_prompt, **kwargs)
+        return await asyncio.to_thread(self._run_sql, sql_response_str)
@@ -0,0 +1,244 @@
+"""Compact, token-budgeted descriptions of DataFrames for query engine prompts.
+
+`PandasQueryEngine` puts `str(df.head())` in every prompt, which for tables with
+hundreds of columns costs thousands of tokens per question. A `TableProfile`
+summarises each column on one line and adds a few sample rows as CSV, dropping
+whatever does not fit in the token budget.
+"""
+
+import asyncio
+import dataclasses
+import logging
+import typing as t
+
+import pandas as pd
+from llama_index.core.base.response.schema import Response
+from llama_index.core.prompts import PromptTemplate, PromptType
+from llama_index.core.schema import QueryBundle
+from llama_index.experimental import PandasQueryEngine
+from llama_index.experimental.query_engine.pandas.output_parser import (
+    PandasInstructionParser,
+    default_output_processor,
+)
+
+from copilot.ai.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+
+PROFILE_PANDAS_PROMPT = PromptTemplate(
+    "You are working with a pandas dataframe in Python.\n"
+    "The name of the dataframe is `df`.\n"
+    "This is a profile of `df` with some of its rows:\n"
+    "{df_str}\n\n"
+    "Follow these instructions:\n"
+    "{instruction_str}\n"
+    "Query: {query_str}\n\n"
+    "Expression:",
+    prompt_type=PromptType.PANDAS,
+)
+# Longest rendering of a single value in the profile.
+MAX_VALUE_CHARS = 40
+
+
+def _format_value(value: t.Any) -> str:
+    if isinstance(value, float):
+        text = f"{value:.6g}"
+    else:
+        text = str(value)
+    if len(text) > MAX_VALUE_CHARS:
+        text = text[: MAX_VALUE_CHARS - 3] + "..."
+    return text
+
+
+@dataclasses.dataclass
+class TableProfile:
+    """Per-column statistics and sample rows of a DataFrame.
+
+    Attributes:
+        n_rows: The number of rows of the DataFrame.
+        column_lines: One line per column with its dtype, cardinality and range.
+        names: The names of the columns of each dtype.
+        sample: A few rows of the DataFrame.
+        head_tokens: Tokens of the `df.head()` context `PandasQueryEngine` would use.
+    """
+
+    n_rows: int
+    column_lines: list[str]
+    names: dict[str, list[str]]
+    sample: pd.DataFrame
+    head_tokens: int
+
+    def render(self, max_tokens: int) -> str:
+        """Render the profile in at most about `max_tokens` tokens.
+
+        Column lines come first, then as many sample rows as fit. Tables too wide
+        for their column lines only list their column names, grouped by dtype.
+        """
+        header = f"{self.n_rows} rows x {len(self.column_lines)} columns."
+        lines = [header, "Columns (name: dtype, unique values, nulls, range):"]
+        lines += self.column_lines
+        used = count_tokens("\n".join(lines))
+        if used > max_tokens:
+            return self._render_names(header, max_tokens)
+        sample_csv = self.sample.map(_format_value).to_csv(index=False).splitlines()
+        sample_csv = _truncate(sample_csv, max_tokens - used - 8)
+        if len(sample_csv) > 1:
+            lines += ["Sample rows (CSV):", *sample_csv]
+        return "\n".join(lines)
+
+    def _render_names(self, header: str, max_tokens: int) -> str:
+        lines = [header, "Columns by dtype:"]
+        # Keep room for the "and N more" notes.
+        budget = max_tokens - count_tokens("\n".join(lines)) - 8 * len(self.names)
+        # Smaller dtypes go first so the budget they leave over goes to larger ones.
+        by_size = sorted(self.names.items(), key=lambda item: len(item[1]))
+        dtype_lines = {}
+        for i, (dtype, names) in enumerate(by_size):
+            prefix = f"- {dtype}: "
+            share = budget // (len(by_size) - i) - count_tokens(prefix)
+            kept = _truncate(names, share, sep=", ")
+            dtype_lines[dtype] = prefix + ", ".join(kept)
+            if len(kept) < len(names):
+                dtype_lines[dtype] += f" and {len(names) - len(kept)} more"
+            budget -= count_tokens(dtype_lines[dtype]) + 1
+        return "\n".join(lines + [dtype_lines[dtype] for dtype in self.names])
+
+
+def _truncate(lines: list[str], max_tokens: int, sep: str = "\n") -> list[str]:
+    """Return the leading `lines` that fit in `max_tokens` when joined with `sep`."""
+    used = 0
+    for i, line in enumerate(lines):
+        used += count_tokens(line) + count_tokens(sep)
+        if used > max_tokens:
+            return lines[:i]
+    return lines
+
+
+def profile_dataframe(
+    df: pd.DataFrame, sample_rows: int = 3, head: int = 5
+) -> TableProfile:
+    """Profile `df` with vectorized pandas operations.
+
+    Args:
+        df: The DataFrame to profile.
+        sample_rows: The number of rows to include as examples.
+        head: The number of rows `PandasQueryEngine` would show, to count the tokens
+            the profile saves.
+    """
+    unique = df.nunique()
+    nulls = df.isna().sum()
+    ordered = df.select_dtypes(include=["number", "datetime", "timedelta"])
+    minimum, maximum = ordered.min(), ordered.max()
+    column_lines = []
+    for column, dtype in df.dtypes.items():
+        line = f"- {column}: {dtype}, {unique[column]} unique, {nulls[column]} nulls"
+        if column in minimum.index:
+            low, high = _format_value(minimum[column]), _format_value(maximum[column])
+            line += f", {low} to {high}"
+        column_lines.append(line)
+    names = {
+        dtype: list(map(str, columns))
+        for dtype, columns in df.columns.groupby(df.dtypes.astype(str)).items()
+    }
+    sample = df.sample(n=min(sample_rows, len(df)), random_state=0).sort_index()
+    return TableProfile(
+        n_rows=len(df),
+        column_lines=column_lines,
+        names=names,
+        sample=sample,
+        head_tokens=count_tokens(str(df.head(head))),
+    )
+
+
+class CopyingInstructionParser(PandasInstructionParser):
+    """Run the LLM's pandas code on a copy of the DataFrame.
+
+    The DataFrame is shared by every question through the `DataFrameCache`, and
+    may be backed by a read-only memory map, so code that changes `df` in place
+    must neither fail nor change it for the next question.
+    """
+
+    def parse(self, output: str) -> t.Any:
+        return default_output_processor(output, self.df.copy(), **self.output_kwargs)
+
+
+class ProfiledPandasQueryEngine(PandasQueryEngine):
+    """`PandasQueryEngine` whose prompt describes the table with a `TableProfile`.
+
+    The table context tokens with and without the profile are logged and added
+    to the metadata of every response as `table_context_tokens`.
+    """
+
+    def __init__(
+        self,
+        df: pd.DataFrame,
+        profile: TableProfile,
+        max_context_tokens: int = 1000,
+        **kwargs: t.Any,
+    ) -> None:
+        kwargs.setdefault("pandas_prompt", PROFILE_PANDAS_PROMPT)
+        kwargs.setdefault(
+            "instruction_parser",
+            CopyingInstructionParser(df, kwargs.pop("output_kwargs", None)),
+        )
+        super().__init__(df, **kwargs)
+        self._profile = profile
+        self._table_context = profile.render(max_context_tokens)
+        self._table_context_tokens = count_tokens(self._table_context)
+
+    def _get_table_context(self) -> str:
+        return self._table_context
+
+    def _query(self, query_bundle: QueryBundle) -> Response:
+        return self._with_table_context_tokens(super()._query(query_bundle))
+
+    async def _aquery(self, query_bundle: QueryBundle) -> Response:
+        """Answer a query, awaiting the LLM instead of blocking on it.
+
+        `PandasQueryEngine._aquery` runs the synchronous `_query`. Only the
+        evaluation of the pandas expression runs in a thread here.
+        """
+        pandas_response_str = await self._llm.apredict(
+            self._pandas_prompt,
+            df_str=self._get_table_context(),
+            query_str=query_bundle.query_str,
+            instruction_str=self._instruction_str,
+        )
+        pandas_output = await asyncio.to_thread(
+            self._instruction_parser.parse, pandas_response_str
+        )
+        if self._synthesize_response:
+            response_str = str(
+                await self._llm.apredict(
+                    self._response_synthesis_prompt,
+                    query_str=query_bundle.query_str,
+                    pandas_instructions=pandas_response_str,
+                    pandas_output=pandas_output,
+                )
+            )
+        else:
+            response_str = str(pandas_output)
+        response = Response(
+            response=response_str,
+            metadata={
+                "pandas_instruction_str": pandas_response_str,
+                "raw_pandas_output": pandas_output,
+            },
+        )
+        return self._with_table_context_tokens(response)
+
+    def _with_table_context_tokens(self, response: Response) -> Response:
+        tokens = {
+            "before": self._profile.head_tokens,
+            "after": self._table_context_tokens,
+        }
+        logger.info(
+            "Table context of %d tokens instead of %d.",
+            tokens["after"],
+            tokens["before"],
+        )
+        response.metadata = {
+            **(response.metadata or {}),
+            "table_context_tokens": tokens,
+        }
+        return response
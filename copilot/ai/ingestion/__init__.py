@@ -0,0 +1 @@
+"""Ingestion of uploaded documents into the vector store."""
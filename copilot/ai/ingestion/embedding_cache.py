@@ -0,0 +1,178 @@
+import array
+import asyncio
+import concurrent.futures
+import hashlib
+import re
+import sqlite3
+import threading
+import typing as t
+import unicodedata
+from pathlib import Path
+
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+from pydantic import PrivateAttr
+
+from copilot import constants
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def hash_text(text: str) -> str:
+    """Hash of `text` after Unicode and whitespace normalization."""
+    normalized = _WHITESPACE.sub(" ", unicodedata.normalize("NFC", text)).strip()
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+class EmbeddingStore:
+    """Persistent SQLite cache of embeddings, keyed by model and text hash."""
+
+    def __init__(self, path: Path | None = None) -> None:
+        self.path = path or constants.EMBEDDING_CACHE_PATH
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(self.path, check_same_thread=False)
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "model TEXT NOT NULL, text_hash TEXT NOT NULL, embedding BLOB NOT NULL, "
+            "PRIMARY KEY (model, text_hash))"
+        )
+
+    def get_many(self, model: str, text_hashes: list[str]) -> dict[str, Embedding]:
+        result: dict[str, Embedding] = {}
+        # Stay well below SQLite's limit on the number of query parameters.
+        for start in range(0, len(text_hashes), 500):
+            chunk = text_hashes[start : start + 500]
+            with self._lock:
+                rows = self._connection.execute(
+                    "SELECT text_hash, embedding FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({', '.join('?' * len(chunk))})",
+                    [model, *chunk],
+                ).fetchall()
+            for text_hash, blob in rows:
+                result[text_hash] = array.array("f", blob).tolist()
+        return result
+
+    def put_many(self, model: str, embeddings: dict[str, Embedding]) -> None:
+        with self._lock, self._connection:
+            self._connection.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [
+                    (model, text_hash, array.array("f", embedding).tobytes())
+                    for text_hash, embedding in embeddings.items()
+                ],
+            )
+
+    def close(self) -> None:
+        self._connection.close()
+
+
+class CachedEmbedding(BaseEmbedding):
+    """Wraps an embed model to never embed the same text twice.
+
+    Texts are deduplicated by normalized hash within a batch and looked up in a
+    persistent `EmbeddingStore`. Only the remaining texts are sent to the
+    wrapped model, in batches of its `embed_batch_size`, at most
+    `max_concurrency` batches at a time. Query embeddings are not cached.
+    """
+
+    max_concurrency: int = 4
+    _embed_model: BaseEmbedding = PrivateAttr()
+    _store: EmbeddingStore = PrivateAttr()
+
+    def __init__(
+        self,
+        embed_model: BaseEmbedding,
+        store: EmbeddingStore | None = None,
+        max_concurrency: int = 4,
+        **kwargs: t.Any,
+    ) -> None:
+        kwargs.setdefault("embed_batch_size", 2048)
+        super().__init__(
+            model_name=embed_model.model_name,
+            max_concurrency=max_concurrency,
+            **kwargs,
+        )
+        self._embed_model = embed_model
+        self._store = store or EmbeddingStore()
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "CachedEmbedding"
+
+    @property
+    def embed_model(self) -> BaseEmbedding:
+        return self._embed_model
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._embed_model.get_query_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return await self._embed_model.aget_query_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        return self._get_text_embeddings([text])[0]
+
+    async def _aget_text_embedding(self, text: str) -> Embedding:
+        return (await self._aget_text_embeddings([text]))[0]
+
+    def _plan(
+        self, texts: list[str]
+    ) -> tuple[list[str], dict[str, Embedding], list[list[tuple[str, str]]]]:
+        """Hash `texts` and split the ones that need embedding into batches."""
+        text_hashes = [hash_text(text) for text in texts]
+        unique: dict[str, str] = {}
+        for text_hash, text in zip(text_hashes, texts):
+            unique.setdefault(text_hash, text)
+        cached = self._store.get_many(self.model_name, list(unique))
+        missing = [(h, text) for h, text in unique.items() if h not in cached]
+        batch_size = self._embed_model.embed_batch_size
+        batches = [
+            missing[start : start + batch_size]
+            for start in range(0, len(missing), batch_size)
+        ]
+        return text_hashes, cached, batches
+
+    def _finish(
+        self,
+        text_hashes: list[str],
+        cached: dict[str, Embedding],
+        batches: list[list[tuple[str, str]]],
+        results: list[list[Embedding]],
+    ) -> list[Embedding]:
+        computed = {
+            h: embedding
+            for batch, embeddings in zip(batches, results)
+            for (h, _), embedding in zip(batch, embeddings)
+        }
+        if computed:
+            self._store.put_many(self.model_name, computed)
+        embeddings = cached | computed
+        return [embeddings[h] for h in text_hashes]
+
+    def _get_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        text_hashes, cached, batches = self._plan(texts)
+        embed = self._embed_model.get_text_embedding_batch
+        if len(batches) <= 1:
+            results = [embed([text for _, text in batch]) for batch in batches]
+        else:
+            with concurrent.futures.ThreadPoolExecutor(self.max_concurrency) as pool:
+                results = list(
+                    pool.map(lambda b: embed([text for _, text in b]), batches)
+                )
+        return self._finish(text_hashes, cached, batches, results)
+
+    async def _aget_text_embeddings(self, texts: list[str]) -> list[Embedding]:
+        text_hashes, cached, batches = await asyncio.to_thread(self._plan, texts)
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def embed(batch: list[tuple[str, str]]) -> list[Embedding]:
+            async with semaphore:
+                return await self._embed_model.aget_text_embedding_batch(
+                    [text for _, text in batch]
+                )
+
+        results = await asyncio.gather(*(embed(batch) for batch in batches))
+        return await asyncio.to_thread(
+            self._finish, text_hashes, cached, batches, list(results)
+        )
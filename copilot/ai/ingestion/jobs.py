@@ -0,0 +1,340 @@
+import asyncio
+import dataclasses
+import enum
+import json
+import logging
+import shutil
+import sqlite3
+import threading
+import time
+import typing as t
+import uuid
+from pathlib import Path
+
+from copilot import constants
+
+logger = logging.getLogger(__name__)
+
+
+class JobStatus(str, enum.Enum):
+    PENDING = "pending"
+    RUNNING = "running"
+    DONE = "done"
+    FAILED = "failed"
+
+
+@dataclasses.dataclass
+class Job:
+    id: str
+    file_paths: dict[str, str]
+    status: JobStatus
+    detail: str
+    created_at: float
+    updated_at: float
+    uploaded_by: str | None = None
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (JobStatus.DONE, JobStatus.FAILED)
+
+
+class JobQueue:
+    """Persistent SQLite queue of ingestion jobs, shared by all processes.
+
+    Uploaded files are copied into a staging directory when their job is
+    enqueued, because Chainlit deletes the files of a session when it ends.
+
+    A claimed job is leased to its queue for `lease_seconds`, and the lease must
+    be renewed while the job runs. Running jobs whose lease expired, because
+    their process died, are claimed again. PIDs cannot tell: they are reused,
+    and in a container the worker is PID 1 after every restart.
+    """
+
+    _COLUMNS = "id, file_paths, status, detail, created_at, updated_at, uploaded_by"
+
+    def __init__(
+        self,
+        path: Path | None = None,
+        staging_dir: Path | None = None,
+        lease_seconds: float = 60.0,
+    ):
+        self.path = path or constants.INGESTION_QUEUE_PATH
+        self.staging_dir = staging_dir or constants.INGESTION_STAGING_DIR
+        self.lease_seconds = lease_seconds
+        self.owner = uuid.uuid4().hex
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._connection = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._connection.execute("PRAGMA journal_mode=WAL")
+        self._connection.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            "id TEXT PRIMARY KEY, file_paths TEXT NOT NULL, status TEXT NOT NULL, "
+            "detail TEXT NOT NULL DEFAULT '', owner TEXT, lease_expires_at REAL, "
+            "uploaded_by TEXT, created_at REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        columns = {row[1] for row in self._execute("PRAGMA table_info(jobs)")}
+        for column in ["owner TEXT", "lease_expires_at REAL", "uploaded_by TEXT"]:
+            if column.split()[0] not in columns:
+                self._execute(f"ALTER TABLE jobs ADD COLUMN {column}")
+        self._connection.execute(
+            "CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created_at)"
+        )
+
+    def _execute(self, sql: str, *params: t.Any) -> list[tuple[t.Any, ...]]:
+        with self._lock:
+            return self._connection.execute(sql, params).fetchall()
+
+    @staticmethod
+    def _to_job(row: tuple[t.Any, ...]) -> Job:
+        id_, file_paths, status, detail, created_at, updated_at, uploaded_by = row
+        return Job(
+            id_,
+            json.loads(file_paths),
+            JobStatus(status),
+            detail,
+            created_at,
+            updated_at,
+            uploaded_by,
+        )
+
+    def enqueue(
+        self, file_paths: dict[str, str], uploaded_by: str | None = None
+    ) -> Job:
+        """Stage copies of `file_paths` (name to path) and queue their ingestion."""
+        job_id = uuid.uuid4().hex
+        job_dir = self.staging_dir / job_id
+        job_dir.mkdir(parents=True)
+        staged = {}
+        for i, (file_name, file_path) in enumerate(file_paths.items()):
+            staged[file_name] = str(job_dir / f"{i}{Path(file_path).suffix}")
+            shutil.copyfile(file_path, staged[file_name])
+        now = time.time()
+        self._execute(
+            "INSERT INTO jobs (id, file_paths, status, uploaded_by, created_at, "
+            "updated_at) VALUES (?, ?, ?, ?, ?, ?)",
+            job_id,
+            json.dumps(staged),
+            JobStatus.PENDING.value,
+            uploaded_by,
+            now,
+            now,
+        )
+        return Job(job_id, staged, JobStatus.PENDING, "", now, now, uploaded_by)
+
+    def claim(self) -> Job | None:
+        """Lease the oldest pending or abandoned job to this queue and return it."""
+        now = time.time()
+        rows = self._execute(
+            "UPDATE jobs SET status = ?, owner = ?, lease_expires_at = ?, "
+            "updated_at = ? WHERE id = (SELECT id FROM jobs WHERE status = ? OR "
+            "(status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?)) "
+            f"ORDER BY created_at LIMIT 1) RETURNING {self._COLUMNS}",
+            JobStatus.RUNNING.value,
+            self.owner,
+            now + self.lease_seconds,
+            now,
+            JobStatus.PENDING.value,
+            JobStatus.RUNNING.value,
+            now,
+        )
+        return self._to_job(rows[0]) if rows else None
+
+    def renew(self, job_id: str) -> bool:
+        """Extend the lease of a job claimed by this queue, unless it was lost."""
+        now = time.time()
+        rows = self._execute(
+            "UPDATE jobs SET lease_expires_at = ? WHERE id = ? AND status = ? "
+            "AND owner = ? RETURNING id",
+            now + self.lease_seconds,
+            job_id,
+            JobStatus.RUNNING.value,
+            self.owner,
+        )
+        return bool(rows)
+
+    def update(self, job_id: str, status: JobStatus, detail: str = "") -> bool:
+        """Update a job leased to this queue. Return whether it was updated.
+
+        Jobs whose lease was lost, e.g. to another queue, are left alone, as is
+        their staging directory. Jobs updated to any status but running are
+        released.
+        """
+        now = time.time()
+        release = (
+            ""
+            if status == JobStatus.RUNNING
+            else ", owner = NULL, lease_expires_at = NULL"
+        )
+        rows = self._execute(
+            f"UPDATE jobs SET status = ?, detail = ?, updated_at = ?{release} "
+            "WHERE id = ? AND status = ? AND owner = ? AND lease_expires_at >= ? "
+            "RETURNING id",
+            status.value,
+            detail,
+            now,
+            job_id,
+            JobStatus.RUNNING.value,
+            self.owner,
+            now,
+        )
+        if not rows:
+            logger.warning(
+                "Lost the lease of ingestion job %s, not updating it.", job_id
+            )
+            return False
+        if status in (JobStatus.DONE, JobStatus.FAILED):
+            shutil.rmtree(self.staging_dir / job_id, ignore_errors=True)
+        return True
+
+    def get(self, job_id: str) -> Job | None:
+        rows = self._execute(f"SELECT {self._COLUMNS} FROM jobs WHERE id = ?", job_id)
+        return self._to_job(rows[0]) if rows else None
+
+    def unfinished(self, job_ids: t.Iterable[str] | None = None) -> list[Job]:
+        """Return the pending and running jobs, among `job_ids` if given."""
+        rows = self._execute(
+            f"SELECT {self._COLUMNS} FROM jobs WHERE status IN (?, ?) "
+            "ORDER BY created_at",
+            JobStatus.PENDING.value,
+            JobStatus.RUNNING.value,
+        )
+        jobs = [self._to_job(row) for row in rows]
+        if job_ids is not None:
+            wanted = set(job_ids)
+            jobs = [job for job in jobs if job.id in wanted]
+        return jobs
+
+    def wait(
+        self,
+        job_ids: t.Iterable[str] | None = None,
+        timeout: float = 0.0,
+        poll_interval: float = 0.2,
+    ) -> list[Job]:
+        """Wait up to `timeout` seconds for jobs to finish. Return the unfinished ones."""
+        job_ids = None if job_ids is None else list(job_ids)
+        deadline = time.monotonic() + timeout
+        while (jobs := self.unfinished(job_ids)) and time.monotonic() < deadline:
+            time.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+        return jobs
+
+    async def await_jobs(
+        self,
+        job_ids: t.Iterable[str] | None = None,
+        timeout: float = 0.0,
+        poll_interval: float = 0.2,
+    ) -> list[Job]:
+        """Like `wait`, but sleeping on the event loop instead of blocking it."""
+        job_ids = None if job_ids is None else list(job_ids)
+        deadline = time.monotonic() + timeout
+        while (jobs := self.unfinished(job_ids)) and time.monotonic() < deadline:
+            await asyncio.sleep(min(poll_interval, max(deadline - time.monotonic(), 0)))
+        return jobs
+
+    def recover(self) -> int:
+        """Requeue the running jobs whose lease expired. Return their number."""
+        rows = self._execute(
+            "UPDATE jobs SET status = ?, owner = NULL, lease_expires_at = NULL "
+            "WHERE status = ? AND (lease_expires_at IS NULL OR lease_expires_at < ?) "
+            "RETURNING id",
+            JobStatus.PENDING.value,
+            JobStatus.RUNNING.value,
+            time.time(),
+        )
+        return len(rows)
+
+
+class IngestionWorker:
+    """Pool of asyncio tasks that run the jobs of a `JobQueue`.
+
+    `ingest` is awaited with the name-to-path mapping of each job, an async
+    callback to report progress with and who uploaded the files.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        ingest: t.Callable[
+            [dict[str, str], t.Callable[[str], t.Awaitable[None]], str | None],
+            t.Awaitable[None],
+        ],
+        concurrency: int = 2,
+        poll_interval: float = 5.0,
+    ) -> None:
+        self.queue = queue
+        self.ingest = ingest
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self._tasks: list[asyncio.Task[None]] = []
+        self._wakeup: asyncio.Event | None = None
+
+    @property
+    def running(self) -> bool:
+        return any(not task.done() for task in self._tasks)
+
+    def start(self) -> None:
+        """Start the workers on the running event loop, unless they run already."""
+        if self.running:
+            return
+        if recovered := self.queue.recover():
+            logger.info("Requeued %d interrupted ingestion jobs.", recovered)
+        self._wakeup = asyncio.Event()
+        self._tasks = [
+            asyncio.create_task(self._work(), name=f"ingestion-worker-{i}")
+            for i in range(self.concurrency)
+        ]
+
+    def notify(self) -> None:
+        """Wake the workers up after a job was enqueued."""
+        self.start()
+        assert self._wakeup is not None
+        self._wakeup.set()
+
+    async def stop(self) -> None:
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def _work(self) -> None:
+        assert self._wakeup is not None
+        while True:
+            job = await asyncio.to_thread(self.queue.claim)
+            if job is None:
+                self._wakeup.clear()
+                try:
+                    await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                except TimeoutError:
+                    pass
+                continue
+            await self._run(job)
+
+    async def _renew_lease(self, job: Job) -> None:
+        while True:
+            await asyncio.sleep(self.queue.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.renew, job.id):
+                logger.warning("Lost the lease of ingestion job %s.", job.id)
+                return
+
+    async def _run(self, job: Job) -> None:
+        async def report(detail: str) -> None:
+            await asyncio.to_thread(
+                self.queue.update, job.id, JobStatus.RUNNING, detail
+            )
+
+        heartbeat = asyncio.create_task(self._renew_lease(job))
+        try:
+            await self.ingest(job.file_paths, report, job.uploaded_by)
+        except asyncio.CancelledError:
+            await asyncio.to_thread(self.queue.update, job.id, JobStatus.PENDING)
+            raise
+        except Exception as e:
+            logger.exception("Ingestion job %s failed.", job.id)
+            await asyncio.to_thread(
+                self.queue.update, job.id, JobStatus.FAILED, repr(e)
+            )
+        else:
+            await asyncio.to_thread(self.queue.update, job.id, JobStatus.DONE)
+        finally:
+            heartbeat.cancel()
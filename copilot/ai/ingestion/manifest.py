@@ -0,0 +1,174 @@
+import dataclasses
+import hashlib
+import json
+import time
+from pathlib import Path
+
+from copilot import constants
+from copilot.kv_store import KVStore, Namespace, Transaction, get_kv_store
+
+_HASH_CHUNK_SIZE = 1 << 20
+
+
+def hash_file(path: str | Path) -> str:
+    """Return the SHA-256 hex digest of the file at `path`, read in chunks."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(_HASH_CHUNK_SIZE):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def source_id(uploaded_by: str, file_name: str) -> str:
+    """Return the identity of a file uploaded by a thread owner under a name.
+
+    Uploading a file again under the same source replaces its content, while
+    files of the same name uploaded by others are distinct sources.
+    """
+    return f"{uploaded_by}/{file_name}"
+
+
+@dataclasses.dataclass
+class ManifestEntry:
+    """What was ingested for one document content.
+
+    Attributes:
+        source_ids: The sources whose current content this is, see `source_id`.
+    """
+
+    content_hash: str
+    file_name: str
+    embed_model: str
+    parse_result_path: str | None = None
+    node_ids: list[str] = dataclasses.field(default_factory=list)
+    updated_at: float = dataclasses.field(default_factory=time.time)
+    source_ids: list[str] = dataclasses.field(default_factory=list)
+
+
+class IngestionManifest:
+    """Index of ingested documents, keyed by content hash.
+
+    Entries are kept in the key-value store, so that every process sees what
+    the others ingested, and the source index is updated in the same
+    transaction as the entries. So is `version`, which counts the changes to
+    the manifest and thus to the ingested corpus.
+
+    Args:
+        store: The key-value store of the manifest.
+        legacy_log_path: A JSON lines manifest of an earlier version to import.
+    """
+
+    def __init__(
+        self, store: KVStore | None = None, legacy_log_path: Path | None = None
+    ) -> None:
+        store = store or get_kv_store()
+        self._entries: Namespace[ManifestEntry] = Namespace(
+            store,
+            "ingestion_manifest",
+            encode=lambda entry: json.dumps(dataclasses.asdict(entry)),
+            decode=lambda value: ManifestEntry(**json.loads(value)),
+        )
+        self._hashes_by_source: Namespace[str] = Namespace(
+            store, "ingestion_manifest_sources", encode=str, decode=str
+        )
+        self._versions: Namespace[int] = Namespace(
+            store, "ingestion_manifest_version", encode=str, decode=int
+        )
+        if legacy_log_path is not None and legacy_log_path.exists():
+            self._import_log(legacy_log_path)
+
+    def _import_log(self, path: Path) -> None:
+        entries: dict[str, ManifestEntry] = {}
+        with open(path) as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("deleted"):
+                        entries.pop(record["content_hash"], None)
+                    else:
+                        entries[record["content_hash"]] = ManifestEntry(**record)
+        for entry in sorted(entries.values(), key=lambda e: e.updated_at):
+            self.put(entry)
+        path.rename(path.with_name(path.name + ".imported"))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, content_hash: str) -> bool:
+        return self._entries.get(content_hash) is not None
+
+    def get(self, content_hash: str) -> ManifestEntry | None:
+        return self._entries.get(content_hash)
+
+    @property
+    def version(self) -> int:
+        return self._versions.get("version") or 0
+
+    def _bump_version(self, transaction: Transaction) -> None:
+        version = self._versions.get("version", transaction) or 0
+        self._versions.put("version", version + 1, transaction)
+
+    def get_by_source(self, source_id: str) -> ManifestEntry | None:
+        """Return the entry of the current content of a source."""
+        content_hash = self._hashes_by_source.get(source_id)
+        return None if content_hash is None else self._entries.get(content_hash)
+
+    def put(self, entry: ManifestEntry) -> None:
+        with self._entries.store.transaction() as transaction:
+            self._entries.put(entry.content_hash, entry, transaction)
+            self._hashes_by_source.put_many(
+                {source: entry.content_hash for source in entry.source_ids},
+                transaction,
+            )
+            self._bump_version(transaction)
+
+    def remove(self, content_hash: str) -> None:
+        with self._entries.store.transaction() as transaction:
+            entry = self._entries.get(content_hash, transaction)
+            if entry is None:
+                return
+            self._entries.delete(content_hash, transaction)
+            for source in entry.source_ids:
+                if self._hashes_by_source.get(source, transaction) == content_hash:
+                    self._hashes_by_source.delete(source, transaction)
+            self._bump_version(transaction)
+
+    def attach_source(self, source_id: str, content_hash: str) -> ManifestEntry | None:
+        """Make the ingested `content_hash` the current content of a source.
+
+        The source is detached from its previous content. If no other source
+        refers to that content any more, its entry is removed and returned, so
+        that its nodes can be deleted. Contents that were not ingested, e.g.
+        because they have no text, are not attached.
+        """
+        with self._entries.store.transaction() as transaction:
+            entry = self._entries.get(content_hash, transaction)
+            if entry is None:
+                return None
+            if source_id not in entry.source_ids:
+                entry.source_ids.append(source_id)
+                self._entries.put(content_hash, entry, transaction)
+            previous_hash = self._hashes_by_source.get(source_id, transaction)
+            self._hashes_by_source.put(source_id, content_hash, transaction)
+            if previous_hash is None or previous_hash == content_hash:
+                return None
+            previous = self._entries.get(previous_hash, transaction)
+            if previous is None:
+                return None
+            previous.source_ids = [s for s in previous.source_ids if s != source_id]
+            if previous.source_ids:
+                self._entries.put(previous_hash, previous, transaction)
+                return None
+            self._entries.delete(previous_hash, transaction)
+            self._bump_version(transaction)
+            return previous
+
+
+_manifest: IngestionManifest | None = None
+
+
+def get_ingestion_manifest() -> IngestionManifest:
+    global _manifest
+    if _manifest is None:
+        _manifest = IngestionManifest(legacy_log_path=constants.INGESTION_MANIFEST_PATH)
+    return _manifest
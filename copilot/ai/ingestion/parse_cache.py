@@ -0,0 +1,108 @@
+import gzip
+import json
+import os
+import threading
+import time
+from pathlib import Path
+
+from llama_index.core import Document
+
+from copilot import constants
+from copilot.settings import get_settings
+
+
+class ParseCache:
+    """Content-addressed local store of parsed documents.
+
+    The documents parsed from a file are stored as gzip-compressed JSON under
+    the SHA-256 hash of the file's content, so that parsing the same content
+    again is a local read instead of a LlamaParse job. The store is bounded to
+    `max_bytes`: the least recently used entries are evicted first, using the
+    file modification time, which is bumped on every read, as the access time.
+    """
+
+    def __init__(self, root: Path | None = None, max_bytes: int = 1 << 30) -> None:
+        self.root = root or constants.PARSE_CACHE_DIR
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._sizes: dict[str, int] = {}
+        self._access_times: dict[str, float] = {}
+        for path in self.root.glob("*/*.json.gz"):
+            content_hash = path.name.removesuffix(".json.gz")
+            stat = path.stat()
+            self._sizes[content_hash] = stat.st_size
+            self._access_times[content_hash] = stat.st_mtime
+
+    @property
+    def total_bytes(self) -> int:
+        return sum(self._sizes.values())
+
+    def path_for(self, content_hash: str) -> Path:
+        return self.root / content_hash[:2] / f"{content_hash}.json.gz"
+
+    def __contains__(self, content_hash: str) -> bool:
+        return content_hash in self._sizes
+
+    def get(
+        self, content_hash: str, metadata: dict[str, str] | None = None
+    ) -> list[Document] | None:
+        """Return the documents parsed from `content_hash`, or None if not cached.
+
+        `metadata` is merged into the metadata of the returned documents.
+        """
+        path = self.path_for(content_hash)
+        try:
+            with gzip.open(path, "rt") as f:
+                records = json.load(f)
+        except FileNotFoundError:
+            with self._lock:
+                self._forget(content_hash)
+            return None
+        now = time.time()
+        os.utime(path, (now, now))
+        with self._lock:
+            self._access_times[content_hash] = now
+        return [
+            Document(text=r["text"], metadata=r["metadata"] | (metadata or {}))
+            for r in records
+        ]
+
+    def put(self, content_hash: str, documents: list[Document]) -> Path:
+        path = self.path_for(content_hash)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(f".{os.getpid()}.{threading.get_ident()}.tmp")
+        with gzip.open(tmp_path, "wt") as f:
+            json.dump([{"text": d.text, "metadata": d.metadata} for d in documents], f)
+        tmp_path.replace(path)
+        with self._lock:
+            self._sizes[content_hash] = path.stat().st_size
+            self._access_times[content_hash] = time.time()
+            self._evict(keep=content_hash)
+        return path
+
+    def _forget(self, content_hash: str) -> None:
+        self._sizes.pop(content_hash, None)
+        self._access_times.pop(content_hash, None)
+
+    def _evict(self, keep: str) -> None:
+        total_bytes = self.total_bytes
+        if total_bytes <= self.max_bytes:
+            return
+        for content_hash in sorted(self._access_times, key=self._access_times.get):
+            if total_bytes <= self.max_bytes:
+                break
+            if content_hash == keep:
+                continue
+            total_bytes -= self._sizes[content_hash]
+            self.path_for(content_hash).unlink(missing_ok=True)
+            self._forget(content_hash)
+
+
+_parse_cache: ParseCache | None = None
+
+
+def get_parse_cache() -> ParseCache:
+    global _parse_cache
+    if _parse_cache is None:
+        _parse_cache = ParseCache(max_bytes=get_settings().parse_cache_max_bytes)
+    return _parse_cache
@@ -0,0 +1,132 @@
+import asyncio
+import os
+import typing as t
+
+from llama_index.core.node_parser import MarkdownElementNodeParser
+
+from copilot.ai.ingestion.jobs import IngestionWorker, Job, JobQueue
+from copilot.ai.ingestion.manifest import hash_file, source_id
+from copilot.ai.ingestion.upsert import UpsertProgress, upsert_nodes
+from copilot.ai.llama_index_ import (
+    get_index_cache,
+    load_parser,
+    parse_files_if_needed,
+    record_ingested_nodes,
+    record_sources,
+)
+from copilot.settings import get_settings
+from copilot.tracing import get_tracer
+
+
+async def _no_report(detail: str) -> None:
+    pass
+
+
+async def ingest_pdfs(
+    file_paths: dict[str, str],
+    report: t.Callable[[str], t.Awaitable[None]] = _no_report,
+    uploaded_by: str | None = None,
+) -> None:
+    """Parse, split, embed and upsert PDFs into the vector store.
+
+    Args:
+        file_paths: The paths of the PDFs, keyed by their uploaded file names.
+        report: Awaited with a description of the progress after every stage.
+        uploaded_by: The thread owner who uploaded the PDFs. A PDF uploaded
+            again by them under the same name replaces the previous upload.
+            Without an uploader, nothing is replaced.
+    """
+    with get_tracer().span("ingest_pdfs", new_trace=True, files=len(file_paths)):
+        await _ingest_pdfs(file_paths, report, uploaded_by)
+
+
+async def _ingest_pdfs(
+    file_paths: dict[str, str],
+    report: t.Callable[[str], t.Awaitable[None]],
+    uploaded_by: str | None,
+) -> None:
+    settings = get_settings()
+    tracer = get_tracer()
+    index = await asyncio.to_thread(get_index_cache().get_index)
+    content_hashes = await asyncio.to_thread(
+        lambda: {name: hash_file(path) for name, path in file_paths.items()}
+    )
+    sources = {}
+    if uploaded_by is not None:
+        sources = {
+            source_id(uploaded_by, name): content_hash
+            for name, content_hash in content_hashes.items()
+        }
+    with tracer.span("parse"):
+        documents = await parse_files_if_needed(
+            file_paths, load_parser(), content_hashes
+        )
+    if not documents:
+        await asyncio.to_thread(record_sources, index, sources)
+        get_index_cache().invalidate()
+        await report("All PDFs were already indexed.")
+        return
+    await report(f"Parsed {len(documents)} documents.")
+    node_parser = MarkdownElementNodeParser(num_workers=os.cpu_count() or 1)
+    with tracer.span("create_nodes", documents=len(documents)):
+        nodes = await node_parser.aget_nodes_from_documents(documents)
+
+    async def report_upsert(progress: UpsertProgress) -> None:
+        await report(
+            f"Inserted {progress.nodes_done}/{progress.nodes_total} nodes "
+            f"({progress.batches_done}/{progress.batches_total} batches)."
+        )
+
+    with tracer.span("upsert", nodes=len(nodes)):
+        await upsert_nodes(
+            index,
+            nodes,
+            batch_size=settings.upsert_batch_size,
+            max_concurrency=settings.upsert_max_concurrency,
+            max_retries=settings.upsert_max_retries,
+            retry_backoff=settings.upsert_retry_backoff,
+            on_progress=report_upsert,
+        )
+    with tracer.span("persist"):
+        await asyncio.to_thread(record_ingested_nodes, index, nodes)
+        await asyncio.to_thread(record_sources, index, sources)
+        await asyncio.to_thread(index.storage_context.persist)
+    get_index_cache().invalidate()
+
+
+_queue: JobQueue | None = None
+_worker: IngestionWorker | None = None
+
+
+def get_ingestion_queue() -> JobQueue:
+    global _queue
+    if _queue is None:
+        _queue = JobQueue()
+    return _queue
+
+
+def get_ingestion_worker() -> IngestionWorker:
+    global _worker
+    if _worker is None:
+        _worker = IngestionWorker(
+            get_ingestion_queue(),
+            ingest_pdfs,
+            concurrency=get_settings().ingestion_workers,
+        )
+    return _worker
+
+
+async def enqueue_pdfs(
+    file_paths: dict[str, str], uploaded_by: str | None = None
+) -> Job:
+    """Queue PDFs for ingestion in the background and return their job."""
+    job = await asyncio.to_thread(
+        get_ingestion_queue().enqueue, file_paths, uploaded_by
+    )
+    get_ingestion_worker().notify()
+    return job
+
+
+async def stop_ingestion_worker() -> None:
+    if _worker is not None:
+        await _worker.stop()
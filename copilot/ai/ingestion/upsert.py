@@ -0,0 +1,66 @@
+import asyncio
+import dataclasses
+import logging
+import typing as t
+
+from llama_index.core import VectorStoreIndex
+from llama_index.core.schema import BaseNode
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass(frozen=True)
+class UpsertProgress:
+    batches_done: int
+    batches_total: int
+    nodes_done: int
+    nodes_total: int
+
+
+async def upsert_nodes(
+    index: VectorStoreIndex,
+    nodes: t.Sequence[BaseNode],
+    batch_size: int = 100,
+    max_concurrency: int = 4,
+    max_retries: int = 3,
+    retry_backoff: float = 0.5,
+    on_progress: t.Callable[[UpsertProgress], t.Awaitable[None]] | None = None,
+) -> None:
+    """Insert `nodes` into `index` in batches, without blocking the event loop.
+
+    Every batch is embedded and upserted by `index.insert_nodes` on a worker
+    thread, with at most `max_concurrency` batches in flight. A failed batch is
+    retried up to `max_retries` times, waiting `retry_backoff` seconds before
+    the first retry and twice as long before each next one. `on_progress` is
+    awaited after every completed batch.
+    """
+    batches = [nodes[i : i + batch_size] for i in range(0, len(nodes), batch_size)]
+    semaphore = asyncio.Semaphore(max_concurrency)
+    batches_done = nodes_done = 0
+
+    async def upsert_batch(batch: t.Sequence[BaseNode]) -> None:
+        nonlocal batches_done, nodes_done
+        async with semaphore:
+            for attempt in range(max_retries + 1):
+                try:
+                    await asyncio.to_thread(index.insert_nodes, batch)
+                    break
+                except Exception:
+                    if attempt == max_retries:
+                        raise
+                    delay = retry_backoff * 2**attempt
+                    logger.warning(
+                        "Upserting %d nodes failed, retrying in %.1fs.",
+                        len(batch),
+                        delay,
+                        exc_info=True,
+                    )
+                    await asyncio.sleep(delay)
+        batches_done += 1
+        nodes_done += len(batch)
+        if on_progress is not None:
+            await on_progress(
+                UpsertProgress(batches_done, len(batches), nodes_done, len(nodes))
+            )
+
+    await asyncio.gather(*(upsert_batch(batch) for batch in batches))
@@ -1,4 +1,5 @@
-import json
+import asyncio
+import threading
 import typing as t
 
 import chainlit as cl
@@ -9,74 +10,321 @@ from llama_index.core import (
     StorageContext,
     VectorStoreIndex,
 )
+from llama_index.core.base.base_query_engine import BaseQueryEngine
+from llama_index.core.llms import LLM
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.types import BasePydanticVectorStore
 from llama_index.embeddings.openai import OpenAIEmbedding
 from llama_index.llms.openai import OpenAI
 from llama_index.vector_stores.pinecone import PineconeVectorStore
-from llama_parse import LlamaParse, ResultType
-from pinecone import Pinecone
+from llama_parse import LlamaParse
 
 from copilot import constants
-from copilot.settings import CopilotSettings
+from copilot.ai.client_registry import get_client_registry
+from copilot.ai.ingestion.embedding_cache import CachedEmbedding
+from copilot.ai.ingestion.manifest import (
+    ManifestEntry,
+    get_ingestion_manifest,
+    hash_file,
+)
+from copilot.ai.ingestion.parse_cache import get_parse_cache
+from copilot.ai.retrieval.context_budget import TokenBudgetPostprocessor
+from copilot.ai.retrieval.hybrid import (
+    HybridQueryEngine,
+    HybridRetriever,
+    TermCoverageReranker,
+)
+from copilot.ai.retrieval.keyword_index import get_keyword_index
+from copilot.ai.retrieval.local_vector_store import LocalVectorStore
+from copilot.settings import get_settings
 
 
+DEFAULT_INDEX_NAME = "copilot"
+
 _llama_index_initialized = False
 
 
-def initialize_llama_index() -> None:
-    global _llama_index_initialized
-    if _llama_index_initialized:
-        return
+def get_current_model() -> str:
+    """Return the LLM model of the current session's chat profile."""
     try:
         chat_profile = cl.user_session.get(constants.CHAT_PROFILES_KEY)
     except ChainlitContextException:
-        chat_profile = constants.ChatProfiles.GPT4oMini
-    copilot_settings = CopilotSettings()  # type: ignore
-    Settings.llm = OpenAI(
-        model=constants.get_model_for_chat_profile(
-            t.cast(constants.ChatProfiles, chat_profile)
-        ),
-        api_key=copilot_settings.openai_api_key,
+        chat_profile = None
+    return constants.get_model_for_chat_profile(
+        t.cast(constants.ChatProfiles, chat_profile or constants.ChatProfiles.GPT4oMini)
     )
-    Settings.embed_model = OpenAIEmbedding(
-        model="text-embedding-3-small",
+
+
+def load_llm(model: str) -> LLM:
+    copilot_settings = get_settings()
+    registry = get_client_registry()
+    return OpenAI(
+        model=model,
         api_key=copilot_settings.openai_api_key,
+        api_base=copilot_settings.openai_base_url,
+        http_client=registry.http_client,
+        async_http_client=registry.async_http_client,
+    )
+
+
+def initialize_llama_index() -> None:
+    global _llama_index_initialized
+    if _llama_index_initialized:
+        return
+    copilot_settings = get_settings()
+    registry = get_client_registry()
+    Settings.llm = load_llm(get_current_model())
+    Settings.embed_model = CachedEmbedding(
+        OpenAIEmbedding(
+            model="text-embedding-3-small",
+            api_key=copilot_settings.openai_api_key,
+            api_base=copilot_settings.openai_base_url,
+            embed_batch_size=copilot_settings.embed_batch_size,
+            http_client=registry.http_client,
+            async_http_client=registry.async_http_client,
+        ),
+        max_concurrency=copilot_settings.embed_max_concurrency,
     )
     _llama_index_initialized = True
 
 
+def get_embed_model_name() -> str:
+    initialize_llama_index()
+    return Settings.embed_model.model_name
+
+
 async def parse_files_if_needed(
-    file_paths: dict[str, str], parser: LlamaParse
+    file_paths: dict[str, str],
+    parser: LlamaParse,
+    content_hashes: dict[str, str] | None = None,
 ) -> list[Document]:
-    try:
-        parsed_files = json.loads(constants.PARSED_FILES_DATA_PATH.read_text())
-    except FileNotFoundError:
-        parsed_files = []
-    to_parse: dict[str, str] = {}
+    """Parse the files whose content is not ingested yet with the current embed model.
+
+    Files are identified by the hash of their content, so renamed duplicates are
+    skipped and changed files are parsed again. The returned documents carry the
+    `file_name` and `content_hash` of their file in their metadata.
+
+    Args:
+        content_hashes: The hashes of the files, by name, if already computed.
+    """
+    manifest = get_ingestion_manifest()
+    embed_model = get_embed_model_name()
+    to_parse: dict[str, tuple[str, str]] = {}
     for file_name, file_path in file_paths.items():
-        if file_name not in parsed_files:
-            to_parse[file_name] = file_path
-    if not to_parse:
-        return []
-    else:
-        result = await parser.aload_data(list(to_parse.values()))
-        parsed_files.extend(to_parse)
-        constants.PARSED_FILES_DATA_PATH.write_text(json.dumps(parsed_files))
-        return result
-
-
-def load_index() -> VectorStoreIndex:
+        if content_hashes is not None:
+            content_hash = content_hashes[file_name]
+        else:
+            content_hash = await asyncio.to_thread(hash_file, file_path)
+        entry = manifest.get(content_hash)
+        if entry is None or entry.embed_model != embed_model:
+            to_parse.setdefault(content_hash, (file_name, file_path))
+    results = await asyncio.gather(
+        *(
+            _parse_file(parser, file_path, file_name, content_hash)
+            for content_hash, (file_name, file_path) in to_parse.items()
+        )
+    )
+    return [document for documents in results for document in documents]
+
+
+async def _parse_file(
+    parser: LlamaParse, file_path: str, file_name: str, content_hash: str
+) -> list[Document]:
+    """Parse a file with LlamaParse, unless its parsed content is cached locally."""
+    parse_cache = get_parse_cache()
+    metadata = {"file_name": file_name, "content_hash": content_hash}
+    # Reading and writing gzipped JSON would block the event loop of live chats.
+    documents = await asyncio.to_thread(parse_cache.get, content_hash, metadata)
+    if documents is None:
+        documents = await parser.aload_data(file_path, extra_info=metadata)
+        await asyncio.to_thread(parse_cache.put, content_hash, documents)
+    for document in documents:
+        # Keep identical chunks of different files identical for the embedding cache.
+        document.excluded_embed_metadata_keys.extend(metadata)
+        document.excluded_llm_metadata_keys.append("content_hash")
+    return documents
+
+
+def record_ingested_nodes(index: VectorStoreIndex, nodes: t.Sequence[BaseNode]) -> None:
+    """Record `nodes` in the ingestion manifest, once they are in `index`.
+
+    Nodes ingested earlier for the same content with another embed model are
+    deleted from `index`. The keyword index of the default index is kept in
+    sync.
+    """
+    keyword_index = get_keyword_index(DEFAULT_INDEX_NAME)
+    manifest = get_ingestion_manifest()
+    embed_model = get_embed_model_name()
+    nodes_by_hash: dict[str, list[BaseNode]] = {}
+    for node in nodes:
+        nodes_by_hash.setdefault(node.metadata["content_hash"], []).append(node)
+    for content_hash, document_nodes in nodes_by_hash.items():
+        source_ids = []
+        if (stale := manifest.get(content_hash)) is not None:
+            source_ids = stale.source_ids
+            _delete_nodes(index, stale.node_ids)
+        keyword_index.add(document_nodes)
+        manifest.put(
+            ManifestEntry(
+                content_hash=content_hash,
+                file_name=document_nodes[0].metadata["file_name"],
+                embed_model=embed_model,
+                parse_result_path=str(get_parse_cache().path_for(content_hash)),
+                node_ids=[node.node_id for node in document_nodes],
+                source_ids=source_ids,
+            )
+        )
+
+
+def record_sources(index: VectorStoreIndex, sources: dict[str, str]) -> None:
+    """Make the ingested contents the current contents of their sources.
+
+    Args:
+        sources: Content hashes by source ID, see `manifest.source_id`.
+
+    The nodes of the previous content of a source are deleted from `index`,
+    unless another source still refers to that content.
+    """
+    manifest = get_ingestion_manifest()
+    for source, content_hash in sources.items():
+        if (replaced := manifest.attach_source(source, content_hash)) is not None:
+            _delete_nodes(index, replaced.node_ids)
+
+
+def _delete_nodes(index: VectorStoreIndex, node_ids: list[str]) -> None:
+    if node_ids:
+        index.delete_nodes(node_ids)
+        get_keyword_index(DEFAULT_INDEX_NAME).delete(node_ids)
+
+
+def load_vector_store(
+    index_name: str = DEFAULT_INDEX_NAME,
+) -> BasePydanticVectorStore:
+    """Return the vector store of `index_name` on the configured backend."""
+    copilot_settings = get_settings()
+    if copilot_settings.vector_store_backend == "local":
+        return LocalVectorStore(
+            constants.VECTOR_STORE_DIR / index_name,
+            ann_threshold=copilot_settings.local_vector_store_ann_threshold,
+            n_probe=copilot_settings.local_vector_store_n_probe,
+        )
+    return PineconeVectorStore(get_client_registry().pinecone_index(index_name))
+
+
+def load_index(index_name: str = DEFAULT_INDEX_NAME) -> VectorStoreIndex:
     initialize_llama_index()
-    copilot_settings = CopilotSettings()  # type: ignore
-    pc = Pinecone(api_key=copilot_settings.pinecone_api_key)
-    pinecone_index = pc.Index("copilot")
-    vector_store = PineconeVectorStore(pinecone_index)
+    vector_store = load_vector_store(index_name)
     storage_context = StorageContext.from_defaults(vector_store=vector_store)
     return VectorStoreIndex(nodes=[], storage_context=storage_context)
 
 
-def load_parser() -> LlamaParse:
-    copilot_settings = CopilotSettings()  # type: ignore
-    return LlamaParse(
-        api_key=copilot_settings.llama_cloud_api_key,
-        result_type=ResultType.MD,
+def build_query_engine(
+    index: VectorStoreIndex, llm: LLM, index_name: str = DEFAULT_INDEX_NAME
+) -> BaseQueryEngine:
+    """Build the query engine over `index` for the configured retrieval mode.
+
+    The retrieved nodes are packed into a token budget before they reach `llm`,
+    and the answer is streamed.
+    """
+    copilot_settings = get_settings()
+    context_budget = TokenBudgetPostprocessor(
+        max_tokens=copilot_settings.retrieval_context_max_tokens
+    )
+    if copilot_settings.retrieval_mode == "vector":
+        return index.as_query_engine(
+            llm=llm, node_postprocessors=[context_budget], streaming=True
+        )
+    keyword_index = get_keyword_index(index_name)
+    top_k = copilot_settings.retrieval_top_k
+    candidates = copilot_settings.retrieval_candidates
+    rerank = copilot_settings.retrieval_rerank
+    retriever = HybridRetriever(
+        index.as_retriever(similarity_top_k=candidates),
+        keyword_index,
+        similarity_top_k=candidates if rerank else top_k,
+        keyword_top_k=candidates,
+        alpha=copilot_settings.retrieval_alpha,
     )
+    postprocessors: list[BaseNodePostprocessor] = []
+    if rerank:
+        postprocessors.append(TermCoverageReranker(keyword_index, top_n=top_k))
+    postprocessors.append(context_budget)
+    return HybridQueryEngine.from_args(
+        retriever, llm=llm, node_postprocessors=postprocessors, streaming=True
+    )
+
+
+class IndexCache:
+    """Long-lived indexes and query engines, keyed by index name and model.
+
+    Building a `VectorStoreIndex` and its query engine is pure setup overhead,
+    so it is done once per key. Call `invalidate` after inserting nodes into an
+    index so that the next query builds a fresh query engine.
+    """
+
+    def __init__(
+        self,
+        index_factory: t.Callable[[str], VectorStoreIndex] | None = None,
+        llm_factory: t.Callable[[str], LLM] | None = None,
+        query_engine_factory: (
+            t.Callable[[VectorStoreIndex, LLM, str], BaseQueryEngine] | None
+        ) = None,
+    ) -> None:
+        self._index_factory = index_factory
+        self._llm_factory = llm_factory
+        self._query_engine_factory = query_engine_factory
+        self._indexes: dict[str, VectorStoreIndex] = {}
+        self._query_engines: dict[tuple[str, str], BaseQueryEngine] = {}
+        self._lock = threading.Lock()
+
+    def get_index(self, index_name: str = DEFAULT_INDEX_NAME) -> VectorStoreIndex:
+        try:
+            return self._indexes[index_name]
+        except KeyError:
+            pass
+        with self._lock:
+            if index_name not in self._indexes:
+                index_factory = self._index_factory or load_index
+                self._indexes[index_name] = index_factory(index_name)
+            return self._indexes[index_name]
+
+    def get_query_engine(
+        self, model: str, index_name: str = DEFAULT_INDEX_NAME
+    ) -> BaseQueryEngine:
+        key = (index_name, model)
+        try:
+            return self._query_engines[key]
+        except KeyError:
+            pass
+        index = self.get_index(index_name)
+        with self._lock:
+            if key not in self._query_engines:
+                llm = (self._llm_factory or load_llm)(model)
+                if self._query_engine_factory is None:
+                    query_engine = index.as_query_engine(llm=llm)
+                else:
+                    query_engine = self._query_engine_factory(index, llm, index_name)
+                self._query_engines[key] = query_engine
+            return self._query_engines[key]
+
+    def invalidate(
+        self, index_name: str = DEFAULT_INDEX_NAME, drop_index: bool = False
+    ) -> None:
+        """Forget the query engines of `index_name`, and the index itself if asked."""
+        with self._lock:
+            for key in [k for k in self._query_engines if k[0] == index_name]:
+                del self._query_engines[key]
+            if drop_index:
+                self._indexes.pop(index_name, None)
+
+
+_index_cache = IndexCache(query_engine_factory=build_query_engine)
+
+
+def get_index_cache() -> IndexCache:
+    return _index_cache
+
+
+def load_parser() -> LlamaParse:
+    return get_client_registry().llama_parse
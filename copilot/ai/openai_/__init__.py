@@ -1,2 +1,4 @@
 from copilot.ai.openai_.clients import *  # noqa: F403
 from copilot.ai.openai_.function_calling import *  # noqa: F403
+from copilot.ai.openai_.threads import *  # noqa: F403
+from copilot.ai.openai_.tool_executor import *  # noqa: F403
@@ -0,0 +1,125 @@
+"""Resolution of the file citations of assistant messages.
+
+Answers cite the same handful of files over and over, and retrieving the
+metadata of every cited file one request after the other costs a round trip
+per citation every turn. Files are retrieved concurrently, each at most once,
+and their metadata is cached in the process for a while.
+"""
+
+import asyncio
+import logging
+import time
+import typing as t
+
+import openai
+from openai.types import FileObject
+from openai.types.beta.threads import Text
+
+from copilot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+def replace_annotations(text: Text) -> str:
+    """Return `text` with every annotation replaced by its index, as `[i]`.
+
+    Annotations are replaced in one pass, using their offsets in the text.
+    """
+    pieces = []
+    end = 0
+    annotations = sorted(enumerate(text.annotations), key=lambda a: a[1].start_index)
+    for index, annotation in annotations:
+        if annotation.start_index < end:
+            # Overlapping annotations are left as they are.
+            continue
+        pieces += [text.value[end : annotation.start_index], f"[{index}]"]
+        end = annotation.end_index
+    pieces.append(text.value[end:])
+    return "".join(pieces)
+
+
+def cited_file_ids(text: Text) -> list[str]:
+    """Return the IDs of the files cited by `text`, without duplicates, in order."""
+    file_ids = (
+        file_citation.file_id
+        for annotation in text.annotations
+        if (file_citation := getattr(annotation, "file_citation", None))
+    )
+    return list(dict.fromkeys(file_ids))
+
+
+class FileMetadataCache:
+    """Metadata of OpenAI files, cached for `ttl` seconds.
+
+    Concurrent lookups of the same file share one request, and at most
+    `max_concurrency` requests run at once.
+    """
+
+    def __init__(
+        self,
+        ttl: float = 3600.0,
+        max_concurrency: int = 8,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.ttl = ttl
+        self.max_concurrency = max_concurrency
+        self.clock = clock
+        self._files: dict[str, tuple[FileObject, float]] = {}
+        self._requests: dict[str, asyncio.Future[FileObject]] = {}
+        self._semaphore: asyncio.Semaphore | None = None
+
+    async def _fetch(self, client: openai.AsyncOpenAI, file_id: str) -> FileObject:
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            file = await client.files.retrieve(file_id)
+        self._files[file_id] = (file, self.clock() + self.ttl)
+        return file
+
+    async def retrieve(self, client: openai.AsyncOpenAI, file_id: str) -> FileObject:
+        if (cached := self._files.get(file_id)) is not None:
+            file, expires_at = cached
+            if expires_at > self.clock():
+                return file
+            del self._files[file_id]
+        if file_id not in self._requests:
+            request = asyncio.ensure_future(self._fetch(client, file_id))
+            request.add_done_callback(lambda _: self._requests.pop(file_id, None))
+            self._requests[file_id] = request
+        return await asyncio.shield(self._requests[file_id])
+
+    async def retrieve_many(
+        self, client: openai.AsyncOpenAI, file_ids: t.Sequence[str]
+    ) -> list[FileObject]:
+        """Retrieve `file_ids` concurrently, skipping the files that fail."""
+        results = await asyncio.gather(
+            *(self.retrieve(client, file_id) for file_id in file_ids),
+            return_exceptions=True,
+        )
+        files = []
+        for file_id, result in zip(file_ids, results):
+            if isinstance(result, BaseException):
+                logger.warning(
+                    "Could not retrieve cited file %s.", file_id, exc_info=result
+                )
+            else:
+                files.append(result)
+        return files
+
+    def clear(self) -> None:
+        self._files.clear()
+
+
+_file_metadata_cache: FileMetadataCache | None = None
+
+
+def get_file_metadata_cache() -> FileMetadataCache:
+    """Return the process-wide file metadata cache, configured from the settings."""
+    global _file_metadata_cache
+    if _file_metadata_cache is None:
+        settings = get_settings()
+        _file_metadata_cache = FileMetadataCache(
+            ttl=settings.file_metadata_cache_ttl,
+            max_concurrency=settings.file_retrieve_concurrency,
+        )
+    return _file_metadata_cache
@@ -1,47 +1,101 @@
+import asyncio
+import hashlib
+import json
+import typing as t
+
 import openai
 from openai.types.beta.assistant import Assistant
 from openai.types.beta.assistant_tool_param import AssistantToolParam
 
 from copilot import constants
-from copilot.ai.openai_.function_calling import get_assistant_tool_metadata
+from copilot.ai.client_registry import get_client_registry
+from copilot.ai.openai_.function_calling import compile_tool
 from copilot.ai.tools import TOOL_REGISTRY
-from copilot.settings import CopilotSettings
-from copilot.utils import persist_str, retrieve_str
+from copilot.kv_store import Namespace, get_kv_store
 
 
 def get_openai_client() -> openai.OpenAI:
-    settings = CopilotSettings()  # type: ignore
-    client = openai.OpenAI(api_key=settings.openai_api_key)
-    return client
+    return get_client_registry().openai_client
 
 
 def get_async_openai_client() -> openai.AsyncOpenAI:
-    settings = CopilotSettings()  # type: ignore
-    client = openai.AsyncOpenAI(api_key=settings.openai_api_key)
-    return client
+    return get_client_registry().async_openai_client
 
 
-async def get_or_create_thread_id(client: openai.AsyncOpenAI) -> str:
-    try:
-        return retrieve_str(constants.THREAD_ID_KEY)
-    except ValueError:
-        thread = await client.beta.threads.create()
-        persist_str(constants.THREAD_ID_KEY, thread.id)
-        return thread.id
+def _persisted_settings() -> Namespace[str]:
+    settings = Namespace(get_kv_store(), "settings", encode=str, decode=str)
+    settings.import_json(constants.PERSISTENCE_SETTINGS_PATH)
+    return settings
 
 
-async def create_assistant(client: openai.AsyncOpenAI, model: str) -> Assistant:
-    instructions = """
+ASSISTANT_NAME = "Copilot"
+ASSISTANT_INSTRUCTIONS = """
     You are a helpful assistant that can answer questions about PDF documents.
     """
+
+
+def _assistant_params(model: str) -> dict[str, t.Any]:
     tools: list[AssistantToolParam] = [
-        get_assistant_tool_metadata(tool).as_openai_tool_spec()
-        for tool in TOOL_REGISTRY.values()
+        compile_tool(tool).spec for tool in TOOL_REGISTRY.values()
     ]
+    return {
+        "name": ASSISTANT_NAME,
+        "model": model,
+        "instructions": ASSISTANT_INSTRUCTIONS,
+        "tools": tools,
+    }
+
+
+def hash_assistant_params(params: dict[str, t.Any]) -> str:
+    """Content hash of the model, instructions and tool specs of an assistant."""
+    # Tool specs hold tuples (e.g. enums), which JSON encodes as lists.
+    encoded = json.dumps(params, sort_keys=True, separators=(",", ":"))
+    return hashlib.sha256(encoded.encode()).hexdigest()
+
 
-    return await client.beta.assistants.create(
-        name="Copilot",
-        model=model,
-        instructions=instructions,
-        tools=tools,
-    )
+async def create_assistant(client: openai.AsyncOpenAI, model: str) -> Assistant:
+    return await client.beta.assistants.create(**_assistant_params(model))
+
+
+_assistant_ids: dict[str, str] = {}
+_assistant_locks: dict[str, asyncio.Lock] = {}
+
+
+async def get_or_create_assistant_id(client: openai.AsyncOpenAI, model: str) -> str:
+    """Return the ID of an assistant for `model`, reusing it across sessions.
+
+    The ID is persisted together with the hash of the assistant's parameters, so
+    that it survives restarts. The persisted assistant is retrieved once per
+    process to check that it still exists, updated when the hash changes, and
+    only created when there is none yet or it was deleted.
+    """
+    params = _assistant_params(model)
+    params_hash = hash_assistant_params(params)
+    if params_hash in _assistant_ids:
+        return _assistant_ids[params_hash]
+    # Sessions that start at the same time must not each create an assistant.
+    async with _assistant_locks.setdefault(model, asyncio.Lock()):
+        if params_hash in _assistant_ids:
+            return _assistant_ids[params_hash]
+        settings = _persisted_settings()
+        key = f"{constants.ASSISTANT_ID_KEY}:{model}"
+        persisted_str = settings.get(key)
+        persisted = None if persisted_str is None else json.loads(persisted_str)
+        assistant_id = None
+        if persisted is not None:
+            # The persisted assistant may have been deleted on the OpenAI side;
+            # it's checked once per process, before it's cached in memory.
+            try:
+                if persisted["hash"] == params_hash:
+                    await client.beta.assistants.retrieve(persisted["id"])
+                else:
+                    await client.beta.assistants.update(persisted["id"], **params)
+                assistant_id = persisted["id"]
+            except openai.NotFoundError:
+                pass
+        if assistant_id is None:
+            assistant_id = (await create_assistant(client, model)).id
+        if persisted != {"id": assistant_id, "hash": params_hash}:
+            settings.put(key, json.dumps({"id": assistant_id, "hash": params_hash}))
+        _assistant_ids[params_hash] = assistant_id
+        return assistant_id
@@ -1,4 +1,6 @@
+import asyncio
 import dataclasses
+import functools
 import inspect
 import json
 import textwrap
@@ -202,38 +204,175 @@ def _parse_parameter(name: str, annotation: t.Any) -> dict[str, t.Any]:
     return result
 
 
-def execute_tool(
-    tool_call: RequiredActionFunctionToolCall,
-) -> ToolOutput:
-    def _execute_tool() -> str:
-        try:
-            kwargs = json.loads(tool_call.function.arguments)
-        except json.JSONDecodeError as e:
-            return f"Could not json decode tool call arguments. Error: {e}. Traceback: {traceback.format_exc()}"
+_JSON_TYPES: dict[str, t.Callable[[t.Any], bool]] = {
+    "integer": lambda v: isinstance(v, int) and not isinstance(v, bool),
+    "number": lambda v: isinstance(v, (int, float)) and not isinstance(v, bool),
+    "string": lambda v: isinstance(v, str),
+    "boolean": lambda v: isinstance(v, bool),
+    "array": lambda v: isinstance(v, list),
+    "object": lambda v: isinstance(v, dict),
+    "null": lambda v: v is None,
+}
 
-        try:
-            tool = TOOL_REGISTRY[tool_call.function.name]
-        except KeyError as e:
-            return f"Tool {e} not found in tool registry. Available tools: {list(TOOL_REGISTRY)}"
-        tool_metadata = get_assistant_tool_metadata(tool)
-        tool_parameters = tool_metadata.parameters.values()
-        required_parameters = [p for p in tool_parameters if p.is_required]
-        missing_parameters = [
-            p.name for p in required_parameters if p.name not in kwargs
-        ]
+
+def _compile_json_schema_check(schema: dict[str, t.Any]) -> t.Callable[[t.Any], bool]:
+    """Compile the JSON schema of a parameter into a predicate over its values."""
+    if "anyOf" in schema:
+        options = [_compile_json_schema_check(s) for s in schema["anyOf"]]
+        return lambda v: any(check(v) for check in options)
+    checks: list[t.Callable[[t.Any], bool]] = []
+    if "type" in schema:
+        checks.append(_JSON_TYPES[schema["type"]])
+    if "enum" in schema:
+        allowed = tuple(schema["enum"])
+        checks.append(lambda v: v in allowed)
+    if "items" in schema:
+        item_check = _compile_json_schema_check(schema["items"])
+        checks.append(lambda v: all(item_check(x) for x in v))
+    if "additionalProperties" in schema:
+        value_check = _compile_json_schema_check(schema["additionalProperties"])
+        checks.append(lambda v: all(value_check(x) for x in v.values()))
+    return lambda v: all(check(v) for check in checks)
+
+
+@dataclasses.dataclass(frozen=True)
+class ArgumentValidator:
+    """Precompiled validator of the arguments of a tool call."""
+
+    required: tuple[str, ...]
+    checks: dict[str, t.Callable[[t.Any], bool]]
+    schemas: dict[str, dict[str, t.Any]]
+
+    @classmethod
+    def from_metadata(cls, metadata: AssistantToolMetadata) -> "ArgumentValidator":
+        parameters = metadata.parameters.values()
+        return cls(
+            required=tuple(p.name for p in parameters if p.is_required),
+            checks={
+                p.name: _compile_json_schema_check(p.json_schema) for p in parameters
+            },
+            schemas={p.name: p.json_schema for p in parameters},
+        )
+
+    def validate(self, kwargs: dict[str, t.Any]) -> str | None:
+        """Return a message for the assistant if `kwargs` are invalid, else None."""
+        missing_parameters = [name for name in self.required if name not in kwargs]
         if missing_parameters:
             return textwrap.dedent(
                 f"""
                 Looks like you are missing some required parameters: {", ".join(missing_parameters)}.
-                The required parameters are: {", ".join(p.name for p in required_parameters)}.
+                The required parameters are: {", ".join(self.required)}.
+                """
+            )
+        unexpected_parameters = [name for name in kwargs if name not in self.checks]
+        if unexpected_parameters:
+            return textwrap.dedent(
+                f"""
+                Got unexpected parameters: {", ".join(unexpected_parameters)}.
+                The accepted parameters are: {", ".join(self.checks)}.
                 """
             )
+        invalid_parameters = [
+            f"{name}={value!r} does not match {json.dumps(self.schemas[name])}"
+            for name, value in kwargs.items()
+            if not self.checks[name](value)
+        ]
+        if invalid_parameters:
+            return f"Got invalid parameters: {'; '.join(invalid_parameters)}."
+        return None
+
+
+@dataclasses.dataclass(frozen=True)
+class CompiledTool:
+    """A tool with its metadata, OpenAI tool spec and argument validator."""
+
+    function: t.Callable[..., t.Any]
+    metadata: AssistantToolMetadata
+    spec: FunctionToolParam
+    validator: ArgumentValidator
+
+
+@functools.cache
+def compile_tool(function: t.Callable[..., t.Any]) -> CompiledTool:
+    """Compile the metadata of `function` once and memoize it."""
+    metadata = get_assistant_tool_metadata(function)
+    return CompiledTool(
+        function=function,
+        metadata=metadata,
+        spec=metadata.as_openai_tool_spec(),
+        validator=ArgumentValidator.from_metadata(metadata),
+    )
+
+
+def get_compiled_tool(name: str) -> CompiledTool:
+    """Return the compiled tool registered under `name` in `TOOL_REGISTRY`.
+
+    Raises:
+        KeyError: If no tool is registered under `name`.
+    """
+    return compile_tool(TOOL_REGISTRY[name])
+
+
+# Compile the registered tools up front so that tool calls only look them up.
+for _tool in TOOL_REGISTRY.values():
+    compile_tool(_tool)
+
+
+class ToolCallError(Exception):
+    """Raised when a tool call cannot be run. The message is meant for the assistant."""
+
+
+def resolve_tool_call(
+    tool_call: RequiredActionFunctionToolCall,
+) -> tuple[CompiledTool, dict[str, t.Any]]:
+    """Look up the tool of `tool_call` and decode and validate its arguments.
+
+    Raises:
+        ToolCallError: If the arguments are not valid JSON, the tool is not
+            registered, or the arguments do not match the tool's parameters.
+    """
+    try:
+        kwargs = json.loads(tool_call.function.arguments)
+    except json.JSONDecodeError as e:
+        raise ToolCallError(
+            f"Could not json decode tool call arguments. Error: {e}. Traceback: {traceback.format_exc()}"
+        )
+    try:
+        tool = get_compiled_tool(tool_call.function.name)
+    except KeyError as e:
+        raise ToolCallError(
+            f"Tool {e} not found in tool registry. Available tools: {list(TOOL_REGISTRY)}"
+        )
+    if error := tool.validator.validate(kwargs):
+        raise ToolCallError(error)
+    return tool, kwargs
+
+
+def format_tool_exception(e: Exception) -> str:
+    return f"Error executing tool. Error: {e}. Traceback: {traceback.format_exc()}"
+
+
+def execute_tool(
+    tool_call: RequiredActionFunctionToolCall,
+) -> ToolOutput:
+    """Execute `tool_call` synchronously.
+
+    `async def` tools are run to completion in a new event loop, so this cannot
+    be called from a running event loop: use `ToolExecutor` there.
+    """
+
+    def _execute_tool() -> str:
+        try:
+            tool, kwargs = resolve_tool_call(tool_call)
+        except ToolCallError as e:
+            return str(e)
         try:
-            return str(tool(**kwargs))
+            result = tool.function(**kwargs)
+            if inspect.iscoroutine(result):
+                result = asyncio.run(result)
+            return str(result)
         except Exception as e:
-            return (
-                f"Error executing tool. Error: {e}. Traceback: {traceback.format_exc()}"
-            )
+            return format_tool_exception(e)
 
     return {
         "output": _execute_tool(),
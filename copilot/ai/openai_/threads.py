@@ -0,0 +1,219 @@
+"""Assistant threads per user, rolled over before they grow too large.
+
+A single persisted thread was shared by every user and session of a
+deployment. Its context kept growing, so runs got slower and more expensive,
+and concurrent runs on the thread conflicted. Each owner, a signed-in user or
+else a chat session, now has its own thread, recorded in the key-value store.
+Once a thread holds too many messages or its runs read too many prompt tokens,
+the next message goes to a new thread, seeded with a summary of the previous
+one.
+"""
+
+import asyncio
+import dataclasses
+import json
+import logging
+import time
+import weakref
+
+import openai
+from openai.types.beta.threads import Run
+
+from copilot.kv_store import KVStore, Namespace, get_kv_store
+from copilot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+SUMMARY_PROMPT = (
+    "Summarize the following conversation between a user and an assistant in a "
+    "few short paragraphs. Keep the facts, file names and open questions that "
+    "later questions may refer to."
+)
+# Characters of the previous thread that are summarized, the most recent ones.
+MAX_SUMMARIZED_CHARS = 24_000
+
+
+@dataclasses.dataclass
+class ThreadRecord:
+    """The current thread of an owner.
+
+    Attributes:
+        thread_id: The ID of the OpenAI thread.
+        messages: The number of messages in the thread.
+        prompt_tokens: The prompt tokens of the latest run, which read the
+            whole thread.
+        previous_thread_ids: The threads rolled over, oldest first.
+    """
+
+    thread_id: str
+    messages: int = 0
+    prompt_tokens: int = 0
+    previous_thread_ids: list[str] = dataclasses.field(default_factory=list)
+    created_at: float = dataclasses.field(default_factory=time.time)
+
+
+class ThreadManager:
+    """Create, track and roll over the threads of owners.
+
+    Args:
+        store: The key-value store of the thread index.
+        max_messages: Messages after which a thread is rolled over.
+        max_prompt_tokens: Run prompt tokens after which a thread is rolled over.
+        summary_model: The model that summarizes rolled over threads, or `None`
+            to start new threads empty.
+    """
+
+    def __init__(
+        self,
+        store: KVStore | None = None,
+        max_messages: int = 50,
+        max_prompt_tokens: int = 32_000,
+        summary_model: str | None = "gpt-4o-mini",
+    ) -> None:
+        self.max_messages = max_messages
+        self.max_prompt_tokens = max_prompt_tokens
+        self.summary_model = summary_model
+        self._threads: Namespace[ThreadRecord] = Namespace(
+            store or get_kv_store(),
+            "threads",
+            encode=lambda record: json.dumps(dataclasses.asdict(record)),
+            decode=lambda value: ThreadRecord(**json.loads(value)),
+        )
+        # Locks are only kept while they are held or waited for, so that the
+        # locks of past sessions do not pile up.
+        self._locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+        self._owner_locks: weakref.WeakValueDictionary[str, asyncio.Lock] = (
+            weakref.WeakValueDictionary()
+        )
+
+    def lock(self, thread_id: str) -> asyncio.Lock:
+        """Return the lock that serializes the runs of the thread in this process."""
+        return self._locks.setdefault(thread_id, asyncio.Lock())
+
+    def get(self, owner: str) -> ThreadRecord | None:
+        return self._threads.get(owner)
+
+    def needs_rollover(self, record: ThreadRecord) -> bool:
+        return (
+            record.messages >= self.max_messages
+            or record.prompt_tokens >= self.max_prompt_tokens
+        )
+
+    async def get_thread_id(self, client: openai.AsyncOpenAI, owner: str) -> str:
+        """Return the thread for the next message of `owner`, rolled over if needed."""
+        record = self._threads.get(owner)
+        if record is not None and not self.needs_rollover(record):
+            return record.thread_id
+        # Concurrent turns of the owner must not each roll the thread over.
+        async with self._owner_locks.setdefault(owner, asyncio.Lock()):
+            return await self._rollover(client, owner)
+
+    async def _rollover(self, client: openai.AsyncOpenAI, owner: str) -> str:
+        # Read again: another turn may have rolled over while this one waited.
+        record = self._threads.get(owner)
+        if record is not None and not self.needs_rollover(record):
+            return record.thread_id
+        messages = []
+        previous_thread_ids = []
+        if record is not None:
+            logger.info(
+                "Rolling over thread %s of %s after %d messages and %d prompt tokens.",
+                record.thread_id,
+                owner,
+                record.messages,
+                record.prompt_tokens,
+            )
+            previous_thread_ids = [*record.previous_thread_ids, record.thread_id]
+            if summary := await self._summarize(client, record.thread_id):
+                messages.append(
+                    {
+                        "role": "assistant",
+                        "content": f"Summary of our conversation so far:\n{summary}",
+                    }
+                )
+        thread = await client.beta.threads.create(messages=messages)
+        self._threads.put(
+            owner,
+            ThreadRecord(
+                thread_id=thread.id,
+                messages=len(messages),
+                previous_thread_ids=previous_thread_ids,
+            ),
+        )
+        return thread.id
+
+    async def _summarize(
+        self, client: openai.AsyncOpenAI, thread_id: str
+    ) -> str | None:
+        if self.summary_model is None:
+            return None
+        try:
+            lines = []
+            async for message in client.beta.threads.messages.list(
+                thread_id=thread_id, order="desc"
+            ):
+                text = " ".join(
+                    block.text.value
+                    for block in message.content
+                    if block.type == "text"
+                )
+                lines.append(f"{message.role}: {text}")
+                if sum(map(len, lines)) > MAX_SUMMARIZED_CHARS:
+                    break
+            completion = await client.chat.completions.create(
+                model=self.summary_model,
+                messages=[
+                    {"role": "system", "content": SUMMARY_PROMPT},
+                    {"role": "user", "content": "\n\n".join(reversed(lines))},
+                ],
+            )
+            return completion.choices[0].message.content
+        except openai.OpenAIError:
+            logger.warning(
+                "Could not summarize thread %s, starting afresh.",
+                thread_id,
+                exc_info=True,
+            )
+            return None
+
+    def record_run(
+        self, owner: str, thread_id: str, run: Run | None, messages: int = 2
+    ) -> None:
+        """Record that a run that added `messages` messages ended on `thread_id`.
+
+        Runs on a thread that was rolled over in the meantime are ignored.
+        """
+        store = self._threads.store
+        with store.transaction() as transaction:
+            record = self._threads.get(owner, transaction)
+            if record is None or record.thread_id != thread_id:
+                return
+            record.messages += messages
+            if run is not None and run.usage is not None:
+                record.prompt_tokens = run.usage.prompt_tokens
+            self._threads.put(owner, record, transaction)
+
+
+def thread_owner(user_identifier: str | None, session_id: str) -> str:
+    """Return the owner of the threads of a chat: its user, or else its session."""
+    if user_identifier is not None:
+        return f"user:{user_identifier}"
+    return f"session:{session_id}"
+
+
+_thread_manager: ThreadManager | None = None
+
+
+def get_thread_manager() -> ThreadManager:
+    """Return the process-wide thread manager, configured from the settings."""
+    global _thread_manager
+    if _thread_manager is None:
+        settings = get_settings()
+        _thread_manager = ThreadManager(
+            max_messages=settings.thread_max_messages,
+            max_prompt_tokens=settings.thread_max_prompt_tokens,
+            summary_model=settings.thread_summary_model,
+        )
+    return _thread_manager
@@ -0,0 +1,208 @@
+import asyncio
+import concurrent.futures
+import contextlib
+import contextvars
+import functools
+import inspect
+import logging
+import typing as t
+
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.run_submit_tool_outputs_params import ToolOutput
+
+from copilot.ai.answer_cache import AnswerCache, get_answer_cache
+from copilot.ai.openai_.function_calling import (
+    ToolCallError,
+    format_tool_exception,
+    resolve_tool_call,
+)
+from copilot.ai.tools.progress import progress_callback
+from copilot.settings import get_settings
+from copilot.tracing import Tracer, get_tracer
+
+logger = logging.getLogger(__name__)
+
+ToolProgressHandler = t.Callable[[str, str], t.Awaitable[None]]
+"""Awaited with the ID of a tool call and the progress its tool reported."""
+
+
+@contextlib.asynccontextmanager
+async def _forward_progress(
+    tool_call_id: str, on_progress: ToolProgressHandler | None
+) -> t.AsyncIterator[None]:
+    """Forward the progress reported in this context to `on_progress`, in order."""
+    if on_progress is None:
+        yield
+        return
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue[str | None] = asyncio.Queue()
+    closed = False
+
+    def report(text: str) -> None:
+        # Timed out tools keep running in their thread after the call is over.
+        if not closed:
+            loop.call_soon_threadsafe(queue.put_nowait, text)
+
+    async def forward() -> None:
+        while (text := await queue.get()) is not None:
+            try:
+                await on_progress(tool_call_id, text)
+            except Exception:
+                logger.warning("Could not forward tool progress.", exc_info=True)
+
+    forwarder = asyncio.create_task(forward())
+    try:
+        with progress_callback(report):
+            yield
+    finally:
+        closed = True
+        # After the progress already scheduled by `report`.
+        loop.call_soon(queue.put_nowait, None)
+        await forwarder
+
+
+class ToolExecutor:
+    """Runs the tool calls of a run concurrently without blocking the event loop.
+
+    Synchronous tools run on a bounded thread pool, with the context of the
+    call copied in, and `async def` tools are awaited on the event loop. Every
+    tool call gets a timeout, and the number of concurrent calls of a tool can
+    be capped. Process pools are not supported: the tools share in-process
+    llama-index state, and contexts cannot be pickled.
+
+    Timed out synchronous tools cannot be interrupted: their thread finishes in
+    the background, but the assistant gets the timeout message right away.
+
+    With an `answer_cache`, cacheable tool calls are answered from it when they
+    can be, and only successful answers are cached.
+
+    The progress tools report with `copilot.ai.tools.progress.report_progress`
+    is passed to the `on_progress` handler of `execute_tools`.
+
+    Every tool call is timed in a span of `tracer`, named after the tool.
+    """
+
+    def __init__(
+        self,
+        max_workers: int = 8,
+        default_timeout: float | None = 300.0,
+        timeouts: dict[str, float] | None = None,
+        concurrency_limits: dict[str, int] | None = None,
+        executor: concurrent.futures.ThreadPoolExecutor | None = None,
+        answer_cache: AnswerCache | None = None,
+        tracer: Tracer | None = None,
+    ) -> None:
+        self.default_timeout = default_timeout
+        self.answer_cache = answer_cache
+        self.tracer = tracer or Tracer()
+        self.timeouts = timeouts or {}
+        self.concurrency_limits = concurrency_limits or {}
+        self._executor = executor or concurrent.futures.ThreadPoolExecutor(
+            max_workers=max_workers, thread_name_prefix="copilot-tool"
+        )
+        self._semaphores: dict[str, asyncio.Semaphore] = {}
+
+    def _semaphore(self, tool_name: str) -> asyncio.Semaphore | None:
+        if tool_name not in self.concurrency_limits:
+            return None
+        if tool_name not in self._semaphores:
+            self._semaphores[tool_name] = asyncio.Semaphore(
+                self.concurrency_limits[tool_name]
+            )
+        return self._semaphores[tool_name]
+
+    async def _run(self, function: t.Callable[..., t.Any], **kwargs: t.Any) -> t.Any:
+        if inspect.iscoroutinefunction(function):
+            return await function(**kwargs)
+        # Copy the context so that tools still see the Chainlit session.
+        context = contextvars.copy_context()
+        return await asyncio.get_running_loop().run_in_executor(
+            self._executor, functools.partial(context.run, function, **kwargs)
+        )
+
+    async def _execute_tool(
+        self,
+        tool_call: RequiredActionFunctionToolCall,
+        on_progress: ToolProgressHandler | None = None,
+    ) -> str:
+        try:
+            tool, kwargs = resolve_tool_call(tool_call)
+        except ToolCallError as e:
+            return str(e)
+        name = tool.metadata.name
+        timeout = self.timeouts.get(name, self.default_timeout)
+        semaphore = self._semaphore(name)
+
+        async def call() -> str:
+            async with semaphore or contextlib.nullcontext():
+                return str(
+                    await asyncio.wait_for(
+                        self._run(tool.function, **kwargs), timeout=timeout
+                    )
+                )
+
+        with self.tracer.span(f"tool {name}", tool_call_id=tool_call.id) as span:
+            try:
+                async with _forward_progress(tool_call.id, on_progress):
+                    if self.answer_cache is None:
+                        return await call()
+                    return await self.answer_cache.get_or_compute(name, kwargs, call)
+            except TimeoutError:
+                span.set_status("error")
+                span.set_attribute("timeout", timeout)
+                return f"Tool {name} timed out after {timeout} seconds."
+            except Exception as e:
+                span.set_status("error")
+                span.set_attribute("exception", repr(e))
+                return format_tool_exception(e)
+
+    async def execute_tool(
+        self,
+        tool_call: RequiredActionFunctionToolCall,
+        on_progress: ToolProgressHandler | None = None,
+    ) -> ToolOutput:
+        return {
+            "output": await self._execute_tool(tool_call, on_progress),
+            "tool_call_id": tool_call.id,
+        }
+
+    async def execute_tools(
+        self,
+        tool_calls: list[RequiredActionFunctionToolCall],
+        on_progress: ToolProgressHandler | None = None,
+    ) -> list[ToolOutput]:
+        """Execute `tool_calls` concurrently. Outputs keep the order of the calls."""
+        return list(
+            await asyncio.gather(
+                *(self.execute_tool(c, on_progress) for c in tool_calls)
+            )
+        )
+
+    def shutdown(self, wait: bool = True) -> None:
+        self._executor.shutdown(wait=wait, cancel_futures=True)
+
+
+_tool_executor: ToolExecutor | None = None
+
+
+def get_tool_executor() -> ToolExecutor:
+    """Return the process-wide tool executor, configured from the settings."""
+    global _tool_executor
+    if _tool_executor is None:
+        settings = get_settings()
+        _tool_executor = ToolExecutor(
+            max_workers=settings.tool_max_workers,
+            default_timeout=settings.tool_timeout,
+            timeouts=settings.tool_timeouts,
+            concurrency_limits=settings.tool_concurrency_limits,
+            answer_cache=get_answer_cache(),
+            tracer=get_tracer(),
+        )
+    return _tool_executor
+
+
+def shutdown_tool_executor() -> None:
+    global _tool_executor
+    executor, _tool_executor = _tool_executor, None
+    if executor is not None:
+        executor.shutdown(wait=False)
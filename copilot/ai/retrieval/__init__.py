@@ -0,0 +1 @@
+"""Vector stores and retrieval over the ingested documents."""
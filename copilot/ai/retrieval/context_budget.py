@@ -0,0 +1,105 @@
+"""Pack retrieved nodes into the LLM prompt under a token budget.
+
+`MarkdownElementNodeParser` turns every table into a node with the summary and
+the whole table as Markdown, which can be thousands of tokens, and into another
+node with the summary alone. Retrieving a few of them makes prompts huge and
+responses slow. Nodes are packed by relevance: text already in the context is
+skipped, tables that do not fit are replaced by their summary, and whatever
+still does not fit is dropped.
+"""
+
+import logging
+import re
+
+from llama_index.core.bridge.pydantic import Field
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from copilot.ai.tokens import count_tokens
+
+logger = logging.getLogger(__name__)
+_SEGMENT_END = re.compile(r"(?<=[.!?])\s+|\n+")
+
+
+def _segments(text: str) -> set[str]:
+    """Split `text` into normalized sentences and lines, to detect overlaps."""
+    segments = (" ".join(s.split()).casefold() for s in _SEGMENT_END.split(text))
+    return {segment for segment in segments if segment}
+
+
+class TokenBudgetPostprocessor(BaseNodePostprocessor):
+    """Keep the most relevant nodes that fit in `max_tokens`.
+
+    Nodes are considered from the highest score down. A node is skipped if at
+    least `overlap_threshold` of its sentences are already in the context. A
+    table node that does not fit is replaced by its summary. Other nodes that do
+    not fit are dropped, except the most relevant one, which is truncated.
+    """
+
+    max_tokens: int = Field(default=3000, description="The token budget.")
+    overlap_threshold: float = Field(
+        default=0.8, description="The share of known sentences of a duplicate."
+    )
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TokenBudgetPostprocessor"
+
+    def _postprocess_nodes(
+        self,
+        nodes: list[NodeWithScore],
+        query_bundle: QueryBundle | None = None,
+    ) -> list[NodeWithScore]:
+        ranked = sorted(nodes, key=lambda n: n.score or 0.0, reverse=True)
+        kept: list[NodeWithScore] = []
+        seen: set[str] = set()
+        used = before = 0
+        for node in ranked:
+            tokens = count_tokens(node.node.get_content(MetadataMode.LLM))
+            before += tokens
+            if used + tokens > self.max_tokens:
+                node, tokens = self._shrink(node, self.max_tokens - used, not kept)
+                if node is None:
+                    continue
+            segments = _segments(node.node.get_content(MetadataMode.NONE))
+            overlap = len(segments & seen)
+            if segments and overlap >= self.overlap_threshold * len(segments):
+                continue
+            kept.append(node)
+            seen |= segments
+            used += tokens
+        logger.info(
+            "Packed %d of %d nodes in %d context tokens instead of %d.",
+            len(kept),
+            len(nodes),
+            used,
+            before,
+        )
+        return kept
+
+    def _shrink(
+        self, node: NodeWithScore, max_tokens: int, truncate: bool
+    ) -> tuple[NodeWithScore | None, int]:
+        """Return `node` reduced to `max_tokens` and its tokens, or `None`."""
+        truncated = node.node.model_copy()
+        summary = truncated.metadata.get("table_summary")
+        if summary:
+            truncated.set_content(summary)
+            tokens = count_tokens(truncated.get_content(MetadataMode.LLM))
+            if tokens <= max_tokens:
+                return NodeWithScore(node=truncated, score=node.score), tokens
+        if not truncate or max_tokens <= 0:
+            return None, 0
+        text = summary or node.node.get_content(MetadataMode.NONE)
+        # Binary search for the longest prefix of the text that fits.
+        low, high = 0, len(text)
+        while low < high:
+            middle = (low + high + 1) // 2
+            truncated.set_content(text[:middle])
+            if count_tokens(truncated.get_content(MetadataMode.LLM)) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        truncated.set_content(text[:low])
+        tokens = count_tokens(truncated.get_content(MetadataMode.LLM))
+        return NodeWithScore(node=truncated, score=node.score), tokens
@@ -0,0 +1,176 @@
+"""Hybrid dense and keyword retrieval, with a lightweight local reranker.
+
+Dense retrieval alone needs a large top-k before exact-term questions (part
+numbers, function names) find their chunk, and every extra chunk makes the
+prompt larger and slower. The hybrid retriever fuses the candidates of the
+vector index with those of the BM25 keyword index, and the reranker promotes
+the chunks that contain the rare terms of the question, so that a few chunks
+are enough.
+"""
+
+import asyncio
+import typing as t
+
+from llama_index.core.base.base_retriever import BaseRetriever
+from llama_index.core.bridge.pydantic import Field, PrivateAttr
+from llama_index.core.postprocessor.types import BaseNodePostprocessor
+from llama_index.core.query_engine import RetrieverQueryEngine
+from llama_index.core.schema import MetadataMode, NodeWithScore, QueryBundle
+
+from copilot.ai.retrieval.keyword_index import KeywordIndex, tokenize
+
+
+def _normalized_scores(nodes: list[NodeWithScore]) -> dict[str, float]:
+    """Min-max normalize the scores of `nodes` to [0, 1], keyed by node ID."""
+    scores = {n.node.node_id: n.score or 0.0 for n in nodes}
+    if not scores:
+        return {}
+    low, high = min(scores.values()), max(scores.values())
+    if high == low:
+        return {node_id: 1.0 for node_id in scores}
+    return {node_id: (s - low) / (high - low) for node_id, s in scores.items()}
+
+
+class HybridRetriever(BaseRetriever):
+    """Fuse the results of a vector retriever and a keyword index.
+
+    Both score lists are min-max normalized, then combined as
+    `alpha * dense + (1 - alpha) * keyword`, counting a missing score as 0.
+
+    Args:
+        vector_retriever: The dense retriever, returning its candidates.
+        keyword_index: The BM25 index over the same nodes.
+        similarity_top_k: The number of fused nodes to return.
+        keyword_top_k: The number of keyword index candidates.
+        alpha: The weight of the dense scores.
+    """
+
+    def __init__(
+        self,
+        vector_retriever: BaseRetriever,
+        keyword_index: KeywordIndex,
+        similarity_top_k: int = 4,
+        keyword_top_k: int = 20,
+        alpha: float = 0.5,
+    ) -> None:
+        super().__init__()
+        self._vector_retriever = vector_retriever
+        self._keyword_index = keyword_index
+        self._similarity_top_k = similarity_top_k
+        self._keyword_top_k = keyword_top_k
+        self._alpha = alpha
+
+    def _fuse(
+        self, dense: list[NodeWithScore], keyword: list[NodeWithScore]
+    ) -> list[NodeWithScore]:
+        dense_scores = _normalized_scores(dense)
+        keyword_scores = _normalized_scores(keyword)
+        nodes = {n.node.node_id: n.node for n in keyword} | {
+            n.node.node_id: n.node for n in dense
+        }
+        fused = [
+            NodeWithScore(
+                node=node,
+                score=self._alpha * dense_scores.get(node_id, 0.0)
+                + (1 - self._alpha) * keyword_scores.get(node_id, 0.0),
+            )
+            for node_id, node in nodes.items()
+        ]
+        fused.sort(key=lambda n: n.score or 0.0, reverse=True)
+        return fused[: self._similarity_top_k]
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        dense = self._vector_retriever.retrieve(query_bundle)
+        keyword = self._keyword_index.search(
+            query_bundle.query_str, self._keyword_top_k
+        )
+        return self._fuse(dense, keyword)
+
+    async def _aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        # The keyword index is queried in a thread, while the dense retrieval
+        # is awaited on the event loop.
+        dense, keyword = await asyncio.gather(
+            self._vector_retriever.aretrieve(query_bundle),
+            asyncio.to_thread(
+                self._keyword_index.search, query_bundle.query_str, self._keyword_top_k
+            ),
+        )
+        return self._fuse(dense, keyword)
+
+
+class TermCoverageReranker(BaseNodePostprocessor):
+    """Rerank nodes by how much of the question's rare vocabulary they contain.
+
+    The coverage of a node is the IDF-weighted share of the question's terms
+    that appear in it. Nodes are ordered by
+    `(1 - weight) * score + weight * coverage` and the first `top_n` are kept.
+    """
+
+    top_n: int = Field(default=3, description="The number of nodes to keep.")
+    weight: float = Field(default=0.5, description="The weight of the coverage.")
+    _keyword_index: KeywordIndex = PrivateAttr()
+
+    def __init__(self, keyword_index: KeywordIndex, **kwargs: t.Any) -> None:
+        super().__init__(**kwargs)
+        self._keyword_index = keyword_index
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "TermCoverageReranker"
+
+    def _postprocess_nodes(
+        self,
+        nodes: list[NodeWithScore],
+        query_bundle: QueryBundle | None = None,
+    ) -> list[NodeWithScore]:
+        if query_bundle is None or not nodes:
+            return nodes[: self.top_n]
+        idf = self._keyword_index.idf(tokenize(query_bundle.query_str))
+        return self._rerank(nodes, idf)
+
+    async def _apostprocess_nodes(
+        self,
+        nodes: list[NodeWithScore],
+        query_bundle: QueryBundle | None = None,
+    ) -> list[NodeWithScore]:
+        """Like `_postprocess_nodes`, querying the keyword index in a thread."""
+        if query_bundle is None or not nodes:
+            return nodes[: self.top_n]
+        idf = await asyncio.to_thread(
+            self._keyword_index.idf, tokenize(query_bundle.query_str)
+        )
+        return self._rerank(nodes, idf)
+
+    def _rerank(
+        self, nodes: list[NodeWithScore], idf: dict[str, float]
+    ) -> list[NodeWithScore]:
+        total = sum(idf.values())
+        if not total:
+            return nodes[: self.top_n]
+        reranked = []
+        for node in nodes:
+            terms = set(tokenize(node.node.get_content(MetadataMode.EMBED)))
+            coverage = sum(w for term, w in idf.items() if term in terms) / total
+            score = (1 - self.weight) * (node.score or 0.0) + self.weight * coverage
+            reranked.append(NodeWithScore(node=node.node, score=score))
+        reranked.sort(key=lambda n: n.score or 0.0, reverse=True)
+        return reranked[: self.top_n]
+
+
+class HybridQueryEngine(RetrieverQueryEngine):
+    """Retriever query engine that awaits the postprocessors that can be awaited.
+
+    `RetrieverQueryEngine.aretrieve` runs every postprocessor synchronously, on
+    the event loop, which blocks it on the keyword index of the reranker.
+    """
+
+    async def aretrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        nodes = await self._retriever.aretrieve(query_bundle)
+        for postprocessor in self._node_postprocessors:
+            if isinstance(postprocessor, TermCoverageReranker):
+                nodes = await postprocessor._apostprocess_nodes(nodes, query_bundle)
+            else:
+                nodes = postprocessor.postprocess_nodes(
+                    nodes, query_bundle=query_bundle
+                )
+        return nodes
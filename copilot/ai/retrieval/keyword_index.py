@@ -0,0 +1,222 @@
+"""Persisted BM25 keyword index over the ingested nodes.
+
+Dense embeddings blur exact terms such as part numbers and function names,
+which the keyword index matches exactly. It is updated incrementally as nodes
+are ingested and deleted, and keeps the nodes themselves so that it can return
+them without a round trip to the vector store.
+"""
+
+import collections
+import itertools
+import json
+import math
+import re
+import sqlite3
+import threading
+import typing as t
+from pathlib import Path
+
+from llama_index.core.schema import BaseNode, MetadataMode, NodeWithScore
+from llama_index.core.vector_stores.utils import (
+    metadata_dict_to_node,
+    node_to_metadata_dict,
+)
+
+from copilot import constants
+
+# Identifiers such as `XJ-200.3` or `get_settings` are kept whole, and their
+# parts are indexed as well.
+_TOKEN = re.compile(r"\w+(?:[-./:]\w+)*")
+_PART = re.compile(r"[^\W_]+")
+STOPWORDS = frozenset(
+    "a an and are as at be by for from has have how in is it its of on or that the "
+    "this to was what when where which who why will with".split()
+)
+
+
+def tokenize(text: str) -> list[str]:
+    """Split `text` into lower-cased terms, without stopwords."""
+    terms = []
+    for token in _TOKEN.findall(text.lower()):
+        parts = _PART.findall(token)
+        if len(parts) > 1 or parts != [token]:
+            terms.append(token)
+        terms += parts
+    return [term for term in terms if term not in STOPWORDS]
+
+
+class KeywordIndex:
+    """BM25 index persisted in SQLite.
+
+    Args:
+        path: The SQLite database of the index.
+        k1: BM25 term frequency saturation.
+        b: BM25 document length normalization.
+    """
+
+    def __init__(self, path: Path, k1: float = 1.2, b: float = 0.75) -> None:
+        self.path = path
+        self.k1 = k1
+        self.b = b
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(
+            self.path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS docs (
+                node_id TEXT PRIMARY KEY,
+                length INTEGER NOT NULL,
+                node TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS postings (
+                term TEXT NOT NULL,
+                node_id TEXT NOT NULL,
+                tf INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                PRIMARY KEY (term, node_id)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS postings_node_id ON postings (node_id);
+            -- The corpus statistics, updated with the docs, so that processes
+            -- sharing the index read them fresh.
+            CREATE TABLE IF NOT EXISTS stats (
+                id INTEGER PRIMARY KEY CHECK (id = 0),
+                n_docs INTEGER NOT NULL,
+                total_length INTEGER NOT NULL
+            );
+            INSERT OR IGNORE INTO stats
+                SELECT 0, COUNT(*), COALESCE(SUM(length), 0) FROM docs;
+            """)
+
+    def __len__(self) -> int:
+        with self._lock:
+            return self._stats()[0]
+
+    def _stats(self) -> tuple[int, int]:
+        """Return the number of docs and their total length."""
+        n_docs, total_length = self._db.execute(
+            "SELECT n_docs, total_length FROM stats"
+        ).fetchone()
+        return n_docs, total_length
+
+    def _update_stats(self, n_docs: int, total_length: int) -> None:
+        self._db.execute(
+            "UPDATE stats SET n_docs = n_docs + ?, total_length = total_length + ?",
+            (n_docs, total_length),
+        )
+
+    def _delete(self, node_ids: t.Sequence[str]) -> None:
+        lengths = []
+        for node_id in node_ids:
+            row = self._db.execute(
+                "DELETE FROM docs WHERE node_id = ? RETURNING length", (node_id,)
+            ).fetchone()
+            if row is not None:
+                lengths.append(row[0])
+        self._update_stats(-len(lengths), -sum(lengths))
+        self._db.executemany(
+            "DELETE FROM postings WHERE node_id = ?", [(i,) for i in node_ids]
+        )
+
+    def add(self, nodes: t.Sequence[BaseNode]) -> None:
+        """Index `nodes`, replacing the nodes with the same IDs."""
+        documents = []
+        for node in nodes:
+            terms = tokenize(node.get_content(metadata_mode=MetadataMode.EMBED))
+            metadata = node_to_metadata_dict(node, flat_metadata=False)
+            documents.append((node.node_id, terms, json.dumps(metadata)))
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._delete([node_id for node_id, _, _ in documents])
+            self._db.executemany(
+                "INSERT INTO docs (node_id, length, node) VALUES (?, ?, ?)",
+                [(node_id, len(terms), node) for node_id, terms, node in documents],
+            )
+            self._db.executemany(
+                "INSERT INTO postings (term, node_id, tf, length) VALUES (?, ?, ?, ?)",
+                [
+                    (term, node_id, tf, len(terms))
+                    for node_id, terms, _ in documents
+                    for term, tf in collections.Counter(terms).items()
+                ],
+            )
+            self._update_stats(
+                len(documents), sum(len(terms) for _, terms, _ in documents)
+            )
+
+    def delete(self, node_ids: t.Sequence[str]) -> None:
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            self._delete(node_ids)
+
+    def idf(self, terms: t.Iterable[str]) -> dict[str, float]:
+        """Return the BM25 inverse document frequency of each of `terms`."""
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            return self._idf(terms, self._stats()[0])
+
+    def _idf(self, terms: t.Iterable[str], n_docs: int) -> dict[str, float]:
+        idf = {}
+        for term in set(terms):
+            (df,) = self._db.execute(
+                "SELECT COUNT(*) FROM postings WHERE term = ?", (term,)
+            ).fetchone()
+            idf[term] = math.log(1 + (n_docs - df + 0.5) / (df + 0.5))
+        return idf
+
+    def search(self, query: str, top_k: int) -> list[NodeWithScore]:
+        """Return the `top_k` nodes with the highest BM25 score for `query`."""
+        # One transaction reads the statistics and postings of the same state.
+        with self._lock, self._db:
+            self._db.execute("BEGIN")
+            n_docs, total_length = self._stats()
+            idf = self._idf(tokenize(query), n_docs)
+            if not n_docs or not idf:
+                return []
+            average_length = total_length / n_docs
+            # Scores are summed by SQLite, as common terms have many postings,
+            # which also hold the document length to avoid joining `docs`.
+            values = ", ".join(["(?, ?)"] * len(idf))
+            top = self._db.execute(
+                f"""
+                WITH query (term, idf) AS (VALUES {values})
+                SELECT node_id, SUM(idf * tf * ? / (tf + ? + ? * length)) AS score
+                FROM query JOIN postings USING (term)
+                GROUP BY node_id ORDER BY score DESC LIMIT ?
+                """,
+                [
+                    *itertools.chain.from_iterable(idf.items()),
+                    self.k1 + 1,
+                    self.k1 * (1 - self.b),
+                    self.k1 * self.b / average_length,
+                    top_k,
+                ],
+            ).fetchall()
+            nodes = self._nodes([node_id for node_id, _ in top])
+        return [
+            NodeWithScore(node=node, score=score)
+            for node, (_, score) in zip(nodes, top)
+        ]
+
+    def _nodes(self, node_ids: list[str]) -> list[BaseNode]:
+        placeholders = ", ".join("?" * len(node_ids))
+        rows = dict(
+            self._db.execute(
+                f"SELECT node_id, node FROM docs WHERE node_id IN ({placeholders})",
+                node_ids,
+            ).fetchall()
+        )
+        return [metadata_dict_to_node(json.loads(rows[i])) for i in node_ids]
+
+
+_keyword_indexes: dict[str, KeywordIndex] = {}
+
+
+def get_keyword_index(index_name: str) -> KeywordIndex:
+    """Return the process-wide keyword index of the vector index `index_name`."""
+    if index_name not in _keyword_indexes:
+        _keyword_indexes[index_name] = KeywordIndex(
+            constants.KEYWORD_INDEX_DIR / f"{index_name}.sqlite3"
+        )
+    return _keyword_indexes[index_name]
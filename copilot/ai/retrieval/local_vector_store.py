@@ -0,0 +1,517 @@
+"""Local, persisted vector store, an alternative to Pinecone for one machine.
+
+Embeddings are appended, L2-normalized, to a flat float32 file that queries
+memory-map, and nodes are kept in SQLite next to it. Small stores are searched
+exhaustively. Once a store holds `ann_threshold` nodes, an inverted file (IVF)
+index of spherical k-means clusters narrows each query down to the `n_probe`
+closest clusters, plus the nodes added since the clusters were built.
+"""
+
+import contextlib
+import dataclasses
+import json
+import sqlite3
+import threading
+import typing as t
+from pathlib import Path
+
+import numpy as np
+from llama_index.core.bridge.pydantic import PrivateAttr
+from llama_index.core.schema import BaseNode
+from llama_index.core.vector_stores.simple import _build_metadata_filter_fn
+from llama_index.core.vector_stores.types import (
+    BasePydanticVectorStore,
+    MetadataFilters,
+    VectorStoreQuery,
+    VectorStoreQueryResult,
+)
+from llama_index.core.vector_stores.utils import (
+    metadata_dict_to_node,
+    node_to_metadata_dict,
+)
+
+_EMBEDDINGS_FILE = "embeddings.f32"
+_NODES_FILE = "nodes.sqlite3"
+_IVF_FILE = "ivf.npz"
+
+
+def _normalize(embeddings: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(embeddings, axis=-1, keepdims=True)
+    return embeddings / np.where(norms == 0, 1, norms)
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the `k` highest `scores`, highest first."""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+@dataclasses.dataclass
+class IVFIndex:
+    """Inverted file index over the first `n_rows` rows of an embedding matrix.
+
+    Attributes:
+        centroids: The normalized centroid of every cluster.
+        order: Row numbers, grouped by cluster.
+        offsets: `order[offsets[i]:offsets[i + 1]]` are the rows of cluster `i`.
+        n_rows: The number of rows assigned to clusters.
+    """
+
+    centroids: np.ndarray
+    order: np.ndarray
+    offsets: np.ndarray
+    n_rows: int
+
+    @classmethod
+    def build(
+        cls,
+        embeddings: np.ndarray,
+        n_lists: int | None = None,
+        iterations: int = 10,
+        seed: int = 0,
+    ) -> "IVFIndex":
+        """Cluster normalized `embeddings` with spherical k-means on a sample."""
+        n_rows = len(embeddings)
+        n_lists = n_lists or max(1, int(np.sqrt(n_rows)))
+        rng = np.random.default_rng(seed)
+        sample_rows = rng.choice(n_rows, min(n_rows, n_lists * 64), replace=False)
+        sample = np.asarray(embeddings[np.sort(sample_rows)])
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)]
+        for _ in range(iterations):
+            assignments = np.argmax(sample @ centroids.T, axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assignments, sample)
+            # Clusters that lost all their members keep their previous centroid.
+            empty = np.bincount(assignments, minlength=n_lists) == 0
+            sums[empty] = centroids[empty]
+            centroids = _normalize(sums)
+        assignments = np.concatenate(
+            [
+                np.argmax(embeddings[start : start + 65536] @ centroids.T, axis=1)
+                for start in range(0, n_rows, 65536)
+            ]
+        )
+        order = np.argsort(assignments, kind="stable")
+        offsets = np.searchsorted(assignments[order], np.arange(n_lists + 1))
+        return cls(centroids, order, offsets, n_rows)
+
+    def candidates(self, query: np.ndarray, n_probe: int) -> np.ndarray:
+        """Return the rows of the `n_probe` clusters closest to `query`."""
+        lists = _top_k(self.centroids @ query, n_probe)
+        return np.concatenate(
+            [self.order[self.offsets[i] : self.offsets[i + 1]] for i in lists]
+        )
+
+    def save(self, path: Path) -> None:
+        tmp_path = path.with_suffix(".tmp.npz")
+        np.savez(
+            tmp_path,
+            centroids=self.centroids,
+            order=self.order,
+            offsets=self.offsets,
+            n_rows=self.n_rows,
+        )
+        tmp_path.replace(path)
+
+    @classmethod
+    def load(cls, path: Path) -> "IVFIndex":
+        with np.load(path) as data:
+            return cls(
+                data["centroids"], data["order"], data["offsets"], int(data["n_rows"])
+            )
+
+
+class LocalVectorStore(BasePydanticVectorStore):
+    """Vector store persisted in `persist_dir`, searched in process.
+
+    Similarities are cosine similarities. Adding a node with the ID of a stored
+    node replaces it, like an upsert in Pinecone.
+
+    Several processes can share a store. Writes are serialized by SQLite and
+    bump a generation number, which every read checks to reload the store only
+    when another process changed it. Compaction renumbers the rows, so it
+    writes the embeddings of a new epoch to new files.
+
+    Args:
+        persist_dir: The directory of the store. It is created if needed.
+        ann_threshold: The number of nodes from which queries use the IVF index.
+        n_probe: The number of IVF clusters searched by a query.
+    """
+
+    stores_text: bool = True
+    flat_metadata: bool = False
+    persist_dir: str
+    ann_threshold: int = 20_000
+    n_probe: int = 16
+
+    _lock: threading.RLock = PrivateAttr()
+    _db: sqlite3.Connection = PrivateAttr()
+    _embeddings: np.ndarray | None = PrivateAttr(default=None)
+    _alive: np.ndarray = PrivateAttr()
+    _dim: int | None = PrivateAttr(default=None)
+    _ivf: IVFIndex | None = PrivateAttr(default=None)
+    _generation: int | None = PrivateAttr(default=None)
+    _epoch: int = PrivateAttr(default=0)
+
+    def __init__(
+        self, persist_dir: str | Path, ann_threshold: int = 20_000, n_probe: int = 16
+    ) -> None:
+        super().__init__(
+            persist_dir=str(persist_dir), ann_threshold=ann_threshold, n_probe=n_probe
+        )
+        self._root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(
+            self._root / _NODES_FILE, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript("""
+            CREATE TABLE IF NOT EXISTS info (key TEXT PRIMARY KEY, value TEXT);
+            CREATE TABLE IF NOT EXISTS nodes (
+                row INTEGER PRIMARY KEY,
+                node_id TEXT NOT NULL,
+                ref_doc_id TEXT,
+                metadata TEXT NOT NULL,
+                deleted INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS nodes_node_id ON nodes (node_id);
+            CREATE INDEX IF NOT EXISTS nodes_ref_doc_id ON nodes (ref_doc_id);
+            """)
+        # Reading loads the store.
+        with self._reading():
+            pass
+
+    @classmethod
+    def class_name(cls) -> str:
+        return "LocalVectorStore"
+
+    @property
+    def client(self) -> None:
+        return None
+
+    @property
+    def _root(self) -> Path:
+        return Path(self.persist_dir)
+
+    def __len__(self) -> int:
+        return int(self._alive.sum())
+
+    def _embeddings_path(self, epoch: int) -> Path:
+        return self._root / (
+            _EMBEDDINGS_FILE if epoch == 0 else f"embeddings.{epoch}.f32"
+        )
+
+    def _ivf_path(self, epoch: int) -> Path:
+        return self._root / (_IVF_FILE if epoch == 0 else f"ivf.{epoch}.npz")
+
+    def _info(self, key: str) -> str | None:
+        row = self._db.execute(
+            "SELECT value FROM info WHERE key = ?", (key,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _set_info(self, key: str, value: t.Any) -> None:
+        self._db.execute(
+            "REPLACE INTO info (key, value) VALUES (?, ?)", (key, str(value))
+        )
+
+    def _refresh(self) -> None:
+        """Reload the store if it changed since it was loaded."""
+        if int(self._info("generation") or 0) != self._generation:
+            self._load()
+
+    @contextlib.contextmanager
+    def _reading(self) -> t.Iterator[None]:
+        """Read the store from one snapshot, reloaded if it changed."""
+        with self._lock:
+            for retry in [True, False]:
+                self._db.execute("BEGIN")
+                try:
+                    self._refresh()
+                    break
+                except BaseException as e:
+                    self._db.execute("ROLLBACK")
+                    # Another process compacted the store and removed the files
+                    # of this snapshot; the next snapshot has the new ones.
+                    if not (retry and isinstance(e, FileNotFoundError)):
+                        raise
+            try:
+                yield
+            finally:
+                self._db.execute("COMMIT")
+
+    @contextlib.contextmanager
+    def _writing(self) -> t.Iterator[None]:
+        """Change the latest state of the store, in a transaction."""
+        with self._lock:
+            try:
+                with self._db:
+                    # Other processes wait for the transaction to write.
+                    self._db.execute("BEGIN IMMEDIATE")
+                    self._refresh()
+                    yield
+                    assert self._generation is not None
+                    self._generation += 1
+                    self._set_info("generation", self._generation)
+            except BaseException:
+                # Reload on next use, as the state in memory may not be rolled back.
+                self._generation = None
+                raise
+
+    def _load(self) -> None:
+        """Map the embeddings and read which rows are deleted."""
+        dim = self._info("dim")
+        self._dim = int(dim) if dim is not None else None
+        self._epoch = int(self._info("epoch") or 0)
+        deleted = [
+            d for (d,) in self._db.execute("SELECT deleted FROM nodes ORDER BY row")
+        ]
+        self._alive = ~np.array(deleted, dtype=bool)
+        self._map_embeddings()
+        ivf_path = self._ivf_path(self._epoch)
+        self._ivf = IVFIndex.load(ivf_path) if ivf_path.exists() else None
+        if self._ivf is not None and self._ivf.n_rows > len(self._alive):
+            self._ivf = None
+        self._generation = int(self._info("generation") or 0)
+
+    def _map_embeddings(self) -> None:
+        # The file may end with the embeddings of an add that is not committed.
+        n_rows = len(self._alive)
+        self._embeddings = (
+            np.memmap(
+                self._embeddings_path(self._epoch),
+                dtype=np.float32,
+                mode="r",
+                shape=(n_rows, self._dim),
+            )
+            if n_rows
+            else None
+        )
+
+    def _maybe_build_ivf(self) -> None:
+        """Rebuild the IVF index if it is stale.
+
+        It runs in the write of the rows it indexes, whose generation tells the
+        readers of other processes to load the new index with the new rows.
+        """
+        n_rows = len(self._alive)
+        if len(self) < self.ann_threshold or self._embeddings is None:
+            return
+        # Rebuild once the nodes added since the last build are as many as before.
+        if self._ivf is not None and n_rows < 2 * self._ivf.n_rows:
+            return
+        self._ivf = IVFIndex.build(self._embeddings)
+        self._ivf.save(self._ivf_path(self._epoch))
+
+    def add(self, nodes: t.Sequence[BaseNode], **add_kwargs: t.Any) -> list[str]:
+        if not nodes:
+            return []
+        embeddings = _normalize(
+            np.asarray([node.get_embedding() for node in nodes], dtype=np.float32)
+        )
+        node_ids = [node.node_id for node in nodes]
+        with self._writing():
+            if self._dim is None:
+                self._dim = embeddings.shape[1]
+                self._set_info("dim", self._dim)
+            if embeddings.shape[1] != self._dim:
+                raise ValueError(
+                    f"Expected embeddings of dimension {self._dim}, "
+                    f"got {embeddings.shape[1]}."
+                )
+            start = len(self._alive)
+            with self._embeddings_path(self._epoch).open("ab") as f:
+                # Drop embeddings whose nodes were not committed, e.g. after a crash.
+                f.truncate(start * self._dim * 4)
+                f.write(embeddings.tobytes())
+            replaced = self._mark_deleted("node_id", node_ids)
+            self._db.executemany(
+                "INSERT INTO nodes (row, node_id, ref_doc_id, metadata) "
+                "VALUES (?, ?, ?, ?)",
+                [
+                    (
+                        start + i,
+                        node.node_id,
+                        node.ref_doc_id,
+                        json.dumps(
+                            node_to_metadata_dict(
+                                node, remove_text=False, flat_metadata=False
+                            )
+                        ),
+                    )
+                    for i, node in enumerate(nodes)
+                ],
+            )
+            self._alive = np.concatenate([self._alive, np.ones(len(nodes), bool)])
+            self._alive[replaced] = False
+            self._map_embeddings()
+            self._maybe_build_ivf()
+        return node_ids
+
+    def _mark_deleted(self, column: str, values: t.Sequence[str]) -> list[int]:
+        """Mark the live rows whose `column` is in `values` deleted, and return them."""
+        rows = []
+        for value in values:
+            rows += [
+                row
+                for (row,) in self._db.execute(
+                    f"UPDATE nodes SET deleted = 1 WHERE {column} = ? AND deleted = 0 "
+                    "RETURNING row",
+                    (value,),
+                )
+            ]
+        return rows
+
+    def delete(self, ref_doc_id: str, **delete_kwargs: t.Any) -> None:
+        with self._writing():
+            self._alive[self._mark_deleted("ref_doc_id", [ref_doc_id])] = False
+        self._maybe_compact()
+
+    def delete_nodes(
+        self,
+        node_ids: list[str] | None = None,
+        filters: MetadataFilters | None = None,
+        **delete_kwargs: t.Any,
+    ) -> None:
+        with self._writing():
+            rows = self._matching_rows(node_ids=node_ids, filters=filters)
+            self._db.executemany(
+                "UPDATE nodes SET deleted = 1 WHERE row = ?",
+                [(int(row),) for row in rows],
+            )
+            self._alive[rows] = False
+        self._maybe_compact()
+
+    def _maybe_compact(self) -> None:
+        n_rows = len(self._alive)
+        if n_rows >= 1024 and len(self) < n_rows / 2:
+            self.compact()
+
+    def _start_epoch(self, alive_embeddings: np.ndarray | None) -> int:
+        """Write the embeddings of the next epoch, and return the previous one."""
+        previous = self._epoch
+        self._epoch += 1
+        path = self._embeddings_path(self._epoch)
+        if alive_embeddings is not None:
+            alive_embeddings.tofile(path)
+        else:
+            path.write_bytes(b"")
+        self._set_info("epoch", self._epoch)
+        return previous
+
+    def _remove_epoch(self, epoch: int) -> None:
+        # Processes that still map these files keep reading them until they
+        # reload, and snapshots that have yet to open them start over.
+        self._embeddings_path(epoch).unlink(missing_ok=True)
+        self._ivf_path(epoch).unlink(missing_ok=True)
+
+    def clear(self) -> None:
+        with self._writing():
+            self._db.execute("DELETE FROM nodes")
+            previous = self._start_epoch(None)
+            self._load()
+        self._remove_epoch(previous)
+
+    def compact(self) -> None:
+        """Rewrite the store without its deleted nodes."""
+        with self._writing():
+            alive_rows = np.flatnonzero(self._alive)
+            previous = self._start_epoch(
+                None if self._embeddings is None else self._embeddings[alive_rows]
+            )
+            self._db.execute("DELETE FROM nodes WHERE deleted = 1")
+            # Number the remaining rows from 0, through negative numbers so that
+            # no two rows ever share a number.
+            self._db.execute("""
+                CREATE TEMP TABLE renumber (old INTEGER PRIMARY KEY, new INTEGER)
+                """)
+            self._db.execute("""
+                INSERT INTO renumber
+                    SELECT row, ROW_NUMBER() OVER (ORDER BY row) - 1 FROM nodes
+                """)
+            self._db.execute("""
+                UPDATE nodes
+                    SET row = -1 - (SELECT new FROM renumber WHERE old = nodes.row)
+                """)
+            self._db.execute("UPDATE nodes SET row = -1 - row")
+            self._db.execute("DROP TABLE renumber")
+            self._load()
+            self._maybe_build_ivf()
+        self._remove_epoch(previous)
+
+    def _matching_rows(
+        self,
+        node_ids: list[str] | None = None,
+        doc_ids: list[str] | None = None,
+        filters: MetadataFilters | None = None,
+    ) -> np.ndarray:
+        """Return the live rows with the given IDs whose metadata matches `filters`."""
+        clauses, params = ["deleted = 0"], []
+        for column, values in [("node_id", node_ids), ("ref_doc_id", doc_ids)]:
+            if values is not None:
+                clauses.append(f"{column} IN ({', '.join('?' * len(values))})")
+                params += values
+        rows = self._db.execute(
+            f"SELECT row, metadata FROM nodes WHERE {' AND '.join(clauses)}", params
+        ).fetchall()
+        if filters is not None:
+            metadata = {str(row): json.loads(m) for row, m in rows}
+            matches = _build_metadata_filter_fn(metadata.__getitem__, filters)
+            rows = [(row, m) for row, m in rows if matches(str(row))]
+        return np.array([row for row, _ in rows], dtype=np.int64)
+
+    def _nodes(self, rows: t.Iterable[int]) -> list[BaseNode]:
+        rows = [int(row) for row in rows]
+        placeholders = ", ".join("?" * len(rows))
+        metadata = dict(
+            self._db.execute(
+                f"SELECT row, metadata FROM nodes WHERE row IN ({placeholders})", rows
+            ).fetchall()
+        )
+        return [metadata_dict_to_node(json.loads(metadata[row])) for row in rows]
+
+    def get_nodes(
+        self,
+        node_ids: list[str] | None = None,
+        filters: MetadataFilters | None = None,
+    ) -> list[BaseNode]:
+        with self._reading():
+            return self._nodes(self._matching_rows(node_ids=node_ids, filters=filters))
+
+    def query(self, query: VectorStoreQuery, **kwargs: t.Any) -> VectorStoreQueryResult:
+        if query.query_embedding is None:
+            raise ValueError("LocalVectorStore only answers queries with embeddings.")
+        query_embedding = _normalize(
+            np.asarray(query.query_embedding, dtype=np.float32)
+        )
+        with self._reading():
+            if self._embeddings is None:
+                return VectorStoreQueryResult(nodes=[], similarities=[], ids=[])
+            if query.node_ids or query.doc_ids or query.filters:
+                rows = self._matching_rows(query.node_ids, query.doc_ids, query.filters)
+            elif self._ivf is not None:
+                rows = np.concatenate(
+                    [
+                        self._ivf.candidates(query_embedding, self.n_probe),
+                        np.arange(self._ivf.n_rows, len(self._alive)),
+                    ]
+                )
+                rows = rows[self._alive[rows]]
+            else:
+                rows = np.flatnonzero(self._alive)
+            rows = np.sort(rows)
+            if len(rows) > len(self._alive) // 4:
+                # Scanning the whole map beats copying most of it.
+                scores = (self._embeddings @ query_embedding)[rows]
+            else:
+                scores = self._embeddings[rows] @ query_embedding
+            top = _top_k(scores, query.similarity_top_k)
+            nodes = self._nodes(rows[top])
+        return VectorStoreQueryResult(
+            nodes=nodes,
+            similarities=scores[top].tolist(),
+            ids=[node.node_id for node in nodes],
+        )
@@ -0,0 +1,90 @@
+"""Coalesce streamed tokens into fewer websocket messages.
+
+The Assistants API streams a delta every few characters, and forwarding each of
+them with `stream_token` costs a websocket message, which dominates the CPU of
+the Chainlit workers when many sessions stream at once. Tokens are buffered and
+sent at most once per interval, which a reader cannot tell apart from a token
+by token stream.
+"""
+
+import asyncio
+import logging
+import math
+import time
+import typing as t
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCoalescer:
+    """Buffer tokens and send them in batches.
+
+    A token is sent right away if nothing was sent for `interval` seconds, so
+    the first token of a stream is not delayed. Otherwise it is buffered, and
+    the buffer is sent `interval` seconds after the previous send, or as soon as
+    it holds `max_chars` characters. `flush` sends the buffer right away, and
+    must be awaited when the stream ends or before anything else is shown.
+
+    Args:
+        send: Awaited with the coalesced text, one call at a time, in order.
+        interval: The minimum number of seconds between two sends.
+        max_chars: The size of the buffer that is sent without waiting.
+    """
+
+    def __init__(
+        self,
+        send: t.Callable[[str], t.Awaitable[t.Any]],
+        interval: float = 0.04,
+        max_chars: int = 200,
+        clock: t.Callable[[], float] = time.monotonic,
+    ) -> None:
+        self.send = send
+        self.interval = interval
+        self.max_chars = max_chars
+        self.clock = clock
+        self.sends = 0
+        self._buffer: list[str] = []
+        self._size = 0
+        self._last_send = -math.inf
+        self._lock = asyncio.Lock()
+        self._timer: asyncio.TimerHandle | None = None
+        self._pending: asyncio.Task[None] | None = None
+
+    async def push(self, token: str) -> None:
+        """Send `token` now or with the next batch."""
+        if not token:
+            return
+        self._buffer.append(token)
+        self._size += len(token)
+        wait = self._last_send + self.interval - self.clock()
+        if wait <= 0 or self._size >= self.max_chars:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                wait, self._flush_later
+            )
+
+    def _flush_later(self) -> None:
+        self._timer = None
+        self._pending = asyncio.create_task(self._flush_logging_errors())
+
+    async def _flush_logging_errors(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.warning("Could not send coalesced tokens.", exc_info=True)
+
+    async def flush(self) -> None:
+        """Send the buffered tokens, if any."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        async with self._lock:
+            if not self._buffer:
+                return
+            text = "".join(self._buffer)
+            self._buffer.clear()
+            self._size = 0
+            self._last_send = self.clock()
+            self.sends += 1
+            await self.send(text)
@@ -0,0 +1,8 @@
+"""Token counts of the text that goes into LLM prompts."""
+
+from llama_index.core.utils import get_tokenizer
+
+
+def count_tokens(text: str) -> int:
+    """Return the number of tokens of `text` for the global tokenizer."""
+    return len(get_tokenizer()(text))
@@ -2,9 +2,14 @@
 
 import typing as t
 
-from copilot.ai.tools.csv_df_qa import csv_qa_tool
-from copilot.ai.tools.pdf_qa import pdf_qa_tool
+from copilot.ai.tools.csv_df_qa import csv_qa_corpus_version, csv_qa_tool
+from copilot.ai.tools.pdf_qa import pdf_qa_corpus_version, pdf_qa_tool
 
 TOOL_REGISTRY: dict[str, t.Callable[..., t.Any]] = {
     x.__name__: x for x in [csv_qa_tool, pdf_qa_tool]
 }
+# The tools whose answers are cached, with the version of the data they answer from.
+CORPUS_VERSIONS: dict[str, t.Callable[..., str | None]] = {
+    csv_qa_tool.__name__: csv_qa_corpus_version,
+    pdf_qa_tool.__name__: pdf_qa_corpus_version,
+}
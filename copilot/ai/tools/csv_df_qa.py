@@ -1,17 +1,66 @@
+import asyncio
+import functools
+import os
 import typing as t
 
 import pandas as pd
-from llama_index.experimental import PandasQueryEngine
+from llama_index.core.base.base_query_engine import BaseQueryEngine
 
-from copilot.ai.llama_index_ import initialize_llama_index
+from copilot.ai.dataframes.cache import FileKey, get_dataframe_cache
+from copilot.ai.dataframes.duckdb_engine import DuckDBQueryEngine, fits_in_memory
+from copilot.ai.dataframes.profile import ProfiledPandasQueryEngine, TableProfile
+from copilot.ai.llama_index_ import get_current_model, load_llm
+from copilot.ai.tools.progress import report_progress
+from copilot.settings import get_settings
 
 
-def csv_qa_tool(
+def _build_query_engine(
+    profile: TableProfile, df: pd.DataFrame, model: str
+) -> ProfiledPandasQueryEngine:
+    return ProfiledPandasQueryEngine(
+        df,
+        profile,
+        max_context_tokens=get_settings().csv_context_max_tokens,
+        llm=load_llm(model),
+    )
+
+
+@functools.lru_cache(maxsize=16)
+def _out_of_core_query_engine(key: FileKey, model: str) -> DuckDBQueryEngine:
+    return DuckDBQueryEngine(
+        key.path,
+        llm=load_llm(model),
+        memory_limit=get_settings().csv_memory_budget,
+    )
+
+
+def get_csv_query_engine(csv_path: str, model: str) -> BaseQueryEngine:
+    """Return a query engine for `csv_path`, querying it on disk if it is too large."""
+    if fits_in_memory(csv_path, get_settings().csv_memory_budget):
+        cache = get_dataframe_cache()
+        return cache.get_query_engine(
+            csv_path,
+            model,
+            functools.partial(_build_query_engine, cache.get_profile(csv_path)),
+        )
+    return _out_of_core_query_engine(FileKey.from_path(csv_path), model)
+
+
+def csv_qa_corpus_version(csv_path: str, query: str) -> str:
+    """Version of the CSV file for the answer cache."""
+    key = FileKey.from_path(csv_path)
+    return f"{get_current_model()}:{key.path}:{key.mtime_ns}:{key.size}"
+
+
+async def csv_qa_tool(
     csv_path: t.Annotated[str, "The path to the CSV file."],
     query: t.Annotated[str, "The question to answer about the CSV file."],
 ) -> str:
     """Answer questions about the contents of a CSV file."""
-    initialize_llama_index()
-    df = pd.read_csv(csv_path)
-    query_engine = PandasQueryEngine(df)
-    return str(query_engine.query(query))
+    report_progress(f"Loading {os.path.basename(csv_path)}.\n")
+    # Loading and profiling the CSV blocks, but the LLM calls are awaited.
+    query_engine = await asyncio.to_thread(
+        get_csv_query_engine, csv_path, get_current_model()
+    )
+    report_progress("Querying the data.\n")
+    return str(await query_engine.aquery(query))
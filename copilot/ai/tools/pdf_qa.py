@@ -1,12 +1,72 @@
+import asyncio
 import typing as t
 
-from copilot.ai.llama_index_ import load_index
+import chainlit as cl
+from chainlit.context import ChainlitContextException
 
+from copilot import constants
+from copilot.ai.ingestion.manifest import get_ingestion_manifest
+from copilot.ai.ingestion.pipeline import get_ingestion_queue
+from copilot.ai.llama_index_ import (
+    DEFAULT_INDEX_NAME,
+    get_current_model,
+    get_index_cache,
+)
+from copilot.ai.tools.progress import astream_response, report_progress
+from copilot.settings import get_settings
 
-def pdf_qa_tool(
+
+def _session_job_ids() -> list[str] | None:
+    try:
+        return cl.user_session.get(constants.INGESTION_JOB_IDS_KEY) or []
+    except ChainlitContextException:
+        # Outside of a chat session, e.g. in scripts, consider every job.
+        return None
+
+
+async def _wait_for_ingestion() -> list[str]:
+    """Wait briefly for the PDFs uploaded in this session to be indexed.
+
+    Returns:
+        The names of the PDFs that are still being indexed.
+    """
+    job_ids = _session_job_ids()
+    if unfinished := get_ingestion_queue().unfinished(job_ids):
+        names = ", ".join(name for job in unfinished for name in job.file_paths)
+        report_progress(f"Waiting for {names} to be indexed.\n")
+    unfinished = await get_ingestion_queue().await_jobs(
+        job_ids, timeout=get_settings().ingestion_wait_timeout
+    )
+    return [name for job in unfinished for name in job.file_paths]
+
+
+def pdf_qa_corpus_version(query: str) -> str | None:
+    """Version of the PDF index for the answer cache.
+
+    It is the persisted version of the ingestion manifest, so that ingestions of
+    other processes and earlier runs change it too. `None` while PDFs of this
+    session are being indexed, since the answer should wait for them.
+    """
+    if get_ingestion_queue().unfinished(_session_job_ids()):
+        return None
+    version = get_ingestion_manifest().version
+    return f"{get_current_model()}:{DEFAULT_INDEX_NAME}:{version}"
+
+
+async def pdf_qa_tool(
     query: t.Annotated[str, "The user's question"],
 ) -> str:
     """Answer a question about the uploaded PDFs."""
-    vector_store = load_index()
-    query_engine = vector_store.as_query_engine()
-    return str(query_engine.query(query))
+    pending = await _wait_for_ingestion()
+    # The first call loads the index from disk.
+    query_engine = await asyncio.to_thread(
+        get_index_cache().get_query_engine, get_current_model()
+    )
+    report_progress("Searching the PDFs.\n\n")
+    answer = await astream_response(await query_engine.aquery(query))
+    if pending:
+        answer += (
+            f"\n\nNote: {', '.join(pending)} are still being indexed, so this "
+            "answer may not cover them yet."
+        )
+    return answer
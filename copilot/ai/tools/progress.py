@@ -0,0 +1,62 @@
+"""Progress of the running tool call, streamed to the UI while the tool runs.
+
+The assistant only gets a tool's output once it returns, which for PDF and CSV
+questions takes seconds. Meanwhile, tools report what they are doing and the
+tokens of streamed answers, and the tool executor forwards them to the step of
+the tool call in the UI.
+"""
+
+import contextlib
+import contextvars
+import typing as t
+
+from llama_index.core.base.response.schema import (
+    RESPONSE_TYPE,
+    AsyncStreamingResponse,
+    StreamingResponse,
+)
+
+ProgressCallback = t.Callable[[str], None]
+"""Receives progress text, from any thread."""
+
+_progress_callback: contextvars.ContextVar[ProgressCallback | None] = (
+    contextvars.ContextVar("progress_callback", default=None)
+)
+
+
+def report_progress(text: str) -> None:
+    """Stream `text` to the UI step of the running tool call, if there is one."""
+    if (callback := _progress_callback.get()) is not None:
+        callback(text)
+
+
+@contextlib.contextmanager
+def progress_callback(callback: ProgressCallback) -> t.Iterator[None]:
+    """Send the progress reported in this context to `callback`."""
+    token = _progress_callback.set(callback)
+    try:
+        yield
+    finally:
+        _progress_callback.reset(token)
+
+
+def stream_response(response: RESPONSE_TYPE) -> str:
+    """Return the answer of a query engine response, reporting it as it streams."""
+    if isinstance(response, StreamingResponse) and response.response_txt is None:
+        tokens = []
+        for token in response.response_gen:
+            report_progress(token)
+            tokens.append(token)
+        response.response_txt = "".join(tokens)
+    return str(response)
+
+
+async def astream_response(response: RESPONSE_TYPE) -> str:
+    """Like `stream_response`, for responses of `aquery`."""
+    if isinstance(response, AsyncStreamingResponse):
+        tokens = []
+        async for token in response.async_response_gen():
+            report_progress(token)
+            tokens.append(token)
+        return "".join(tokens)
+    return stream_response(response)
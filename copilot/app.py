@@ -1,32 +1,69 @@
-import os
+import contextlib
 import typing as t
 
 import chainlit as cl
-from llama_index.core.node_parser import MarkdownElementNodeParser
+from chainlit.server import app as chainlit_app
 
 from copilot import constants
 from copilot.ai.assistant_event_handler import EventHandler
-from copilot.ai.llama_index_ import load_index, load_parser, parse_files_if_needed
+from copilot.ai.client_registry import close_client_registry
+from copilot.ai.ingestion.pipeline import (
+    enqueue_pdfs,
+    get_ingestion_worker,
+    stop_ingestion_worker,
+)
 from copilot.ai.openai_ import (
-    create_assistant,
     get_async_openai_client,
-    get_or_create_thread_id,
+    get_or_create_assistant_id,
+    get_thread_manager,
+    shutdown_tool_executor,
+    thread_owner,
 )
+from copilot.tracing import current_span, get_tracer
+
+
+def _shutdown_with_chainlit() -> None:
+    """Shut the shared clients and worker pools down with the Chainlit server."""
+    lifespan = chainlit_app.router.lifespan_context
+    if getattr(lifespan, "shuts_down_copilot", False):
+        # The module is re-imported when Chainlit reloads the app.
+        return
+
+    @contextlib.asynccontextmanager
+    async def lifespan_with_shutdown(app: t.Any) -> t.AsyncIterator[t.Any]:
+        try:
+            async with lifespan(app) as state:
+                yield state
+        finally:
+            await stop_ingestion_worker()
+            shutdown_tool_executor()
+            await close_client_registry()
+
+    lifespan_with_shutdown.shuts_down_copilot = True  # type: ignore[attr-defined]
+    chainlit_app.router.lifespan_context = lifespan_with_shutdown
+
+
+_shutdown_with_chainlit()
 
 
 @cl.on_chat_start
 async def on_chat_start():
+    # Picks up the jobs left over by a previous run of the app.
+    get_ingestion_worker().start()
     client = get_async_openai_client()
-    thread_id = await get_or_create_thread_id(client)
-    cl.user_session.set(constants.THREAD_ID_KEY, thread_id)
+    user = cl.user_session.get("user")
+    cl.user_session.set(
+        constants.THREAD_OWNER_KEY,
+        thread_owner(user.identifier if user else None, cl.user_session.get("id")),
+    )
     chat_profile = cl.user_session.get(constants.CHAT_PROFILES_KEY)
-    assistant = await create_assistant(
+    assistant_id = await get_or_create_assistant_id(
         client=client,
         model=constants.get_model_for_chat_profile(
             t.cast(constants.ChatProfiles, chat_profile)
         ),
     )
-    cl.user_session.set(constants.ASSISTANT_ID_KEY, assistant.id)
+    cl.user_session.set(constants.ASSISTANT_ID_KEY, assistant_id)
     await cl.Message(
         content=f"You are using the **{chat_profile}** chat profile."
     ).send()
@@ -56,22 +93,25 @@ async def on_stop():
         await client.beta.threads.runs.cancel(
             thread_id=current_run_step.thread_id, run_id=current_run_step.id
         )
-    assistant_id = cl.user_session.get(constants.ASSISTANT_ID_KEY)
-    assert isinstance(assistant_id, str)
-    await client.beta.assistants.delete(assistant_id)
 
 
 @cl.on_message
 async def on_message(message: cl.Message):
+    with get_tracer().span("turn", new_trace=True):
+        await _answer(message)
+
+
+async def _answer(message: cl.Message) -> None:
     client = get_async_openai_client()
-    thread_id = cl.user_session.get(constants.THREAD_ID_KEY)
-    assert isinstance(thread_id, str)
+    owner = cl.user_session.get(constants.THREAD_OWNER_KEY)
+    assert isinstance(owner, str)
     assistant_id = cl.user_session.get(constants.ASSISTANT_ID_KEY)
     assert isinstance(assistant_id, str)
+    tracer = get_tracer()
+    turn = current_span()
+    turn.set_attribute("owner", owner)
 
     if message.elements:
-        vector_store = load_index()
-        parser = load_parser()
         pdf_file_paths = {}
         for element in message.elements:
             if isinstance(element, cl.File):
@@ -83,29 +123,41 @@ async def on_message(message: cl.Message):
                     message.content += f"\n\nCSV file path is: {element.path}"
         if pdf_file_paths:
             message.content += "The user uploaded some PDFs."
-            async with cl.Step("Parsing PDFs...") as step:
-                results = await parse_files_if_needed(pdf_file_paths, parser)
-                await step.update()
-            async with cl.Step("Creating nodes...") as step:
-                node_parser = MarkdownElementNodeParser(
-                    num_workers=os.cpu_count() or 1,
+            async with cl.Step("Queueing PDFs for indexing...") as step:
+                with tracer.span("queue_pdfs", files=len(pdf_file_paths)):
+                    job = await enqueue_pdfs(pdf_file_paths, uploaded_by=owner)
+                job_ids = cl.user_session.get(constants.INGESTION_JOB_IDS_KEY) or []
+                cl.user_session.set(constants.INGESTION_JOB_IDS_KEY, [*job_ids, job.id])
+                step.output = (
+                    f"{len(pdf_file_paths)} PDF(s) are being indexed in the background."
                 )
-                nodes = await node_parser.aget_nodes_from_documents(results)
-                await step.update()
-            async with cl.Step("Inserting nodes into vector store...") as step:
-                vector_store.insert_nodes(nodes)
                 await step.update()
-            vector_store.storage_context.persist()
 
-    await client.beta.threads.messages.create(
-        thread_id=thread_id,
-        role="user",
-        content=message.content,
-    )
+    threads = get_thread_manager()
+    with tracer.span("get_thread"):
+        thread_id = await threads.get_thread_id(client, owner)
+    turn.set_attribute("thread_id", thread_id)
+    cl.user_session.set(constants.THREAD_ID_KEY, thread_id)
+    # A thread can only have one active run.
+    async with threads.lock(thread_id):
+        turn.add_event("thread_locked")
+        with tracer.span("create_message"):
+            await client.beta.threads.messages.create(
+                thread_id=thread_id,
+                role="user",
+                content=message.content,
+            )
 
-    async with client.beta.threads.runs.stream(
-        thread_id=thread_id,
-        assistant_id=assistant_id,
-        event_handler=EventHandler(assistant_name="Copilot", client=client),
-    ) as stream:
-        await stream.until_done()
+        with tracer.span("run") as run_span:
+            event_handler = EventHandler(assistant_name="Copilot", client=client)
+            async with client.beta.threads.runs.stream(
+                thread_id=thread_id,
+                assistant_id=assistant_id,
+                event_handler=event_handler,
+            ) as stream:
+                await stream.until_done()
+            if event_handler.last_run and event_handler.last_run.usage:
+                usage = event_handler.last_run.usage
+                run_span.set_attribute("prompt_tokens", usage.prompt_tokens)
+                run_span.set_attribute("completion_tokens", usage.completion_tokens)
+        threads.record_run(owner, thread_id, event_handler.last_run)
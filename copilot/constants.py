@@ -4,11 +4,24 @@ from pathlib import Path
 ASSISTANT_ID_KEY = "assistant_id"
 CHAT_PROFILES_KEY = "chat_profile"
 CURRENT_RUN_STEP_KEY = "current_run_step"
+INGESTION_JOB_IDS_KEY = "ingestion_job_ids"
 THREAD_ID_KEY = "thread"
+THREAD_OWNER_KEY = "thread_owner"
 
 PERSISTENCE_DIR = Path.home() / ".copilot"
+KV_STORE_PATH = PERSISTENCE_DIR / "copilot.sqlite3"
+# Imported into the key-value store on first use.
 PERSISTENCE_SETTINGS_PATH = PERSISTENCE_DIR / "settings.json"
-PARSED_FILES_DATA_PATH = PERSISTENCE_DIR / "parsed_files.json"
+INGESTION_MANIFEST_PATH = PERSISTENCE_DIR / "ingestion_manifest.jsonl"
+PARSE_CACHE_DIR = PERSISTENCE_DIR / "parse_cache"
+EMBEDDING_CACHE_PATH = PERSISTENCE_DIR / "embeddings.sqlite3"
+INGESTION_QUEUE_PATH = PERSISTENCE_DIR / "ingestion_jobs.sqlite3"
+INGESTION_STAGING_DIR = PERSISTENCE_DIR / "ingestion_staging"
+DATAFRAME_CACHE_DIR = PERSISTENCE_DIR / "dataframes"
+DUCKDB_TEMP_DIR = PERSISTENCE_DIR / "duckdb_tmp"
+VECTOR_STORE_DIR = PERSISTENCE_DIR / "vector_stores"
+KEYWORD_INDEX_DIR = PERSISTENCE_DIR / "keyword_indexes"
+TRACES_PATH = PERSISTENCE_DIR / "traces.jsonl"
 
 SUPPROTED_OPENAI_FILE_SEARCH_MIME_TYPES = [
     "text/x-c",
@@ -0,0 +1,237 @@
+"""Key-value persistence shared by the processes of the app.
+
+Persisted settings used to live in a JSON file that was read and rewritten whole
+on every write, without locking, so concurrent sessions and workers lost each
+other's updates. The store keeps values in SQLite in WAL mode: every write is an
+atomic upsert, writes can be batched in one transaction, and reads go through
+an in-process cache that is dropped whenever another connection commits.
+"""
+
+import contextlib
+import json
+import logging
+import sqlite3
+import threading
+import typing as t
+from pathlib import Path
+
+from copilot import constants
+
+logger = logging.getLogger(__name__)
+
+T = t.TypeVar("T")
+
+
+class Transaction:
+    """Reads and writes of one transaction, see `KVStore.transaction`."""
+
+    def __init__(self, db: sqlite3.Connection) -> None:
+        self._db = db
+        self.writes: dict[tuple[str, str], str | None] = {}
+
+    def get(self, namespace: str, key: str) -> str | None:
+        if (namespace, key) in self.writes:
+            return self.writes[namespace, key]
+        row = self._db.execute(
+            "SELECT value FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        ).fetchone()
+        return None if row is None else row[0]
+
+    def put_many(self, namespace: str, items: t.Mapping[str, str]) -> None:
+        self._db.executemany(
+            "INSERT INTO kv (namespace, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value",
+            [(namespace, key, value) for key, value in items.items()],
+        )
+        self.writes.update({(namespace, key): v for key, v in items.items()})
+
+    def put(self, namespace: str, key: str, value: str) -> None:
+        self.put_many(namespace, {key: value})
+
+    def delete(self, namespace: str, key: str) -> None:
+        self._db.execute(
+            "DELETE FROM kv WHERE namespace = ? AND key = ?", (namespace, key)
+        )
+        self.writes[namespace, key] = None
+
+
+class KVStore:
+    """String values in namespaces, persisted in SQLite.
+
+    Args:
+        path: The SQLite database of the store.
+        busy_timeout: Seconds to wait for the writes of other processes.
+    """
+
+    def __init__(self, path: Path, busy_timeout: float = 30.0) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.RLock()
+        self._db = sqlite3.connect(
+            self.path,
+            timeout=busy_timeout,
+            check_same_thread=False,
+            isolation_level=None,
+        )
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS kv (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                PRIMARY KEY (namespace, key)
+            ) WITHOUT ROWID
+            """)
+        self._cache: dict[tuple[str, str], str | None] = {}
+        self._data_version: int | None = None
+
+    def _sync_cache(self) -> None:
+        # `data_version` changes when another connection commits.
+        (data_version,) = self._db.execute("PRAGMA data_version").fetchone()
+        if data_version != self._data_version:
+            self._cache.clear()
+            self._data_version = data_version
+
+    def get(self, namespace: str, key: str) -> str | None:
+        with self._lock:
+            self._sync_cache()
+            if (namespace, key) not in self._cache:
+                row = self._db.execute(
+                    "SELECT value FROM kv WHERE namespace = ? AND key = ?",
+                    (namespace, key),
+                ).fetchone()
+                self._cache[namespace, key] = None if row is None else row[0]
+            return self._cache[namespace, key]
+
+    def items(self, namespace: str) -> dict[str, str]:
+        with self._lock:
+            return dict(
+                self._db.execute(
+                    "SELECT key, value FROM kv WHERE namespace = ?", (namespace,)
+                )
+            )
+
+    def count(self, namespace: str) -> int:
+        with self._lock:
+            (count,) = self._db.execute(
+                "SELECT COUNT(*) FROM kv WHERE namespace = ?", (namespace,)
+            ).fetchone()
+            return count
+
+    @contextlib.contextmanager
+    def transaction(self) -> t.Iterator[Transaction]:
+        """Run the reads and writes of the block atomically.
+
+        The transaction takes the write lock of the database when it begins, so
+        that read-modify-write blocks of several processes do not interleave.
+        """
+        with self._lock:
+            self._sync_cache()
+            self._db.execute("BEGIN IMMEDIATE")
+            transaction = Transaction(self._db)
+            try:
+                yield transaction
+            except BaseException:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            self._cache.update(transaction.writes)
+
+    def put_many(self, namespace: str, items: t.Mapping[str, str]) -> None:
+        with self.transaction() as transaction:
+            transaction.put_many(namespace, items)
+
+    def put(self, namespace: str, key: str, value: str) -> None:
+        self.put_many(namespace, {key: value})
+
+    def delete(self, namespace: str, key: str) -> None:
+        with self.transaction() as transaction:
+            transaction.delete(namespace, key)
+
+    def close(self) -> None:
+        with self._lock:
+            self._db.close()
+
+
+class Namespace(t.Generic[T]):
+    """Typed view of one namespace of a `KVStore`.
+
+    Values are encoded to strings with `encode` and decoded with `decode`, JSON
+    by default. Methods that take a `transaction` run in it.
+    """
+
+    def __init__(
+        self,
+        store: KVStore,
+        name: str,
+        encode: t.Callable[[T], str] = json.dumps,
+        decode: t.Callable[[str], T] = json.loads,
+    ) -> None:
+        self.store = store
+        self.name = name
+        self.encode = encode
+        self.decode = decode
+
+    def __len__(self) -> int:
+        return self.store.count(self.name)
+
+    def get(self, key: str, transaction: Transaction | None = None) -> T | None:
+        source = transaction or self.store
+        value = source.get(self.name, key)
+        return None if value is None else self.decode(value)
+
+    def items(self) -> dict[str, T]:
+        return {k: self.decode(v) for k, v in self.store.items(self.name).items()}
+
+    def put(self, key: str, value: T, transaction: Transaction | None = None) -> None:
+        self.put_many({key: value}, transaction)
+
+    def put_many(
+        self, items: t.Mapping[str, T], transaction: Transaction | None = None
+    ) -> None:
+        encoded = {key: self.encode(value) for key, value in items.items()}
+        (transaction or self.store).put_many(self.name, encoded)
+
+    def delete(self, key: str, transaction: Transaction | None = None) -> None:
+        (transaction or self.store).delete(self.name, key)
+
+    def update(self, key: str, function: t.Callable[[T | None], T]) -> T:
+        """Atomically replace the value of `key` with `function(value)`."""
+        with self.store.transaction() as transaction:
+            value = function(self.get(key, transaction))
+            self.put(key, value, transaction)
+        return value
+
+    def import_json(self, path: Path) -> None:
+        """Import the JSON object in `path` once, keeping the values already set.
+
+        The file is renamed afterwards, so that it is only imported once.
+        """
+        if not path.exists():
+            return
+        items = json.loads(path.read_text())
+        with self.store.transaction() as transaction:
+            missing = {
+                key: value
+                for key, value in items.items()
+                if self.get(key, transaction) is None
+            }
+            self.put_many(missing, transaction)
+        try:
+            path.rename(path.with_name(path.name + ".imported"))
+        except FileNotFoundError:
+            # Another process imported it at the same time.
+            pass
+        logger.info("Imported %d values of %s.", len(missing), path)
+
+
+_kv_store: KVStore | None = None
+
+
+def get_kv_store() -> KVStore:
+    """Return the process-wide key-value store."""
+    global _kv_store
+    if _kv_store is None:
+        _kv_store = KVStore(constants.KV_STORE_PATH)
+    return _kv_store
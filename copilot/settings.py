@@ -1,3 +1,6 @@
+import functools
+import typing as t
+
 from copilot import REPO_ROOT
 
 
@@ -10,3 +13,111 @@ class CopilotSettings(pds.BaseSettings, extra="allow"):
     openai_api_key: str = pdt.Field(alias="COPILOT_OPENAI_API_KEY")
     llama_cloud_api_key: str = pdt.Field(alias="COPILOT_LLAMA_CLOUD_API_KEY")
     pinecone_api_key: str = pdt.Field(alias="COPILOT_PINECONE_API_KEY")
+    vector_store_backend: t.Literal["pinecone", "local"] = pdt.Field(
+        default="pinecone", alias="COPILOT_VECTOR_STORE_BACKEND"
+    )
+    local_vector_store_ann_threshold: int = pdt.Field(
+        default=20_000, alias="COPILOT_LOCAL_VECTOR_STORE_ANN_THRESHOLD"
+    )
+    local_vector_store_n_probe: int = pdt.Field(
+        default=16, alias="COPILOT_LOCAL_VECTOR_STORE_N_PROBE"
+    )
+    retrieval_mode: t.Literal["vector", "hybrid"] = pdt.Field(
+        default="hybrid", alias="COPILOT_RETRIEVAL_MODE"
+    )
+    retrieval_top_k: int = pdt.Field(default=3, alias="COPILOT_RETRIEVAL_TOP_K")
+    retrieval_candidates: int = pdt.Field(
+        default=20, alias="COPILOT_RETRIEVAL_CANDIDATES"
+    )
+    retrieval_alpha: float = pdt.Field(default=0.5, alias="COPILOT_RETRIEVAL_ALPHA")
+    retrieval_rerank: bool = pdt.Field(default=True, alias="COPILOT_RETRIEVAL_RERANK")
+    retrieval_context_max_tokens: int = pdt.Field(
+        default=3000, alias="COPILOT_RETRIEVAL_CONTEXT_MAX_TOKENS"
+    )
+    openai_base_url: str | None = pdt.Field(
+        default=None, alias="COPILOT_OPENAI_BASE_URL"
+    )
+    http_max_connections: int = pdt.Field(
+        default=100, alias="COPILOT_HTTP_MAX_CONNECTIONS"
+    )
+    http_max_keepalive_connections: int = pdt.Field(
+        default=20, alias="COPILOT_HTTP_MAX_KEEPALIVE_CONNECTIONS"
+    )
+    http_keepalive_expiry: float = pdt.Field(
+        default=30.0, alias="COPILOT_HTTP_KEEPALIVE_EXPIRY"
+    )
+    http_timeout: float = pdt.Field(default=600.0, alias="COPILOT_HTTP_TIMEOUT")
+    pinecone_pool_threads: int = pdt.Field(
+        default=4, alias="COPILOT_PINECONE_POOL_THREADS"
+    )
+    file_metadata_cache_ttl: float = pdt.Field(
+        default=3600.0, alias="COPILOT_FILE_METADATA_CACHE_TTL"
+    )
+    file_retrieve_concurrency: int = pdt.Field(
+        default=8, alias="COPILOT_FILE_RETRIEVE_CONCURRENCY"
+    )
+    thread_max_messages: int = pdt.Field(
+        default=50, alias="COPILOT_THREAD_MAX_MESSAGES"
+    )
+    thread_max_prompt_tokens: int = pdt.Field(
+        default=32_000, alias="COPILOT_THREAD_MAX_PROMPT_TOKENS"
+    )
+    thread_summary_model: str | None = pdt.Field(
+        default="gpt-4o-mini", alias="COPILOT_THREAD_SUMMARY_MODEL"
+    )
+    stream_flush_interval: float = pdt.Field(
+        default=0.04, alias="COPILOT_STREAM_FLUSH_INTERVAL"
+    )
+    stream_flush_chars: int = pdt.Field(default=200, alias="COPILOT_STREAM_FLUSH_CHARS")
+    tool_max_workers: int = pdt.Field(default=8, alias="COPILOT_TOOL_MAX_WORKERS")
+    tool_timeout: float = pdt.Field(default=300.0, alias="COPILOT_TOOL_TIMEOUT")
+    tool_timeouts: dict[str, float] = pdt.Field(
+        default_factory=dict, alias="COPILOT_TOOL_TIMEOUTS"
+    )
+    tool_concurrency_limits: dict[str, int] = pdt.Field(
+        default_factory=dict, alias="COPILOT_TOOL_CONCURRENCY_LIMITS"
+    )
+    parse_cache_max_bytes: int = pdt.Field(
+        default=1 << 30, alias="COPILOT_PARSE_CACHE_MAX_BYTES"
+    )
+    embed_batch_size: int = pdt.Field(default=100, alias="COPILOT_EMBED_BATCH_SIZE")
+    embed_max_concurrency: int = pdt.Field(
+        default=4, alias="COPILOT_EMBED_MAX_CONCURRENCY"
+    )
+    upsert_batch_size: int = pdt.Field(default=100, alias="COPILOT_UPSERT_BATCH_SIZE")
+    upsert_max_concurrency: int = pdt.Field(
+        default=4, alias="COPILOT_UPSERT_MAX_CONCURRENCY"
+    )
+    upsert_max_retries: int = pdt.Field(default=3, alias="COPILOT_UPSERT_MAX_RETRIES")
+    upsert_retry_backoff: float = pdt.Field(
+        default=0.5, alias="COPILOT_UPSERT_RETRY_BACKOFF"
+    )
+    ingestion_workers: int = pdt.Field(default=2, alias="COPILOT_INGESTION_WORKERS")
+    ingestion_wait_timeout: float = pdt.Field(
+        default=10.0, alias="COPILOT_INGESTION_WAIT_TIMEOUT"
+    )
+    dataframe_cache_max_bytes: int = pdt.Field(
+        default=2 << 30, alias="COPILOT_DATAFRAME_CACHE_MAX_BYTES"
+    )
+    csv_memory_budget: int = pdt.Field(
+        default=1 << 30, alias="COPILOT_CSV_MEMORY_BUDGET"
+    )
+    csv_context_max_tokens: int = pdt.Field(
+        default=1000, alias="COPILOT_CSV_CONTEXT_MAX_TOKENS"
+    )
+    answer_cache_max_entries: int = pdt.Field(
+        default=1024, alias="COPILOT_ANSWER_CACHE_MAX_ENTRIES"
+    )
+    answer_cache_ttl: float = pdt.Field(
+        default=3600.0, alias="COPILOT_ANSWER_CACHE_TTL"
+    )
+    answer_cache_similarity_threshold: float = pdt.Field(
+        default=0.95, alias="COPILOT_ANSWER_CACHE_SIMILARITY_THRESHOLD"
+    )
+    tracing_enabled: bool = pdt.Field(default=False, alias="COPILOT_TRACING_ENABLED")
+
+
+@functools.cache
+def get_settings() -> CopilotSettings:
+    """Return the process-wide settings, reading `.env` only once."""
+    return CopilotSettings()  # type: ignore
@@ -0,0 +1,291 @@
+"""Spans timing the stages of chat turns and ingestion jobs.
+
+Nothing measured where the time of a turn went: waiting for the thread, the
+run, the first token, tool calls or submitting their outputs. Stages are
+wrapped in spans, which follow the OpenTelemetry model: spans of a trace share
+a 128-bit trace ID, have a 64-bit span ID and the ID of their parent, start and
+end timestamps in nanoseconds, attributes, events and a status.
+
+Tracing is off by default, and spans then cost next to nothing. When it is on,
+the spans of a trace are exported together once its root span ends, to a
+`LocalSpanExporter` that appends one JSON line per trace. `summarize_traces`
+then gives the p50 and p95 duration of every stage, also with
+`python -m copilot.tracing [path]`.
+"""
+
+import contextlib
+import contextvars
+import dataclasses
+import json
+import logging
+import secrets
+import sys
+import threading
+import time
+import typing as t
+from pathlib import Path
+
+import numpy as np
+
+from copilot import constants
+from copilot.settings import get_settings
+
+logger = logging.getLogger(__name__)
+
+
+@dataclasses.dataclass
+class Span:
+    """A timed stage, see `Tracer.start_span`.
+
+    Attributes:
+        trace_id: 32 hex digits, shared by the spans of a trace.
+        span_id: 16 hex digits.
+        parent_id: The `span_id` of the parent, `None` for the root of a trace.
+        start_time: Nanoseconds since the epoch.
+        end_time: Nanoseconds since the epoch, `None` until the span ends.
+        events: Names and times of the events that happened during the span.
+        status: "unset", "ok" or "error".
+    """
+
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: str | None = None
+    start_time: int = dataclasses.field(default_factory=time.time_ns)
+    end_time: int | None = None
+    attributes: dict[str, t.Any] = dataclasses.field(default_factory=dict)
+    events: list[tuple[str, int]] = dataclasses.field(default_factory=list)
+    status: str = "unset"
+    _tracer: "Tracer | None" = dataclasses.field(
+        default=None, repr=False, compare=False
+    )
+
+    @property
+    def is_recording(self) -> bool:
+        return self._tracer is not None and self.end_time is None
+
+    @property
+    def duration(self) -> float | None:
+        """The duration in seconds, once the span ended."""
+        if self.end_time is None:
+            return None
+        return (self.end_time - self.start_time) / 1e9
+
+    def set_attribute(self, key: str, value: t.Any) -> None:
+        if self.is_recording:
+            self.attributes[key] = value
+
+    def add_event(self, name: str) -> None:
+        if self.is_recording:
+            self.events.append((name, time.time_ns()))
+
+    def set_status(self, status: str) -> None:
+        if self.is_recording:
+            self.status = status
+
+    def end(self) -> None:
+        """End the span. Ending it again does nothing."""
+        if self.is_recording:
+            self.end_time = time.time_ns()
+            assert self._tracer is not None
+            self._tracer._on_end(self)
+
+
+# Returned by disabled tracers. It never records anything.
+NOOP_SPAN = Span(name="", trace_id="0" * 32, span_id="0" * 16)
+
+_current_span: contextvars.ContextVar[Span | None] = contextvars.ContextVar(
+    "current_span", default=None
+)
+
+
+class SpanExporter(t.Protocol):
+    def export(self, spans: t.Sequence[Span]) -> None:
+        """Export the ended spans of a trace, the root last."""
+
+
+class Tracer:
+    """Create spans and export them with `exporters` once their trace ends.
+
+    Without exporters the tracer is disabled and every span is `NOOP_SPAN`.
+    """
+
+    def __init__(self, exporters: t.Sequence[SpanExporter] = ()) -> None:
+        self.exporters = list(exporters)
+        self._traces: dict[str, list[Span]] = {}
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.exporters)
+
+    def start_span(
+        self,
+        name: str,
+        parent: Span | None = None,
+        new_trace: bool = False,
+        **attributes: t.Any,
+    ) -> Span:
+        """Start a span, which must be ended with `Span.end`.
+
+        The span is a child of `parent`, else of the current span unless
+        `new_trace` is set. It does not become the current span, see `span`.
+        """
+        if not self.enabled:
+            return NOOP_SPAN
+        if parent is None and not new_trace:
+            parent = _current_span.get()
+        if parent is NOOP_SPAN:
+            parent = None
+        span = Span(
+            name=name,
+            trace_id=parent.trace_id if parent else secrets.token_hex(16),
+            span_id=secrets.token_hex(8),
+            parent_id=parent.span_id if parent else None,
+            attributes=attributes,
+            _tracer=self,
+        )
+        if parent is None:
+            with self._lock:
+                self._traces[span.trace_id] = []
+        return span
+
+    @contextlib.contextmanager
+    def span(
+        self, name: str, new_trace: bool = False, **attributes: t.Any
+    ) -> t.Iterator[Span]:
+        """Time the block in a span, which is the current span within it.
+
+        The span's status is "error" if the block raises, else "ok" unless it
+        was set in the block.
+        """
+        span = self.start_span(name, new_trace=new_trace, **attributes)
+        if span is NOOP_SPAN:
+            yield span
+            return
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.set_status("error")
+            span.set_attribute("exception", repr(e))
+            raise
+        else:
+            if span.status == "unset":
+                span.set_status("ok")
+        finally:
+            _current_span.reset(token)
+            span.end()
+
+    def _on_end(self, span: Span) -> None:
+        with self._lock:
+            trace = self._traces.get(span.trace_id)
+            if trace is not None:
+                trace.append(span)
+            if span.parent_id is None:
+                spans = self._traces.pop(span.trace_id, [span])
+            elif trace is None:
+                # The trace was exported already, e.g. for a background task.
+                spans = [span]
+            else:
+                return
+        for exporter in self.exporters:
+            try:
+                exporter.export(spans)
+            except Exception:
+                logger.warning("Could not export spans.", exc_info=True)
+
+
+def current_span() -> Span:
+    """Return the current span, `NOOP_SPAN` if there is none."""
+    return _current_span.get() or NOOP_SPAN
+
+
+class LocalSpanExporter:
+    """Append every trace to `path` as one JSON line with its timing breakdown."""
+
+    def __init__(self, path: Path) -> None:
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    def export(self, spans: t.Sequence[Span]) -> None:
+        root = spans[-1]
+        start_time = min(span.start_time for span in spans)
+        record = {
+            "trace_id": root.trace_id,
+            "name": root.name,
+            "start_time": start_time,
+            "duration_ms": _ms(max(s.end_time or 0 for s in spans) - start_time),
+            "spans": [
+                {
+                    "name": span.name,
+                    "span_id": span.span_id,
+                    "parent_id": span.parent_id,
+                    "offset_ms": _ms(span.start_time - start_time),
+                    "duration_ms": _ms((span.end_time or 0) - span.start_time),
+                    "status": span.status,
+                    "attributes": span.attributes,
+                    "events": {
+                        name: _ms(time_ns - span.start_time)
+                        for name, time_ns in span.events
+                    },
+                }
+                for span in sorted(spans, key=lambda s: s.start_time)
+            ],
+        }
+        line = json.dumps(record, default=str) + "\n"
+        with self._lock, self.path.open("a") as f:
+            f.write(line)
+
+
+def _ms(nanoseconds: int) -> float:
+    return round(nanoseconds / 1e6, 3)
+
+
+def summarize_traces(path: Path) -> dict[str, dict[str, float]]:
+    """Return the count, p50, p95 and maximum milliseconds of every span name.
+
+    Events are summarized too, as "<span name>.<event name>", by their offset
+    in their span.
+    """
+    durations: dict[str, list[float]] = {}
+    with path.open() as f:
+        for line in f:
+            for span in json.loads(line)["spans"]:
+                durations.setdefault(span["name"], []).append(span["duration_ms"])
+                for event, offset in span["events"].items():
+                    durations.setdefault(f"{span['name']}.{event}", []).append(offset)
+    return {
+        name: {
+            "count": len(values),
+            "p50_ms": round(float(np.percentile(values, 50)), 3),
+            "p95_ms": round(float(np.percentile(values, 95)), 3),
+            "max_ms": max(values),
+        }
+        for name, values in sorted(durations.items())
+    }
+
+
+_tracer: Tracer | None = None
+
+
+def get_tracer() -> Tracer:
+    """Return the process-wide tracer, exporting to `TRACES_PATH` if enabled."""
+    global _tracer
+    if _tracer is None:
+        exporters = []
+        if get_settings().tracing_enabled:
+            exporters.append(LocalSpanExporter(constants.TRACES_PATH))
+        _tracer = Tracer(exporters)
+    return _tracer
+
+
+if __name__ == "__main__":
+    traces_path = Path(sys.argv[1]) if len(sys.argv) > 1 else constants.TRACES_PATH
+    print(f"{'span':<40} {'count':>7} {'p50 ms':>10} {'p95 ms':>10} {'max ms':>10}")
+    for span_name, stats in summarize_traces(traces_path).items():
+        print(
+            f"{span_name:<40} {stats['count']:>7} {stats['p50_ms']:>10.1f} "
+            f"{stats['p95_ms']:>10.1f} {stats['max_ms']:>10.1f}"
+        )
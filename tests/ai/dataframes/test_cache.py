@@ -0,0 +1,105 @@
+import os
+import threading
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from copilot.ai.dataframes.cache import DataFrameCache, FileKey
+
+
+@pytest.fixture
+def csv_path(tmp_path: Path) -> Path:
+    csv_path = tmp_path / "data.csv"
+    pd.DataFrame({"name": ["a", "b", "c"], "value": [1, 2, 3]}).to_csv(
+        csv_path, index=False
+    )
+    return csv_path
+
+
+def test_dataframe_is_loaded_once(tmp_path: Path, csv_path: Path, mocker):
+    read_csv = mocker.spy(pd, "read_csv")
+    cache = DataFrameCache(arrow_dir=tmp_path / "arrow")
+    df = cache.get(csv_path)
+    assert cache.get(csv_path) is df
+    assert read_csv.call_count == 1
+    assert df["value"].sum() == 6
+
+
+def test_loading_one_file_does_not_block_others(tmp_path: Path, csv_path: Path):
+    other_path = tmp_path / "other.csv"
+    pd.DataFrame({"value": [4]}).to_csv(other_path, index=False)
+    cache = DataFrameCache(arrow_dir=tmp_path / "arrow")
+    load = cache._load
+    release = threading.Event()
+    loads: list[str] = []
+
+    def slow_load(key: FileKey) -> pd.DataFrame:
+        loads.append(key.path)
+        if key.path == str(csv_path.resolve()):
+            assert release.wait(timeout=5)
+        return load(key)
+
+    cache._load = slow_load  # type: ignore[method-assign]
+    threads = [threading.Thread(target=cache.get, args=(csv_path,)) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    # Served while both threads wait on the slow file.
+    assert cache.get(other_path)["value"].sum() == 4
+    release.set()
+    for thread in threads:
+        thread.join()
+    assert loads.count(str(csv_path.resolve())) == 1
+
+
+def test_arrow_copy_is_used_after_eviction(tmp_path: Path, csv_path: Path, mocker):
+    cache = DataFrameCache(arrow_dir=tmp_path / "arrow")
+    expected = cache.get(csv_path)
+    assert cache.arrow_path(FileKey.from_path(csv_path)).exists()
+    read_csv = mocker.spy(pd, "read_csv")
+    df = DataFrameCache(arrow_dir=tmp_path / "arrow").get(csv_path)
+    pd.testing.assert_frame_equal(df, expected)
+    read_csv.assert_not_called()
+
+
+def test_modified_file_is_reloaded(tmp_path: Path, csv_path: Path):
+    cache = DataFrameCache(arrow_dir=tmp_path / "arrow")
+    cache.get(csv_path)
+    old_arrow_path = cache.arrow_path(FileKey.from_path(csv_path))
+    csv_path.write_text("name,value\nd,10\n")
+    os.utime(csv_path, ns=(0, 1))
+    assert cache.get(csv_path)["value"].tolist() == [10]
+    assert not old_arrow_path.exists()
+
+
+def test_least_recently_used_dataframes_are_evicted(tmp_path: Path):
+    paths = []
+    for name in ["a", "b", "c"]:
+        paths.append(tmp_path / f"{name}.csv")
+        pd.DataFrame({"value": range(100)}).to_csv(paths[-1], index=False)
+    cache = DataFrameCache(arrow_dir=tmp_path / "arrow")
+    cache.get(paths[0])
+    cache.max_bytes = cache.total_bytes * 2
+    cache.get(paths[1])
+    cache.get(paths[0])
+    cache.get(paths[2])
+    assert paths[0] in cache and paths[2] in cache
+    assert paths[1] not in cache
+
+
+def test_query_engine_is_reused_per_model(tmp_path: Path, csv_path: Path, mocker):
+    factory = mocker.Mock(side_effect=lambda df, model: mocker.Mock())
+    cache = DataFrameCache(arrow_dir=tmp_path / "arrow")
+    engine = cache.get_query_engine(csv_path, "gpt-4o-mini", factory)
+    assert cache.get_query_engine(csv_path, "gpt-4o-mini", factory) is engine
+    assert cache.get_query_engine(csv_path, "gpt-4o", factory) is not engine
+    assert factory.call_count == 2
+
+
+def test_profile_is_computed_once(tmp_path: Path, csv_path: Path, mocker):
+    profile_dataframe = mocker.patch(
+        "copilot.ai.dataframes.cache.profile_dataframe", autospec=True
+    )
+    cache = DataFrameCache(arrow_dir=tmp_path / "arrow")
+    assert cache.get_profile(csv_path) is cache.get_profile(csv_path)
+    profile_dataframe.assert_called_once_with(cache.get(csv_path))
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+import pandas as pd
+import pytest
+
+from copilot.ai.dataframes.duckdb_engine import DuckDBQueryEngine, fits_in_memory
+
+
+@pytest.fixture
+def csv_path(tmp_path: Path) -> Path:
+    csv_path = tmp_path / "data.csv"
+    pd.DataFrame({"name": ["a", "b", "c"], "value": [1, 2, 3]}).to_csv(
+        csv_path, index=False
+    )
+    return csv_path
+
+
+def _engine(csv_path: Path, tmp_path: Path, sql: str, mocker) -> DuckDBQueryEngine:
+    llm = mocker.Mock()
+    llm.predict.return_value = sql
+    return DuckDBQueryEngine(csv_path, llm=llm, temp_directory=tmp_path / "spill")
+
+
+def test_generated_sql_runs_on_the_csv(csv_path: Path, tmp_path: Path, mocker):
+    engine = _engine(
+        csv_path, tmp_path, "```sql\nSELECT max(value) AS top FROM df\n```", mocker
+    )
+    response = engine.query("What is the largest value?")
+    assert str(response).split() == ["top", "3"]
+    prompt_kwargs = engine._llm.predict.call_args.kwargs
+    assert "value" in prompt_kwargs["schema_str"]
+    assert "BIGINT" in prompt_kwargs["schema_str"]
+
+
+@pytest.mark.asyncio
+async def test_aquery_awaits_the_llm(csv_path: Path, tmp_path: Path, mocker):
+    engine = _engine(csv_path, tmp_path, "", mocker)
+    engine._llm.apredict = mocker.AsyncMock(
+        return_value="SELECT max(value) AS top FROM df"
+    )
+    response = await engine.aquery("What is the largest value?")
+    assert str(response).split() == ["top", "3"]
+    engine._llm.predict.assert_not_called()
+
+
+def test_only_select_statements_are_run(csv_path: Path, tmp_path: Path, mocker):
+    engine = _engine(csv_path, tmp_path, "DROP VIEW df", mocker)
+    assert "error" in str(engine.query("Drop the table"))
+    engine = _engine(csv_path, tmp_path, "SELECT 1; DROP VIEW df", mocker)
+    assert "error" in str(engine.query("Drop the table"))
+
+
+def test_only_the_csv_file_can_be_read(csv_path: Path, tmp_path: Path, mocker):
+    secret = tmp_path / "secret.txt"
+    secret.write_text("password")
+    for sql in [
+        f"SELECT * FROM read_text('{secret}')",
+        f"SELECT * FROM read_csv('{secret}')",
+        "SELECT * FROM read_csv('https://example.com/data.csv')",
+    ]:
+        response = str(_engine(csv_path, tmp_path, sql, mocker).query("Read it"))
+        assert "Permission Error" in response
+        assert "password" not in response
+
+
+def test_fits_in_memory(csv_path: Path):
+    size = csv_path.stat().st_size
+    assert fits_in_memory(csv_path, memory_budget=size * 10)
+    assert not fits_in_memory(csv_path, memory_budget=size)
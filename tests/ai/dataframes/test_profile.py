@@ -0,0 +1,88 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from copilot.ai.dataframes.cache import DataFrameCache
+from copilot.ai.dataframes.profile import ProfiledPandasQueryEngine, profile_dataframe
+from copilot.ai.tokens import count_tokens
+
+
+@pytest.fixture
+def wide_df() -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {f"measurement_{i}": rng.random(50) for i in range(300)}
+        | {"city": ["Toronto", "Tokyo"] * 25}
+    )
+
+
+def test_profile_describes_columns():
+    df = pd.DataFrame({"city": ["Toronto", "Tokyo", None], "population": [3, 14, 4]})
+    rendered = profile_dataframe(df).render(max_tokens=500)
+    assert "- city: object, 2 unique, 1 nulls" in rendered
+    assert "- population: int64, 3 unique, 0 nulls, 3 to 14" in rendered
+    assert "Sample rows (CSV):\ncity,population\nToronto,3\n" in rendered
+
+
+def test_wide_tables_list_every_column_name(wide_df: pd.DataFrame):
+    rendered = profile_dataframe(wide_df).render(max_tokens=2000)
+    assert count_tokens(rendered) <= 2000
+    assert "Columns by dtype:\n- float64: measurement_0, measurement_1," in rendered
+    assert "measurement_299\n- object: city" in rendered
+
+
+def test_render_respects_token_budget(wide_df: pd.DataFrame):
+    for max_tokens in [50, 300, 1000]:
+        rendered = profile_dataframe(wide_df).render(max_tokens)
+        assert count_tokens(rendered) <= max_tokens
+
+
+def test_query_engine_records_token_counts(wide_df: pd.DataFrame, mocker):
+    llm = mocker.Mock()
+    llm.predict.return_value = "df['city'].nunique()"
+    with pd.option_context("display.max_columns", None):
+        profile = profile_dataframe(wide_df)
+    engine = ProfiledPandasQueryEngine(
+        wide_df, profile, max_context_tokens=1000, llm=llm
+    )
+    response = engine.query("How many cities are there?")
+    assert str(response) == "2"
+    assert llm.predict.call_args.kwargs["df_str"] == profile.render(1000)
+    tokens = response.metadata["table_context_tokens"]
+    assert tokens == {
+        "before": profile.head_tokens,
+        "after": count_tokens(profile.render(1000)),
+    }
+    assert tokens["after"] < tokens["before"] / 10
+
+
+@pytest.mark.asyncio
+async def test_aquery_awaits_the_llm(wide_df: pd.DataFrame, mocker):
+    llm = mocker.Mock()
+    llm.apredict = mocker.AsyncMock(return_value="df['city'].nunique()")
+    engine = ProfiledPandasQueryEngine(wide_df, profile_dataframe(wide_df), llm=llm)
+    response = await engine.aquery("How many cities are there?")
+    assert str(response) == "2"
+    assert response.metadata["pandas_instruction_str"] == "df['city'].nunique()"
+    assert "table_context_tokens" in response.metadata
+    llm.predict.assert_not_called()
+
+
+def test_pandas_code_runs_on_a_copy_of_the_cached_dataframe(tmp_path: Path, mocker):
+    csv_path = tmp_path / "data.csv"
+    pd.DataFrame({"a": [1, 2], "b": [3.0, 4.0], "s": ["x", "y"]}).to_csv(
+        csv_path, index=False
+    )
+    DataFrameCache(arrow_dir=tmp_path / "arrow").get(csv_path)
+    # Reloaded from the memory-mapped Arrow copy, whose buffers are read-only.
+    df = DataFrameCache(arrow_dir=tmp_path / "arrow").get(csv_path)
+    llm = mocker.Mock()
+    engine = ProfiledPandasQueryEngine(df, profile_dataframe(df), llm=llm)
+    llm.predict.return_value = "df.drop(columns=['s'], inplace=True)\ndf.shape[1]"
+    assert str(engine.query("Drop s")) == "2"
+    llm.predict.return_value = "df.loc[0, 'a'] = 5\ndf['a'].sum()"
+    assert str(engine.query("Set a")) == "7"
+    assert list(df.columns) == ["a", "b", "s"]
+    assert df["a"].tolist() == [1, 2]
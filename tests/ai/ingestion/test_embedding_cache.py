@@ -0,0 +1,65 @@
+from pathlib import Path
+
+import pytest
+from llama_index.core.base.embeddings.base import BaseEmbedding, Embedding
+
+from copilot.ai.ingestion.embedding_cache import (
+    CachedEmbedding,
+    EmbeddingStore,
+    hash_text,
+)
+
+
+class CountingEmbedding(BaseEmbedding):
+    embedded: list[str] = []
+
+    def _get_query_embedding(self, query: str) -> Embedding:
+        return self._get_text_embedding(query)
+
+    async def _aget_query_embedding(self, query: str) -> Embedding:
+        return self._get_text_embedding(query)
+
+    def _get_text_embedding(self, text: str) -> Embedding:
+        self.embedded.append(text)
+        return [float(len(text)), 1.0]
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> EmbeddingStore:
+    return EmbeddingStore(tmp_path / "embeddings.sqlite3")
+
+
+def test_hash_text_normalizes_whitespace():
+    assert hash_text("a  table\n header ") == hash_text("a table header")
+    assert hash_text("a table") != hash_text("another table")
+
+
+def test_texts_are_embedded_once_within_and_across_batches(store: EmbeddingStore):
+    inner = CountingEmbedding(model_name="fake", embed_batch_size=2)
+    embed_model = CachedEmbedding(inner, store=store)
+    texts = ["header", "header ", "body", "footer", "body"]
+    embeddings = embed_model.get_text_embedding_batch(texts)
+    assert embeddings[0] == embeddings[1] == [6.0, 1.0]
+    assert embeddings[2] == embeddings[4] == [4.0, 1.0]
+    assert sorted(inner.embedded) == ["body", "footer", "header"]
+
+    # A new process only finds the persisted embeddings.
+    inner.embedded.clear()
+    embed_model = CachedEmbedding(inner, store=EmbeddingStore(store.path))
+    assert embed_model.get_text_embedding_batch(["body", "new"])[0] == [4.0, 1.0]
+    assert inner.embedded == ["new"]
+
+
+@pytest.mark.asyncio
+async def test_async_embeddings_are_cached(store: EmbeddingStore):
+    inner = CountingEmbedding(model_name="fake", embed_batch_size=1)
+    embed_model = CachedEmbedding(inner, store=store, max_concurrency=2)
+    texts = ["a", "bb", "a", "ccc"]
+    assert await embed_model.aget_text_embedding_batch(texts) == [
+        [1.0, 1.0],
+        [2.0, 1.0],
+        [1.0, 1.0],
+        [3.0, 1.0],
+    ]
+    await embed_model.aget_text_embedding_batch(texts)
+    assert sorted(inner.embedded) == ["a", "bb", "ccc"]
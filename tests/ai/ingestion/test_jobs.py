@@ -0,0 +1,163 @@
+import asyncio
+import time
+import typing as t
+from pathlib import Path
+
+import pytest
+
+from copilot.ai.ingestion.jobs import IngestionWorker, JobQueue, JobStatus
+
+
+@pytest.fixture
+def queue(tmp_path: Path) -> JobQueue:
+    return JobQueue(tmp_path / "jobs.sqlite3", staging_dir=tmp_path / "staging")
+
+
+@pytest.fixture
+def upload(tmp_path: Path) -> dict[str, str]:
+    path = tmp_path / "upload.pdf"
+    path.write_bytes(b"%PDF")
+    return {"paper.pdf": str(path)}
+
+
+def test_jobs_are_staged_claimed_and_finished(queue: JobQueue, upload: dict[str, str]):
+    job = queue.enqueue(upload, uploaded_by="user:alice")
+    staged_path = Path(job.file_paths["paper.pdf"])
+    assert staged_path.read_bytes() == b"%PDF"
+    claimed = queue.claim()
+    assert claimed is not None and claimed.id == job.id
+    assert claimed.status == JobStatus.RUNNING
+    assert claimed.uploaded_by == "user:alice"
+    assert queue.claim() is None
+    assert [j.id for j in queue.unfinished([job.id])] == [job.id]
+    queue.update(job.id, JobStatus.DONE)
+    assert queue.unfinished() == []
+    assert not staged_path.exists()
+
+
+def test_wait_returns_the_unfinished_jobs(queue: JobQueue, upload: dict[str, str]):
+    other = queue.enqueue(upload)
+    job = queue.enqueue(upload)
+    queue.claim()
+    queue.update(other.id, JobStatus.DONE)
+    assert [j.id for j in queue.wait(timeout=0.05, poll_interval=0.01)] == [job.id]
+    assert queue.wait([other.id], timeout=10) == []
+
+
+@pytest.mark.asyncio
+async def test_await_jobs_returns_once_the_jobs_finish(
+    queue: JobQueue, upload: dict[str, str]
+):
+    queue.enqueue(upload)
+    job = queue.claim()
+    assert job is not None
+    loop = asyncio.get_running_loop()
+    loop.call_later(0.05, queue.update, job.id, JobStatus.DONE)
+    assert await queue.await_jobs(timeout=0.01, poll_interval=0.01) == [job]
+    assert await queue.await_jobs(timeout=10, poll_interval=0.01) == []
+
+
+def test_jobs_with_expired_leases_are_recovered(tmp_path: Path, upload: dict[str, str]):
+    queue = JobQueue(
+        tmp_path / "jobs.sqlite3", tmp_path / "staging", lease_seconds=0.05
+    )
+    other = JobQueue(
+        tmp_path / "jobs.sqlite3", tmp_path / "staging", lease_seconds=0.05
+    )
+    job = queue.enqueue(upload)
+    queue.claim()
+    assert queue.recover() == 0
+    assert other.claim() is None
+    time.sleep(0.1)
+    assert not other.renew(job.id)
+    claimed = other.claim()
+    assert claimed is not None and claimed.id == job.id
+    assert not queue.renew(job.id)
+    assert other.renew(job.id)
+    time.sleep(0.1)
+    assert queue.recover() == 1
+    assert queue.get(job.id).status == JobStatus.PENDING  # type: ignore[union-attr]
+
+
+def test_jobs_are_only_updated_under_their_lease(
+    tmp_path: Path, upload: dict[str, str]
+):
+    queue = JobQueue(
+        tmp_path / "jobs.sqlite3", tmp_path / "staging", lease_seconds=0.05
+    )
+    other = JobQueue(
+        tmp_path / "jobs.sqlite3", tmp_path / "staging", lease_seconds=0.05
+    )
+    job = queue.enqueue(upload)
+    queue.claim()
+    assert not other.update(job.id, JobStatus.DONE)
+    time.sleep(0.1)
+    other.claim()
+    # The expired lease of `queue` no longer lets it finish the job, nor delete
+    # the files that `other` ingests.
+    assert not queue.update(job.id, JobStatus.FAILED, "too late")
+    assert Path(job.file_paths["paper.pdf"]).exists()
+    assert queue.get(job.id).status == JobStatus.RUNNING  # type: ignore[union-attr]
+    assert other.update(job.id, JobStatus.DONE)
+    assert not Path(job.file_paths["paper.pdf"]).exists()
+
+
+@pytest.mark.asyncio
+async def test_worker_renews_the_leases_of_its_jobs(
+    tmp_path: Path, upload: dict[str, str]
+):
+    queue = JobQueue(
+        tmp_path / "jobs.sqlite3", tmp_path / "staging", lease_seconds=0.05
+    )
+    other = JobQueue(
+        tmp_path / "jobs.sqlite3", tmp_path / "staging", lease_seconds=0.05
+    )
+
+    async def ingest(
+        file_paths: dict[str, str],
+        report: t.Callable[[str], t.Awaitable[None]],
+        uploaded_by: str | None,
+    ) -> None:
+        await asyncio.sleep(0.2)
+        assert other.claim() is None
+
+    worker = IngestionWorker(queue, ingest, concurrency=1, poll_interval=0.01)
+    job = queue.enqueue(upload)
+    worker.notify()
+    while queue.unfinished():
+        await asyncio.sleep(0.01)
+    await worker.stop()
+    assert queue.get(job.id).status == JobStatus.DONE  # type: ignore[union-attr]
+
+
+@pytest.mark.asyncio
+async def test_worker_runs_jobs_concurrently(queue: JobQueue, upload: dict[str, str]):
+    running = 0
+    max_running = 0
+
+    async def ingest(
+        file_paths: dict[str, str],
+        report: t.Callable[[str], t.Awaitable[None]],
+        uploaded_by: str | None,
+    ) -> None:
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await report("working")
+        await asyncio.sleep(0.05)
+        running -= 1
+        if "broken.pdf" in file_paths:
+            raise ValueError("broken")
+
+    worker = IngestionWorker(queue, ingest, concurrency=2, poll_interval=0.01)
+    jobs = [queue.enqueue(upload) for _ in range(3)]
+    broken = queue.enqueue({"broken.pdf": upload["paper.pdf"]})
+    worker.notify()
+    while queue.unfinished():
+        await asyncio.sleep(0.01)
+    await worker.stop()
+    assert max_running == 2
+    assert {queue.get(job.id).status for job in jobs} == {JobStatus.DONE}  # type: ignore[union-attr]
+    failed = queue.get(broken.id)
+    assert failed is not None and failed.status == JobStatus.FAILED
+    assert "broken" in failed.detail
@@ -0,0 +1,91 @@
+import dataclasses
+import json
+from pathlib import Path
+
+import pytest
+
+from copilot.ai.ingestion.manifest import (
+    IngestionManifest,
+    ManifestEntry,
+    hash_file,
+    source_id,
+)
+from copilot.kv_store import KVStore
+
+
+@pytest.fixture
+def store_path(tmp_path: Path) -> Path:
+    return tmp_path / "kv.sqlite3"
+
+
+def _entry(content_hash: str, file_name: str = "paper.pdf") -> ManifestEntry:
+    return ManifestEntry(
+        content_hash=content_hash,
+        file_name=file_name,
+        embed_model="text-embedding-3-small",
+        node_ids=[f"{content_hash}-node"],
+        source_ids=[source_id("user:alice", file_name)],
+    )
+
+
+def test_hash_file_depends_only_on_content(tmp_path: Path):
+    (tmp_path / "a.pdf").write_bytes(b"same")
+    (tmp_path / "b.pdf").write_bytes(b"same")
+    (tmp_path / "c.pdf").write_bytes(b"other")
+    assert hash_file(tmp_path / "a.pdf") == hash_file(tmp_path / "b.pdf")
+    assert hash_file(tmp_path / "a.pdf") != hash_file(tmp_path / "c.pdf")
+
+
+def test_entries_survive_a_reload(store_path: Path):
+    manifest = IngestionManifest(KVStore(store_path))
+    manifest.put(_entry("v1"))
+    manifest.put(_entry("v2"))
+    manifest.remove("v1")
+    reloaded = IngestionManifest(KVStore(store_path))
+    assert "v1" not in reloaded
+    assert reloaded.get("v2") == manifest.get("v2")
+    assert reloaded.get_by_source("user:alice/paper.pdf") == manifest.get("v2")
+
+
+def test_entries_of_other_processes_are_seen(store_path: Path):
+    manifest = IngestionManifest(KVStore(store_path))
+    assert manifest.get("v1") is None
+    assert manifest.version == 0
+    entry = _entry("v1")
+    IngestionManifest(KVStore(store_path)).put(entry)
+    assert manifest.get("v1") == entry
+    assert len(manifest) == 1
+    assert manifest.version == 1
+
+
+def test_legacy_log_is_imported_once(store_path: Path, tmp_path: Path):
+    log_path = tmp_path / "manifest.jsonl"
+    records = [
+        dataclasses.asdict(_entry("v1")),
+        dataclasses.asdict(_entry("v2", file_name="other.pdf")),
+        {"content_hash": "v1", "deleted": True},
+    ]
+    log_path.write_text("".join(json.dumps(r) + "\n" for r in records))
+    manifest = IngestionManifest(KVStore(store_path), legacy_log_path=log_path)
+    assert "v1" not in manifest
+    assert manifest.get_by_source("user:alice/other.pdf") == manifest.get("v2")
+    assert not log_path.exists()
+
+
+def test_contents_are_replaced_per_source(store_path: Path):
+    manifest = IngestionManifest(KVStore(store_path))
+    alice, bob = source_id("user:alice", "report.pdf"), source_id(
+        "user:bob", "report.pdf"
+    )
+    for content_hash in ["v1", "v2", "v3"]:
+        manifest.put(dataclasses.replace(_entry(content_hash), source_ids=[]))
+    assert manifest.attach_source(alice, "v1") is None
+    assert manifest.attach_source(bob, "v1") is None
+    assert manifest.attach_source(bob, "v2") is None
+    assert manifest.get("v1").source_ids == [alice]  # type: ignore[union-attr]
+    replaced = manifest.attach_source(alice, "v3")
+    assert replaced is not None and replaced.content_hash == "v1"
+    assert "v1" not in manifest
+    assert manifest.get_by_source(alice) == manifest.get("v3")
+    assert manifest.get_by_source(bob) == manifest.get("v2")
+    assert manifest.attach_source(alice, "missing") is None
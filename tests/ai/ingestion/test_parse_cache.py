@@ -0,0 +1,30 @@
+import os
+from pathlib import Path
+
+from llama_index.core import Document
+
+from copilot.ai.ingestion.parse_cache import ParseCache
+
+
+def test_documents_round_trip(tmp_path: Path):
+    cache = ParseCache(tmp_path)
+    cache.put("abcd", [Document(text="# Title", metadata={"file_name": "a.pdf"})])
+    documents = ParseCache(tmp_path).get("abcd", {"file_name": "b.pdf"})
+    assert documents is not None
+    assert [(d.text, d.metadata) for d in documents] == [
+        ("# Title", {"file_name": "b.pdf"})
+    ]
+    assert cache.get("missing") is None
+
+
+def test_least_recently_used_entries_are_evicted(tmp_path: Path):
+    cache = ParseCache(tmp_path)
+    for content_hash in ["aa", "bb"]:
+        cache.put(content_hash, [Document(text=os.urandom(512).hex())])
+        os.utime(cache.path_for(content_hash), (0, 0))
+    cache = ParseCache(tmp_path, max_bytes=int(cache.total_bytes * 1.25))
+    cache.get("aa")
+    cache.put("cc", [Document(text=os.urandom(512).hex())])
+    assert "aa" in cache and "cc" in cache
+    assert "bb" not in cache
+    assert not cache.path_for("bb").exists()
@@ -0,0 +1,72 @@
+import threading
+import typing as t
+
+import pytest
+from llama_index.core.schema import BaseNode, TextNode
+
+from copilot.ai.ingestion.upsert import UpsertProgress, upsert_nodes
+
+
+class InMemoryIndex:
+    """Stands in for a `VectorStoreIndex` over a remote vector store."""
+
+    def __init__(self, failures: int = 0) -> None:
+        self.nodes: dict[str, BaseNode] = {}
+        self.calls = 0
+        self.failures = failures
+        self.threads: set[int] = set()
+        self._lock = threading.Lock()
+
+    def insert_nodes(self, nodes: t.Sequence[BaseNode]) -> None:
+        with self._lock:
+            self.calls += 1
+            self.threads.add(threading.get_ident())
+            if self.failures:
+                self.failures -= 1
+                raise ConnectionError("upsert failed")
+            self.nodes.update((node.node_id, node) for node in nodes)
+
+
+@pytest.fixture
+def nodes() -> list[BaseNode]:
+    return [TextNode(text=f"chunk {i}") for i in range(25)]
+
+
+@pytest.mark.asyncio
+async def test_nodes_are_upserted_in_batches_off_the_event_loop(
+    nodes: list[BaseNode],
+):
+    index = InMemoryIndex()
+    progress: list[UpsertProgress] = []
+
+    async def on_progress(p: UpsertProgress) -> None:
+        progress.append(p)
+
+    await upsert_nodes(index, nodes, batch_size=10, on_progress=on_progress)  # type: ignore
+    assert set(index.nodes) == {node.node_id for node in nodes}
+    assert index.calls == 3
+    assert threading.get_ident() not in index.threads
+    assert [p.batches_done for p in progress] == [1, 2, 3]
+    assert progress[-1] == UpsertProgress(3, 3, 25, 25)
+
+
+@pytest.mark.asyncio
+async def test_failed_batches_are_retried(nodes: list[BaseNode]):
+    index = InMemoryIndex(failures=2)
+    await upsert_nodes(index, nodes, batch_size=10, retry_backoff=0.01)  # type: ignore
+    assert len(index.nodes) == 25
+    assert index.calls == 5
+
+
+@pytest.mark.asyncio
+async def test_batches_fail_after_max_retries(nodes: list[BaseNode]):
+    index = InMemoryIndex(failures=10)
+    with pytest.raises(ConnectionError):
+        await upsert_nodes(
+            index,  # type: ignore
+            nodes,
+            batch_size=25,
+            max_retries=2,
+            retry_backoff=0.01,
+        )
+    assert index.calls == 3
@@ -0,0 +1,121 @@
+import asyncio
+from unittest.mock import MagicMock
+
+import openai
+import pytest
+from openai.types import FileObject
+from openai.types.beta.threads import FileCitationAnnotation, Text
+from openai.types.beta.threads.file_citation_annotation import FileCitation
+
+from copilot.ai.openai_.citations import (
+    FileMetadataCache,
+    cited_file_ids,
+    replace_annotations,
+)
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def _text(value: str, citations: list[tuple[str, str]]) -> Text:
+    annotations = []
+    for marker, file_id in citations:
+        start = value.index(marker)
+        annotations.append(
+            FileCitationAnnotation(
+                type="file_citation",
+                text=marker,
+                start_index=start,
+                end_index=start + len(marker),
+                file_citation=FileCitation(file_id=file_id),
+            )
+        )
+    return Text(value=value, annotations=annotations)
+
+
+def _file(file_id: str) -> FileObject:
+    return FileObject(
+        id=file_id,
+        bytes=1,
+        created_at=0,
+        filename=f"{file_id}.pdf",
+        object="file",
+        purpose="assistants",
+        status="processed",
+    )
+
+
+def _client(delay: float = 0.0, missing: frozenset[str] = frozenset()) -> MagicMock:
+    client = MagicMock()
+    client.calls = []
+
+    async def retrieve(file_id: str) -> FileObject:
+        client.calls.append(file_id)
+        await asyncio.sleep(delay)
+        if file_id in missing:
+            raise openai.NotFoundError(
+                "missing", response=MagicMock(status_code=404), body=None
+            )
+        return _file(file_id)
+
+    client.files.retrieve = retrieve
+    return client
+
+
+def test_annotations_are_replaced_by_their_index():
+    text = _text(
+        "Drift【4:0†a.pdf】 and bias【4:1†b.pdf】, again【4:0†a.pdf】.",
+        [("【4:0†a.pdf】", "file-a"), ("【4:1†b.pdf】", "file-b")],
+    )
+    # A second citation of the same marker at a later offset.
+    second = text.value.rindex("【4:0†a.pdf】")
+    text.annotations.append(
+        text.annotations[0].model_copy(
+            update={"start_index": second, "end_index": second + 11}
+        )
+    )
+    assert replace_annotations(text) == "Drift[0] and bias[1], again[2]."
+    assert cited_file_ids(text) == ["file-a", "file-b"]
+
+
+@pytest.mark.asyncio
+async def test_files_are_retrieved_concurrently_and_once():
+    client = _client(delay=0.1)
+    cache = FileMetadataCache(max_concurrency=4)
+    start = asyncio.get_running_loop().time()
+    files, again = await asyncio.gather(
+        cache.retrieve_many(client, ["a", "b", "c", "d"]),
+        cache.retrieve_many(client, ["a", "b"]),
+    )
+    assert asyncio.get_running_loop().time() - start < 0.2
+    assert [f.id for f in files] == ["a", "b", "c", "d"]
+    assert [f.id for f in again] == ["a", "b"]
+    assert sorted(client.calls) == ["a", "b", "c", "d"]
+
+
+@pytest.mark.asyncio
+async def test_cached_files_expire():
+    client = _client()
+    clock = Clock()
+    cache = FileMetadataCache(ttl=10, clock=clock)
+    await cache.retrieve_many(client, ["a"])
+    await cache.retrieve_many(client, ["a"])
+    assert client.calls == ["a"]
+    clock.now = 10
+    await cache.retrieve_many(client, ["a"])
+    assert client.calls == ["a", "a"]
+
+
+@pytest.mark.asyncio
+async def test_failed_files_are_skipped_and_not_cached():
+    client = _client(missing=frozenset({"b"}))
+    cache = FileMetadataCache()
+    files = await cache.retrieve_many(client, ["a", "b"])
+    assert [f.id for f in files] == ["a"]
+    await cache.retrieve_many(client, ["b"])
+    assert client.calls == ["a", "b", "b"]
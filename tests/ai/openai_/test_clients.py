@@ -0,0 +1,81 @@
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import openai
+import pytest
+from pytest_mock import MockerFixture
+
+from copilot import constants
+from copilot.ai.openai_ import clients
+from copilot.kv_store import KVStore
+
+
+@pytest.fixture(autouse=True)
+def persistence_path(mocker: MockerFixture, tmp_path: Path) -> Path:
+    path = tmp_path / "settings.json"
+    mocker.patch.object(constants, "PERSISTENCE_SETTINGS_PATH", path)
+    store = KVStore(tmp_path / "kv.sqlite3")
+    mocker.patch.object(clients, "get_kv_store", return_value=store)
+    mocker.patch.dict(clients._assistant_ids, clear=True)
+    return path
+
+
+@pytest.fixture
+def client() -> MagicMock:
+    client = MagicMock()
+    client.beta.assistants.create = AsyncMock(return_value=MagicMock(id="asst_1"))
+    client.beta.assistants.update = AsyncMock()
+    client.beta.assistants.retrieve = AsyncMock()
+    return client
+
+
+@pytest.mark.asyncio
+async def test_assistant_is_created_once_and_persisted(client: MagicMock):
+    assert await clients.get_or_create_assistant_id(client, "gpt-4o") == "asst_1"
+    # Simulate a restart: only the persisted ID is left.
+    clients._assistant_ids.clear()
+    assert await clients.get_or_create_assistant_id(client, "gpt-4o") == "asst_1"
+    client.beta.assistants.create.assert_awaited_once()
+    client.beta.assistants.update.assert_not_awaited()
+    client.beta.assistants.retrieve.assert_awaited_once_with("asst_1")
+
+
+@pytest.mark.asyncio
+async def test_assistant_is_updated_when_its_parameters_change(
+    client: MagicMock, mocker: MockerFixture
+):
+    await clients.get_or_create_assistant_id(client, "gpt-4o")
+    mocker.patch.object(clients, "ASSISTANT_INSTRUCTIONS", "Be brief.")
+    assert await clients.get_or_create_assistant_id(client, "gpt-4o") == "asst_1"
+    client.beta.assistants.create.assert_awaited_once()
+    client.beta.assistants.update.assert_awaited_once()
+    assert client.beta.assistants.update.await_args.kwargs["instructions"] == (
+        "Be brief."
+    )
+
+
+@pytest.mark.asyncio
+async def test_deleted_assistant_is_recreated(client: MagicMock, mocker: MockerFixture):
+    await clients.get_or_create_assistant_id(client, "gpt-4o")
+    mocker.patch.object(clients, "ASSISTANT_INSTRUCTIONS", "Be brief.")
+    client.beta.assistants.update.side_effect = openai.NotFoundError(
+        "gone", response=MagicMock(), body=None
+    )
+    client.beta.assistants.create.return_value = MagicMock(id="asst_2")
+    assert await clients.get_or_create_assistant_id(client, "gpt-4o") == "asst_2"
+
+
+@pytest.mark.asyncio
+async def test_persisted_assistant_deleted_since_is_recreated(client: MagicMock):
+    await clients.get_or_create_assistant_id(client, "gpt-4o")
+    clients._assistant_ids.clear()
+    client.beta.assistants.retrieve.side_effect = openai.NotFoundError(
+        "gone", response=MagicMock(), body=None
+    )
+    client.beta.assistants.create.return_value = MagicMock(id="asst_2")
+    assert await clients.get_or_create_assistant_id(client, "gpt-4o") == "asst_2"
+    # The new ID is persisted, so the next process doesn't recreate it again.
+    clients._assistant_ids.clear()
+    client.beta.assistants.retrieve.side_effect = None
+    assert await clients.get_or_create_assistant_id(client, "gpt-4o") == "asst_2"
+    assert client.beta.assistants.create.await_count == 2
@@ -2,10 +2,16 @@ import typing as t
 
 import pytest
 
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.required_action_function_tool_call import Function
+
 from copilot.ai.openai_.function_calling import (
     AssistantToolMetadata,
+    compile_tool,
+    execute_tool,
     get_assistant_tool_metadata,
 )
+from copilot.ai.tools import TOOL_REGISTRY
 
 
 def get_current_temperature(
@@ -19,6 +25,13 @@ def get_current_temperature(
     return 0.0
 
 
+async def get_wind_speed(
+    location: t.Annotated[str, "The city and state, e.g., San Francisco, CA"],
+) -> float:
+    """Get the current wind speed for a specific location."""
+    return 5.0
+
+
 def get_rain_probability(
     location: t.Annotated[str, "The city and state, e.g., San Francisco, CA"],
 ) -> float:
@@ -82,3 +95,58 @@ def test_get_assistant_tool_metadata(
     assert (
         get_assistant_tool_metadata(function).as_openai_tool_spec() == expected_metadata
     )
+
+
+def test_compile_tool_is_memoized():
+    compiled = compile_tool(get_current_temperature)
+    assert compile_tool(get_current_temperature) is compiled
+    assert compiled.spec == compiled.metadata.as_openai_tool_spec()
+
+
+@pytest.mark.parametrize(
+    "kwargs, expected_error",
+    [
+        ({"location": "Paris", "unit": "Celsius"}, None),
+        ({"location": "Paris"}, "missing some required parameters: unit"),
+        ({"location": "Paris", "unit": "Kelvin"}, "unit='Kelvin' does not match"),
+        ({"location": 3, "unit": "Celsius"}, "location=3 does not match"),
+        (
+            {"location": "Paris", "unit": "Celsius", "days": 3},
+            "unexpected parameters: days",
+        ),
+    ],
+)
+def test_argument_validator(kwargs: dict[str, t.Any], expected_error: str | None):
+    error = compile_tool(get_current_temperature).validator.validate(kwargs)
+    if expected_error is None:
+        assert error is None
+    else:
+        assert error is not None and expected_error in error
+
+
+def test_execute_tool_dispatches_registered_tool(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setitem(
+        TOOL_REGISTRY, get_rain_probability.__name__, get_rain_probability
+    )
+    tool_call = RequiredActionFunctionToolCall(
+        id="call_1",
+        type="function",
+        function=Function(
+            name="get_rain_probability", arguments='{"location": "Paris"}'
+        ),
+    )
+    assert execute_tool(tool_call) == {"output": "0.0", "tool_call_id": "call_1"}
+
+
+def test_execute_tool_runs_async_tools(monkeypatch: pytest.MonkeyPatch):
+    monkeypatch.setitem(TOOL_REGISTRY, get_wind_speed.__name__, get_wind_speed)
+    assert (
+        get_assistant_tool_metadata(get_wind_speed).description
+        == "Get the current wind speed for a specific location."
+    )
+    tool_call = RequiredActionFunctionToolCall(
+        id="call_1",
+        type="function",
+        function=Function(name="get_wind_speed", arguments='{"location": "Paris"}'),
+    )
+    assert execute_tool(tool_call) == {"output": "5.0", "tool_call_id": "call_1"}
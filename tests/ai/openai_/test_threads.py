@@ -0,0 +1,132 @@
+import asyncio
+import gc
+import itertools
+import typing as t
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import openai
+import pytest
+from openai.types.beta.threads import Run
+
+from copilot.ai.openai_.threads import ThreadManager, thread_owner
+from copilot.kv_store import KVStore
+
+
+def _message(role: str, text: str) -> MagicMock:
+    block = MagicMock(type="text")
+    block.text.value = text
+    return MagicMock(role=role, content=[block])
+
+
+@pytest.fixture
+def client() -> MagicMock:
+    client = MagicMock()
+    ids = itertools.count(1)
+    client.beta.threads.create = AsyncMock(
+        side_effect=lambda messages: MagicMock(id=f"thread_{next(ids)}")
+    )
+
+    async def list_messages(thread_id: str, order: str) -> t.AsyncIterator[MagicMock]:
+        for message in [_message("assistant", "It is 42."), _message("user", "Why?")]:
+            yield message
+
+    client.beta.threads.messages.list = list_messages
+    completion = MagicMock()
+    completion.choices[0].message.content = "The user asked why."
+    client.chat.completions.create = AsyncMock(return_value=completion)
+    return client
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> KVStore:
+    return KVStore(tmp_path / "kv.sqlite3")
+
+
+def _run(prompt_tokens: int) -> Run:
+    return MagicMock(spec=Run, usage=MagicMock(prompt_tokens=prompt_tokens))
+
+
+@pytest.mark.asyncio
+async def test_each_owner_has_its_own_thread(client: MagicMock, store: KVStore):
+    threads = ThreadManager(store)
+    alice = await threads.get_thread_id(client, thread_owner("alice", "s1"))
+    session = await threads.get_thread_id(client, thread_owner(None, "s2"))
+    assert alice != session
+    assert await threads.get_thread_id(client, "user:alice") == alice
+    # The index is persisted.
+    assert await ThreadManager(store).get_thread_id(client, "user:alice") == alice
+
+
+@pytest.mark.asyncio
+async def test_thread_is_rolled_over_with_a_summary(client: MagicMock, store: KVStore):
+    threads = ThreadManager(store, max_messages=4)
+    first = await threads.get_thread_id(client, "user:alice")
+    threads.record_run("user:alice", first, _run(100))
+    assert await threads.get_thread_id(client, "user:alice") == first
+    threads.record_run("user:alice", first, _run(200))
+    second = await threads.get_thread_id(client, "user:alice")
+    assert second != first
+    seed = client.beta.threads.create.await_args.kwargs["messages"]
+    assert seed == [
+        {
+            "role": "assistant",
+            "content": "Summary of our conversation so far:\nThe user asked why.",
+        }
+    ]
+    prompt = client.chat.completions.create.await_args.kwargs["messages"][1]
+    assert prompt["content"] == "user: Why?\n\nassistant: It is 42."
+    record = threads.get("user:alice")
+    assert record.previous_thread_ids == [first]
+    assert record.messages == 1 and record.prompt_tokens == 0
+
+
+@pytest.mark.asyncio
+async def test_concurrent_turns_roll_over_once(client: MagicMock, store: KVStore):
+    threads = ThreadManager(store, max_messages=2)
+    first = await threads.get_thread_id(client, "user:alice")
+    threads.record_run("user:alice", first, _run(100))
+    completion = client.chat.completions.create.return_value
+
+    async def summarize(**kwargs: t.Any) -> MagicMock:
+        await asyncio.sleep(0.01)
+        return completion
+
+    client.chat.completions.create.side_effect = summarize
+    thread_ids = await asyncio.gather(
+        *(threads.get_thread_id(client, "user:alice") for _ in range(3))
+    )
+    assert len(set(thread_ids)) == 1 and thread_ids[0] != first
+    assert client.beta.threads.create.await_count == 2
+    client.chat.completions.create.assert_awaited_once()
+
+    async with threads.lock(thread_ids[0]):
+        assert len(threads._locks) == 1
+    gc.collect()
+    assert len(threads._locks) == len(threads._owner_locks) == 0
+
+
+@pytest.mark.asyncio
+async def test_thread_is_rolled_over_by_prompt_tokens(
+    client: MagicMock, store: KVStore
+):
+    client.chat.completions.create.side_effect = openai.APIConnectionError(
+        request=MagicMock()
+    )
+    threads = ThreadManager(store, max_prompt_tokens=1000)
+    first = await threads.get_thread_id(client, "user:alice")
+    threads.record_run("user:alice", first, _run(1500))
+    second = await threads.get_thread_id(client, "user:alice")
+    assert second != first
+    # Without a summary, the new thread starts empty.
+    assert client.beta.threads.create.await_args.kwargs["messages"] == []
+
+
+@pytest.mark.asyncio
+async def test_runs_of_rolled_over_threads_are_ignored(
+    client: MagicMock, store: KVStore
+):
+    threads = ThreadManager(store, summary_model=None)
+    await threads.get_thread_id(client, "user:alice")
+    threads.record_run("user:alice", "thread_old", _run(50_000))
+    assert threads.get("user:alice").prompt_tokens == 0
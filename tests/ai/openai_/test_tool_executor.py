@@ -0,0 +1,175 @@
+import asyncio
+import json
+import time
+import typing as t
+
+import pytest
+from llama_index.core.base.response.schema import StreamingResponse
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.required_action_function_tool_call import Function
+
+from copilot.ai.answer_cache import AnswerCache
+from copilot.ai.openai_.tool_executor import ToolExecutor
+from copilot.ai.tools import TOOL_REGISTRY
+from copilot.ai.tools.progress import report_progress, stream_response
+from copilot.tracing import Span, Tracer
+
+
+def slow_tool(
+    seconds: t.Annotated[float, "How long to sleep."],
+) -> str:
+    """Sleep in a worker thread."""
+    time.sleep(seconds)
+    return f"slept {seconds}"
+
+
+async def async_tool(
+    seconds: t.Annotated[float, "How long to sleep."],
+) -> str:
+    """Sleep on the event loop."""
+    await asyncio.sleep(seconds)
+    return f"awaited {seconds}"
+
+
+def streaming_tool(
+    words: t.Annotated[str, "The words to stream."],
+) -> str:
+    """Stream an answer word by word from a worker thread."""
+    report_progress("Thinking.\n")
+    response = StreamingResponse(response_gen=(f"{w} " for w in words.split()))
+    return stream_response(response)
+
+
+def _tool_call(
+    call_id: str, name: str, **kwargs: t.Any
+) -> RequiredActionFunctionToolCall:
+    return RequiredActionFunctionToolCall(
+        id=call_id,
+        type="function",
+        function=Function(name=name, arguments=json.dumps(kwargs)),
+    )
+
+
+@pytest.fixture(autouse=True)
+def register_tools(monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(TOOL_REGISTRY, slow_tool.__name__, slow_tool)
+    monkeypatch.setitem(TOOL_REGISTRY, async_tool.__name__, async_tool)
+    monkeypatch.setitem(TOOL_REGISTRY, streaming_tool.__name__, streaming_tool)
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_run_concurrently_and_keep_their_ids():
+    executor = ToolExecutor(max_workers=4)
+    tool_calls = [
+        _tool_call("call_1", "slow_tool", seconds=0.2),
+        _tool_call("call_2", "async_tool", seconds=0.2),
+        _tool_call("call_3", "slow_tool", seconds=0.2),
+    ]
+    start = time.perf_counter()
+    outputs = await executor.execute_tools(tool_calls)
+    assert time.perf_counter() - start < 0.5
+    assert outputs == [
+        {"output": "slept 0.2", "tool_call_id": "call_1"},
+        {"output": "awaited 0.2", "tool_call_id": "call_2"},
+        {"output": "slept 0.2", "tool_call_id": "call_3"},
+    ]
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_concurrency_limit_serializes_calls_of_a_tool():
+    executor = ToolExecutor(max_workers=4, concurrency_limits={"slow_tool": 1})
+    start = time.perf_counter()
+    await executor.execute_tools(
+        [_tool_call(f"call_{i}", "slow_tool", seconds=0.1) for i in range(3)]
+    )
+    assert time.perf_counter() - start >= 0.3
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_timeout_is_reported_to_the_assistant():
+    executor = ToolExecutor(timeouts={"async_tool": 0.05})
+    output = await executor.execute_tool(_tool_call("call_1", "async_tool", seconds=1))
+    assert output == {
+        "output": "Tool async_tool timed out after 0.05 seconds.",
+        "tool_call_id": "call_1",
+    }
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_invalid_tool_call_is_reported_to_the_assistant():
+    executor = ToolExecutor()
+    output = await executor.execute_tool(_tool_call("call_1", "missing_tool"))
+    assert "not found in tool registry" in output["output"]
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_only_successful_answers_are_cached():
+    answer_cache = AnswerCache({"async_tool": lambda seconds: "v1"})
+    executor = ToolExecutor(timeouts={"async_tool": 0.05}, answer_cache=answer_cache)
+    await executor.execute_tool(_tool_call("call_1", "async_tool", seconds=1))
+    assert len(answer_cache) == 0
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_progress_is_streamed_while_tools_run():
+    progress: list[tuple[str, str]] = []
+
+    async def on_progress(tool_call_id: str, text: str) -> None:
+        progress.append((tool_call_id, text))
+
+    executor = ToolExecutor()
+    outputs = await executor.execute_tools(
+        [
+            _tool_call("call_1", "streaming_tool", words="one two three"),
+            _tool_call("call_2", "streaming_tool", words="four"),
+        ],
+        on_progress=on_progress,
+    )
+    assert [o["output"] for o in outputs] == ["one two three ", "four "]
+    assert [text for call_id, text in progress if call_id == "call_1"] == [
+        "Thinking.\n",
+        "one ",
+        "two ",
+        "three ",
+    ]
+    assert [text for call_id, text in progress if call_id == "call_2"] == [
+        "Thinking.\n",
+        "four ",
+    ]
+    # Without a handler, tools run the same.
+    output = await executor.execute_tool(
+        _tool_call("call_3", "streaming_tool", words="five")
+    )
+    assert output["output"] == "five "
+    executor.shutdown()
+
+
+@pytest.mark.asyncio
+async def test_tool_calls_are_traced():
+    spans: list[Span] = []
+
+    class Exporter:
+        def export(self, trace: t.Sequence[Span]) -> None:
+            spans.extend(trace)
+
+    tracer = Tracer([Exporter()])
+    executor = ToolExecutor(timeouts={"async_tool": 0.05}, tracer=tracer)
+    with tracer.span("tool_calls"):
+        await executor.execute_tools(
+            [
+                _tool_call("call_1", "slow_tool", seconds=0.01),
+                _tool_call("call_2", "async_tool", seconds=1),
+            ]
+        )
+    by_name = {span.name: span for span in spans}
+    assert by_name["tool slow_tool"].status == "ok"
+    assert by_name["tool slow_tool"].attributes == {"tool_call_id": "call_1"}
+    assert by_name["tool async_tool"].status == "error"
+    assert by_name["tool async_tool"].attributes["timeout"] == 0.05
+    assert by_name["tool async_tool"].parent_id == by_name["tool_calls"].span_id
+    executor.shutdown()
@@ -0,0 +1,61 @@
+import logging
+
+import pytest
+from llama_index.core.schema import MetadataMode, NodeWithScore, TextNode
+
+from copilot.ai.retrieval.context_budget import TokenBudgetPostprocessor
+from copilot.ai.tokens import count_tokens
+
+TABLE_SUMMARY = "Quarterly revenue by region."
+TABLE = TABLE_SUMMARY + "\n" + "\n".join(f"| Q{i} | {i * 1000} |" for i in range(300))
+
+
+def _nodes(*texts: str, **metadata: str) -> list[NodeWithScore]:
+    return [
+        NodeWithScore(
+            node=TextNode(id_=str(i), text=text, metadata=metadata), score=1 - i / 10
+        )
+        for i, text in enumerate(texts)
+    ]
+
+
+def _texts(nodes: list[NodeWithScore]) -> list[str]:
+    return [n.node.get_content(MetadataMode.NONE) for n in nodes]
+
+
+def test_overlapping_nodes_are_deduplicated():
+    nodes = _nodes(
+        "The pump is rated for 12 Nm. It runs at 3000 rpm.",
+        "It runs at 3000 rpm. The pump is rated for 12 Nm.",
+        "The valve is made of brass. It runs at 3000 rpm.",
+    )
+    packed = TokenBudgetPostprocessor().postprocess_nodes(nodes)
+    assert _texts(packed) == _texts([nodes[0], nodes[2]])
+
+
+def test_tables_over_budget_are_replaced_by_their_summary():
+    nodes = _nodes("The pump is rated for 12 Nm.")
+    table = TextNode(id_="table", text=TABLE, metadata={"table_summary": TABLE_SUMMARY})
+    nodes.append(NodeWithScore(node=table, score=0.5))
+    packed = TokenBudgetPostprocessor(max_tokens=200).postprocess_nodes(nodes)
+    assert _texts(packed) == ["The pump is rated for 12 Nm.", TABLE_SUMMARY]
+    assert packed[1].node.node_id == "table"
+    assert table.text == TABLE
+
+
+def test_least_relevant_nodes_are_dropped(caplog: pytest.LogCaptureFixture):
+    texts = [f"Sentence number {i} about pumps. " * 20 for i in range(5)]
+    nodes = _nodes(*texts)
+    postprocessor = TokenBudgetPostprocessor(max_tokens=count_tokens(texts[0]) * 2 + 5)
+    with caplog.at_level(logging.INFO):
+        packed = postprocessor.postprocess_nodes(list(reversed(nodes)))
+    assert _texts(packed) == texts[:2]
+    assert "Packed 2 of 5 nodes" in caplog.text
+
+
+def test_most_relevant_node_is_truncated_to_fit():
+    nodes = _nodes("word " * 500, "other " * 10)
+    packed = TokenBudgetPostprocessor(max_tokens=50).postprocess_nodes(nodes)
+    assert len(packed) == 1
+    assert _texts(packed)[0].startswith("word word")
+    assert count_tokens(packed[0].node.get_content(MetadataMode.LLM)) <= 50
@@ -0,0 +1,90 @@
+import asyncio
+from pathlib import Path
+
+import pytest
+from llama_index.core.llms import MockLLM
+from llama_index.core.retrievers import BaseRetriever
+from llama_index.core.schema import NodeWithScore, QueryBundle, TextNode
+
+from copilot.ai.retrieval.hybrid import (
+    HybridQueryEngine,
+    HybridRetriever,
+    TermCoverageReranker,
+)
+from copilot.ai.retrieval.keyword_index import KeywordIndex
+
+NODES = {
+    "pump": TextNode(id_="pump", text="Pump PN-4821 delivers 12 Nm of torque."),
+    "pumps": TextNode(id_="pumps", text="Pumps deliver torque to the shaft."),
+    "valve": TextNode(id_="valve", text="Valves regulate the flow of water."),
+}
+
+
+class StaticRetriever(BaseRetriever):
+    """Returns fixed scores, standing in for dense retrieval."""
+
+    def __init__(self, scores: dict[str, float]) -> None:
+        super().__init__()
+        self._scores = scores
+
+    def _retrieve(self, query_bundle: QueryBundle) -> list[NodeWithScore]:
+        return [NodeWithScore(node=NODES[i], score=s) for i, s in self._scores.items()]
+
+
+@pytest.fixture
+def keyword_index(tmp_path: Path) -> KeywordIndex:
+    keyword_index = KeywordIndex(tmp_path / "keywords.sqlite3")
+    keyword_index.add(list(NODES.values()))
+    return keyword_index
+
+
+def test_keyword_matches_are_fused_with_dense_results(keyword_index: KeywordIndex):
+    # Dense retrieval misses the chunk with the part number.
+    dense = StaticRetriever({"pumps": 0.9, "valve": 0.5})
+    retriever = HybridRetriever(dense, keyword_index, similarity_top_k=2)
+    results = retriever.retrieve("Torque of PN-4821?")
+    assert [n.node.node_id for n in results] == ["pump", "pumps"]
+
+
+@pytest.mark.asyncio
+async def test_aretrieve_searches_keywords_in_a_thread(
+    keyword_index: KeywordIndex, mocker
+):
+    to_thread = mocker.spy(asyncio, "to_thread")
+    dense = StaticRetriever({"pumps": 0.9, "valve": 0.5})
+    retriever = HybridRetriever(dense, keyword_index, similarity_top_k=2)
+    results = await retriever.aretrieve("Torque of PN-4821?")
+    assert [n.node.node_id for n in results] == ["pump", "pumps"]
+    assert to_thread.call_args.args[0] == keyword_index.search
+
+
+def test_fusion_weights(keyword_index: KeywordIndex):
+    dense = StaticRetriever({"valve": 0.9, "pumps": 0.1})
+    dense_only = HybridRetriever(dense, keyword_index, similarity_top_k=1, alpha=1.0)
+    assert [n.node.node_id for n in dense_only.retrieve("PN-4821")] == ["valve"]
+    keyword_only = HybridRetriever(dense, keyword_index, similarity_top_k=1, alpha=0)
+    assert [n.node.node_id for n in keyword_only.retrieve("PN-4821")] == ["pump"]
+
+
+def test_reranker_promotes_nodes_with_the_rare_terms(keyword_index: KeywordIndex):
+    reranker = TermCoverageReranker(keyword_index, top_n=1, weight=0.8)
+    nodes = [
+        NodeWithScore(node=NODES["pumps"], score=1.0),
+        NodeWithScore(node=NODES["pump"], score=0.6),
+    ]
+    reranked = reranker.postprocess_nodes(nodes, query_str="torque of PN-4821")
+    assert [n.node.node_id for n in reranked] == ["pump"]
+
+
+@pytest.mark.asyncio
+async def test_query_engine_awaits_the_reranker(keyword_index: KeywordIndex, mocker):
+    to_thread = mocker.spy(asyncio, "to_thread")
+    dense = StaticRetriever({"pumps": 1.0, "pump": 0.6})
+    engine = HybridQueryEngine.from_args(
+        dense,
+        llm=MockLLM(),
+        node_postprocessors=[TermCoverageReranker(keyword_index, top_n=1, weight=0.8)],
+    )
+    nodes = await engine.aretrieve(QueryBundle("torque of PN-4821"))
+    assert [n.node.node_id for n in nodes] == ["pump"]
+    assert to_thread.call_args.args[0] == keyword_index.idf
@@ -0,0 +1,55 @@
+from pathlib import Path
+
+from llama_index.core.schema import TextNode
+
+from copilot.ai.retrieval.keyword_index import KeywordIndex, tokenize
+
+
+def test_tokenize_keeps_identifiers_and_their_parts():
+    assert tokenize("What is the torque of XJ-200.3 in get_settings?") == [
+        "torque",
+        "xj-200.3",
+        "xj",
+        "200",
+        "3",
+        "get_settings",
+        "get",
+        "settings",
+    ]
+
+
+def test_search_ranks_exact_terms_first(tmp_path: Path):
+    index = KeywordIndex(tmp_path / "keywords.sqlite3")
+    index.add(
+        [
+            TextNode(id_="a", text="The pump PN-4821 has a torque of 12 Nm."),
+            TextNode(id_="b", text="Pumps and their torque, pumps and torque."),
+            TextNode(id_="c", text="Unrelated text about valves."),
+        ]
+    )
+    results = index.search("torque of PN-4821", top_k=2)
+    assert [n.node.node_id for n in results] == ["a", "b"]
+    assert results[0].node.get_content() == "The pump PN-4821 has a torque of 12 Nm."
+    assert results[0].score > results[1].score
+
+
+def test_index_is_incremental_and_persisted(tmp_path: Path):
+    index = KeywordIndex(tmp_path / "keywords.sqlite3")
+    index.add([TextNode(id_="a", text="alpha"), TextNode(id_="b", text="beta")])
+    index.add([TextNode(id_="a", text="gamma")])
+    index.delete(["b"])
+    index = KeywordIndex(tmp_path / "keywords.sqlite3")
+    assert len(index) == 1
+    assert index.search("alpha beta", top_k=5) == []
+    assert [n.node.node_id for n in index.search("gamma", top_k=5)] == ["a"]
+
+
+def test_statistics_of_other_processes_are_read(tmp_path: Path):
+    index = KeywordIndex(tmp_path / "keywords.sqlite3")
+    other = KeywordIndex(tmp_path / "keywords.sqlite3")
+    index.add([TextNode(id_="a", text="alpha beta"), TextNode(id_="b", text="beta")])
+    assert len(other) == 2
+    assert other.search("alpha", top_k=1)[0].score == index.search("alpha", 1)[0].score
+    other.delete(["a"])
+    assert len(index) == 1
+    assert index.idf(["beta"]) == other.idf(["beta"])
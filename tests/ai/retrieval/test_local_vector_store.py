@@ -0,0 +1,147 @@
+from pathlib import Path
+
+import numpy as np
+import pytest
+from llama_index.core import StorageContext, VectorStoreIndex
+from llama_index.core.embeddings import MockEmbedding
+from llama_index.core.schema import NodeRelationship, RelatedNodeInfo, TextNode
+from llama_index.core.vector_stores import (
+    MetadataFilter,
+    MetadataFilters,
+    VectorStoreQuery,
+)
+
+from copilot.ai.retrieval.local_vector_store import IVFIndex, LocalVectorStore
+
+
+def _node(node_id: str, embedding: list[float], **metadata) -> TextNode:
+    node = TextNode(
+        id_=node_id, text=f"Text of {node_id}", embedding=embedding, metadata=metadata
+    )
+    node.relationships[NodeRelationship.SOURCE] = RelatedNodeInfo(
+        node_id=metadata.get("doc", "doc")
+    )
+    return node
+
+
+def _query(store: LocalVectorStore, embedding: list[float], k: int = 2, **kwargs):
+    return store.query(
+        VectorStoreQuery(query_embedding=embedding, similarity_top_k=k, **kwargs)
+    )
+
+
+@pytest.fixture
+def store(tmp_path: Path) -> LocalVectorStore:
+    store = LocalVectorStore(tmp_path)
+    store.add(
+        [
+            _node("a", [1.0, 0.0, 0.0], doc="x", kind="text"),
+            _node("b", [0.0, 2.0, 0.0], doc="x", kind="table"),
+            _node("c", [1.0, 1.0, 0.0], doc="y", kind="text"),
+        ]
+    )
+    return store
+
+
+def test_query_returns_nearest_nodes_with_text(store: LocalVectorStore):
+    result = _query(store, [1.0, 0.1, 0.0])
+    assert result.ids == ["a", "c"]
+    assert result.nodes[0].get_content() == "Text of a"
+    assert result.nodes[0].metadata == {"doc": "x", "kind": "text"}
+    assert result.similarities[0] == pytest.approx(1 / np.sqrt(1.01), rel=1e-5)
+
+
+def test_store_is_persisted(store: LocalVectorStore, tmp_path: Path):
+    assert _query(LocalVectorStore(tmp_path), [0.0, 1.0, 0.0], k=1).ids == ["b"]
+
+
+def test_filters_and_deletes(store: LocalVectorStore):
+    filters = MetadataFilters(filters=[MetadataFilter(key="kind", value="text")])
+    assert _query(store, [0.0, 1.0, 0.0], filters=filters).ids == ["c", "a"]
+    assert _query(store, [0.0, 1.0, 0.0], node_ids=["a"]).ids == ["a"]
+    store.delete_nodes(["c"])
+    store.delete("x")
+    assert _query(store, [1.0, 1.0, 0.0]).ids == []
+    assert len(store) == 0
+
+
+def test_adding_a_stored_node_replaces_it(store: LocalVectorStore):
+    store.add([_node("a", [0.0, 0.0, 1.0])])
+    assert len(store) == 3
+    assert _query(store, [0.0, 0.0, 1.0], k=1).ids == ["a"]
+
+
+def test_compaction_keeps_live_nodes(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(2000, 8))
+    store = LocalVectorStore(tmp_path)
+    store.add([_node(str(i), e.tolist()) for i, e in enumerate(embeddings)])
+    store.delete_nodes([str(i) for i in range(0, 2000, 3)] + ["1"])
+    store.delete_nodes([str(i) for i in range(2, 2000, 3)])
+    assert len(store) == 666
+    assert store._embeddings_path(store._epoch).stat().st_size == 666 * 8 * 4
+    # The files from before the compaction are removed.
+    assert not (tmp_path / "embeddings.f32").exists()
+    store = LocalVectorStore(tmp_path)
+    assert _query(store, embeddings[4].tolist(), k=1).ids == ["4"]
+
+
+def test_adds_and_deletes_do_not_reload_the_store(store: LocalVectorStore, mocker):
+    load = mocker.spy(LocalVectorStore, "_load")
+    store.add([_node("d", [0.0, 0.0, 1.0])])
+    store.add([_node("a", [0.0, 1.0, 1.0])])
+    store.delete_nodes(["b"])
+    assert _query(store, [0.0, 1.0, 1.0], k=1).ids == ["a"]
+    load.assert_not_called()
+    assert len(store) == 3
+
+
+def test_changes_of_other_processes_are_read(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(1200, 8))
+    store = LocalVectorStore(tmp_path)
+    other = LocalVectorStore(tmp_path)
+    store.add([_node(str(i), e.tolist()) for i, e in enumerate(embeddings)])
+    assert _query(other, embeddings[7].tolist(), k=1).ids == ["7"]
+    # Compaction renumbers the rows that `other` has loaded.
+    store.delete_nodes([str(i) for i in range(700)])
+    assert _query(other, embeddings[900].tolist(), k=1).ids == ["900"]
+    other.add([_node("new", embeddings[3].tolist())])
+    assert _query(store, embeddings[3].tolist(), k=1).ids == ["new"]
+    assert len(store) == len(other) == 501
+
+
+def test_ivf_index_finds_the_exact_neighbours_of_clustered_data(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    centers = rng.normal(size=(20, 16))
+    embeddings = centers[rng.integers(0, 20, 2000)] + 0.05 * rng.normal(size=(2000, 16))
+    store = LocalVectorStore(tmp_path, ann_threshold=1000, n_probe=4)
+    store.add([_node(str(i), e.tolist()) for i, e in enumerate(embeddings)])
+    assert isinstance(store._ivf, IVFIndex)
+    for i in range(0, 2000, 97):
+        assert _query(store, embeddings[i].tolist(), k=1).ids == [str(i)]
+
+
+def test_rebuilt_ivf_index_is_read_with_its_rows(tmp_path: Path):
+    rng = np.random.default_rng(0)
+    embeddings = rng.normal(size=(2400, 8))
+    store = LocalVectorStore(tmp_path, ann_threshold=500, n_probe=4)
+    other = LocalVectorStore(tmp_path, ann_threshold=500, n_probe=4)
+    store.add([_node(str(i), e.tolist()) for i, e in enumerate(embeddings[:600])])
+    assert _query(other, embeddings[5].tolist(), k=1).ids == ["5"]
+    assert other._ivf is not None and other._ivf.n_rows == 600
+    store.add([_node(str(i), e.tolist()) for i, e in enumerate(embeddings) if i >= 600])
+    assert _query(other, embeddings[2000].tolist(), k=1).ids == ["2000"]
+    assert other._ivf.n_rows == store._ivf.n_rows == 2400  # type: ignore[union-attr]
+
+
+def test_works_as_the_vector_store_of_an_index(tmp_path: Path):
+    store = LocalVectorStore(tmp_path)
+    index = VectorStoreIndex(
+        nodes=[],
+        storage_context=StorageContext.from_defaults(vector_store=store),
+        embed_model=MockEmbedding(embed_dim=8),
+    )
+    index.insert_nodes([TextNode(text="Concept drift"), TextNode(text="Other")])
+    nodes = index.as_retriever(similarity_top_k=2).retrieve("drift")
+    assert sorted(n.get_content() for n in nodes) == ["Concept drift", "Other"]
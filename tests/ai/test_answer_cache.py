@@ -0,0 +1,152 @@
+from types import SimpleNamespace
+
+import pytest
+
+from copilot.ai.answer_cache import AnswerCache, key_terms, normalize_query
+from copilot.tracing import Span, Tracer
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class Versions:
+    def __init__(self) -> None:
+        self.version: str | None = "v1"
+
+    def __call__(self, query: str) -> str | None:
+        return self.version
+
+
+def _compute(answer: str, clock: Clock | None = None, seconds: float = 0.0):
+    calls = []
+
+    async def compute() -> str:
+        calls.append(answer)
+        if clock is not None:
+            clock.now += seconds
+        return answer
+
+    return compute, calls
+
+
+async def _embed(query: str) -> list[float]:
+    # Questions about the same topic point the same way.
+    return [1.0, 0.0] if "drift" in query else [0.0, 1.0]
+
+
+def test_normalize_query():
+    assert normalize_query("  What is  Concept\tDrift?? ") == "what is concept drift"
+
+
+def test_key_terms():
+    assert key_terms("torque of xj-200.3 in get_settings") == {
+        "xj-200.3",
+        "200",
+        "3",
+        "get_settings",
+    }
+
+
+@pytest.mark.asyncio
+async def test_exact_hits_skip_the_tool_and_count_the_time_saved():
+    clock = Clock()
+    cache = AnswerCache({"qa": Versions()}, clock=clock)
+    compute, calls = _compute("answer", clock, seconds=2.0)
+    assert (
+        await cache.get_or_compute("qa", {"query": "What is it?"}, compute) == "answer"
+    )
+    assert (
+        await cache.get_or_compute("qa", {"query": "what is it"}, compute) == "answer"
+    )
+    assert calls == ["answer"]
+    assert cache.stats.exact_hits == 1
+    assert cache.stats.misses == 1
+    assert cache.stats.hit_rate == 0.5
+    assert cache.stats.seconds_saved == 2.0
+
+
+@pytest.mark.asyncio
+async def test_similar_questions_hit():
+    cache = AnswerCache({"qa": Versions()}, embed=_embed)
+    compute, calls = _compute("drift answer")
+    await cache.get_or_compute("qa", {"query": "What is concept drift?"}, compute)
+    answer = await cache.get_or_compute("qa", {"query": "Explain drift"}, compute)
+    assert answer == "drift answer"
+    assert cache.stats.semantic_hits == 1
+    other, other_calls = _compute("other answer")
+    assert await cache.get_or_compute("qa", {"query": "Who wrote it?"}, other) == (
+        "other answer"
+    )
+    assert calls == ["drift answer"] and other_calls == ["other answer"]
+
+
+@pytest.mark.asyncio
+async def test_new_corpus_version_misses():
+    versions = Versions()
+    cache = AnswerCache({"qa": versions}, embed=_embed)
+    await cache.get_or_compute("qa", {"query": "drift?"}, _compute("old")[0])
+    versions.version = "v2"
+    assert await cache.get_or_compute(
+        "qa", {"query": "drift?"}, _compute("new")[0]
+    ) == ("new")
+    versions.version = None
+    compute, calls = _compute("uncached")
+    await cache.get_or_compute("qa", {"query": "drift?"}, compute)
+    await cache.get_or_compute("qa", {"query": "drift?"}, compute)
+    assert len(calls) == 2
+    assert cache.stats.bypasses == 2
+
+
+@pytest.mark.asyncio
+async def test_expired_and_least_recently_used_answers_are_evicted():
+    clock = Clock()
+    cache = AnswerCache({"qa": Versions()}, max_entries=2, ttl=10.0, clock=clock)
+    for query in ["a", "b"]:
+        await cache.get_or_compute("qa", {"query": query}, _compute(query)[0])
+    await cache.get_or_compute("qa", {"query": "a"}, _compute("a")[0])
+    await cache.get_or_compute("qa", {"query": "c"}, _compute("c")[0])
+    assert cache.stats.exact_hits == 1
+    compute, calls = _compute("b again")
+    await cache.get_or_compute("qa", {"query": "b"}, compute)
+    assert calls == ["b again"]
+    clock.now = 11.0
+    compute, calls = _compute("a again")
+    await cache.get_or_compute("qa", {"query": "a"}, compute)
+    assert calls == ["a again"]
+    assert len(cache) == 1
+
+
+@pytest.mark.asyncio
+async def test_similar_questions_about_other_identifiers_miss():
+    async def embed(query: str) -> list[float]:
+        return [1.0, 0.0]
+
+    cache = AnswerCache({"qa": Versions()}, embed=embed)
+    await cache.get_or_compute("qa", {"query": "XJ-200 spec"}, _compute("200")[0])
+    assert await cache.get_or_compute(
+        "qa", {"query": "XJ-300 spec"}, _compute("300")[0]
+    ) == ("300")
+    assert await cache.get_or_compute(
+        "qa", {"query": "the spec of XJ-200"}, _compute("")[0]
+    ) == ("200")
+    assert cache.stats.semantic_hits == 1
+
+
+@pytest.mark.asyncio
+async def test_lookups_are_recorded_on_the_current_span():
+    exported: list[Span] = []
+    tracer = Tracer([SimpleNamespace(export=exported.extend)])
+    cache = AnswerCache({"qa": Versions()})
+    for _ in range(2):
+        with tracer.span("tool qa"):
+            await cache.get_or_compute("qa", {"query": "q"}, _compute("a")[0])
+    assert [span.attributes["answer_cache"] for span in exported] == [
+        "miss",
+        "exact_hit",
+    ]
+    assert [name for name, _ in exported[1].events] == ["answer_cache_exact_hit"]
@@ -0,0 +1,101 @@
+import json
+import typing as t
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from openai.types.beta.threads import RequiredActionFunctionToolCall
+from openai.types.beta.threads.required_action_function_tool_call import Function
+from pytest_mock import MockerFixture
+
+from copilot.ai import assistant_event_handler
+from copilot.ai.assistant_event_handler import EventHandler
+from copilot.ai.openai_.tool_executor import ToolExecutor
+from copilot.ai.tools import TOOL_REGISTRY
+from copilot.ai.tools.progress import report_progress
+from copilot.settings import CopilotSettings
+from copilot.tracing import Tracer
+
+
+def progress_tool(words: t.Annotated[str, "The words to report."]) -> str:
+    """Report every word as progress."""
+    for word in words.split():
+        report_progress(f"{word} ")
+    return "done"
+
+
+class RecordingStep:
+    def __init__(self, name: str, type: str, parent_id: str | None) -> None:
+        self.name = name
+        self.output = ""
+        self.streaming = False
+        self.stream_tokens = 0
+        self.updates = 0
+
+    async def stream_token(self, token: str) -> None:
+        self.streaming = True
+        self.stream_tokens += 1
+        self.output += token
+
+    async def send(self) -> "RecordingStep":
+        return self
+
+    async def update(self) -> None:
+        self.updates += 1
+
+
+def _client() -> MagicMock:
+    stream = MagicMock()
+    stream.text_deltas.__aiter__.return_value = []
+    stream.get_final_run = AsyncMock(return_value=None)
+    client = MagicMock()
+    submit = client.beta.threads.runs.submit_tool_outputs_stream.return_value
+    submit.__aenter__.return_value = stream
+    return client
+
+
+@pytest.fixture(autouse=True)
+def offline(mocker: MockerFixture, monkeypatch: pytest.MonkeyPatch) -> None:
+    monkeypatch.setitem(TOOL_REGISTRY, progress_tool.__name__, progress_tool)
+    settings = CopilotSettings(
+        COPILOT_OPENAI_API_KEY="openai-key",
+        COPILOT_LLAMA_CLOUD_API_KEY="llama-key",
+        COPILOT_PINECONE_API_KEY="pinecone-key",
+        # Only the first token is sent before the tool returns.
+        COPILOT_STREAM_FLUSH_INTERVAL=60,
+    )
+    mocker.patch.object(assistant_event_handler, "get_settings", return_value=settings)
+    mocker.patch.object(assistant_event_handler, "get_tracer", return_value=Tracer())
+    mocker.patch.object(
+        assistant_event_handler,
+        "get_tool_executor",
+        return_value=ToolExecutor(max_workers=1),
+    )
+    mocker.patch("chainlit.Step", RecordingStep)
+    mocker.patch.object(
+        assistant_event_handler.cl, "context", MagicMock(current_run=None)
+    )
+
+
+@pytest.mark.asyncio
+async def test_tool_progress_is_coalesced_into_its_step():
+    tool_call = RequiredActionFunctionToolCall(
+        id="call_1",
+        type="function",
+        function=Function(
+            name="progress_tool", arguments=json.dumps({"words": "one two three"})
+        ),
+    )
+    handler = EventHandler(assistant_name="Copilot", client=_client())
+    await handler.on_tool_call_created(tool_call)
+    run = MagicMock(thread_id="thread_1")
+    run.required_action.submit_tool_outputs.tool_calls = [tool_call]
+    await handler.handle_requires_action(run, "run_1")
+    step = handler.tool_call_steps["call_1"]
+    assert step.output == "one two three "
+    assert step.stream_tokens == 2
+    assert step.updates == 1
+    assert handler.tool_progress == {}
+    submit = handler.client.beta.threads.runs.submit_tool_outputs_stream
+    assert submit.call_args.kwargs["tool_outputs"] == [
+        {"tool_call_id": "call_1", "output": "done"}
+    ]
@@ -0,0 +1,57 @@
+import openai
+import pytest
+
+from copilot.ai.client_registry import ClientRegistry, PoolLimits
+from copilot.settings import CopilotSettings
+
+
+@pytest.fixture
+def settings() -> CopilotSettings:
+    return CopilotSettings(
+        COPILOT_OPENAI_API_KEY="openai-key",
+        COPILOT_LLAMA_CLOUD_API_KEY="llama-key",
+        COPILOT_PINECONE_API_KEY="pinecone-key",
+        COPILOT_OPENAI_BASE_URL="http://127.0.0.1:1/v1",
+        COPILOT_HTTP_MAX_CONNECTIONS=7,
+        COPILOT_HTTP_MAX_KEEPALIVE_CONNECTIONS=3,
+    )
+
+
+def test_pool_limits_from_settings(settings: CopilotSettings):
+    limits = PoolLimits.from_settings(settings)
+    assert limits.max_connections == 7
+    assert limits.max_keepalive_connections == 3
+
+
+@pytest.mark.asyncio
+async def test_clients_are_built_once_and_share_the_pool(settings: CopilotSettings):
+    registry = ClientRegistry(settings)
+    client = registry.async_openai_client
+    assert isinstance(client, openai.AsyncOpenAI)
+    assert registry.async_openai_client is client
+    assert client._client is registry.async_http_client
+    await registry.aclose()
+
+
+@pytest.mark.asyncio
+async def test_llama_parse_does_not_change_the_openai_pool(settings: CopilotSettings):
+    registry = ClientRegistry(settings)
+    openai_http_client = registry.async_openai_client._client
+    headers = dict(openai_http_client.headers)
+    llama_parse_client = registry.llama_parse.aclient
+    assert llama_parse_client is registry.llama_parse_http_client
+    assert llama_parse_client is not openai_http_client
+    assert openai_http_client.headers == headers
+    assert openai_http_client.timeout.read == registry.limits.timeout
+    await registry.aclose()
+    assert llama_parse_client.is_closed
+
+
+@pytest.mark.asyncio
+async def test_closed_registry_refuses_new_clients(settings: CopilotSettings):
+    registry = ClientRegistry(settings)
+    http_client = registry.async_http_client
+    await registry.aclose()
+    assert http_client.is_closed
+    with pytest.raises(RuntimeError):
+        registry.async_openai_client
@@ -0,0 +1,148 @@
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from llama_index.core import Document
+from llama_index.core.schema import TextNode
+from pytest_mock import MockerFixture
+
+from copilot.ai import llama_index_
+from copilot.ai.ingestion.manifest import (
+    IngestionManifest,
+    ManifestEntry,
+    hash_file,
+    source_id,
+)
+from copilot.ai.ingestion.parse_cache import ParseCache
+from copilot.ai.llama_index_ import IndexCache
+from copilot.ai.retrieval.keyword_index import KeywordIndex
+from copilot.kv_store import KVStore
+
+
+def _make_index(name: str) -> MagicMock:
+    index = MagicMock(name=name)
+    index.as_query_engine.side_effect = lambda **_: MagicMock()
+    return index
+
+
+@pytest.fixture
+def index_factory() -> MagicMock:
+    return MagicMock(side_effect=_make_index)
+
+
+@pytest.fixture
+def index_cache(index_factory: MagicMock) -> IndexCache:
+    return IndexCache(index_factory=index_factory, llm_factory=MagicMock())
+
+
+def test_index_is_built_once_per_name(
+    index_cache: IndexCache, index_factory: MagicMock
+):
+    assert index_cache.get_index("a") is index_cache.get_index("a")
+    assert index_cache.get_index("a") is not index_cache.get_index("b")
+    assert index_factory.call_count == 2
+
+
+def test_query_engines_are_keyed_by_index_and_model(index_cache: IndexCache):
+    engine = index_cache.get_query_engine("gpt-4o-mini", "a")
+    assert index_cache.get_query_engine("gpt-4o-mini", "a") is engine
+    assert index_cache.get_query_engine("gpt-4o", "a") is not engine
+    assert index_cache.get_index("a").as_query_engine.call_count == 2
+
+
+def test_invalidate_drops_query_engines_of_one_index(
+    index_cache: IndexCache, index_factory: MagicMock
+):
+    engine_a = index_cache.get_query_engine("gpt-4o", "a")
+    engine_b = index_cache.get_query_engine("gpt-4o", "b")
+    index_cache.invalidate("a")
+    assert index_cache.get_query_engine("gpt-4o", "b") is engine_b
+    assert index_cache.get_query_engine("gpt-4o", "a") is not engine_a
+    assert index_factory.call_count == 2
+    index_cache.invalidate("a", drop_index=True)
+    index_cache.get_index("a")
+    assert index_factory.call_count == 3
+
+
+@pytest.mark.asyncio
+async def test_parse_files_if_needed_skips_ingested_content(
+    tmp_path: Path, mocker: MockerFixture
+):
+    manifest = IngestionManifest(KVStore(tmp_path / "kv.sqlite3"))
+    mocker.patch.object(llama_index_, "get_ingestion_manifest", return_value=manifest)
+    mocker.patch.object(llama_index_, "get_embed_model_name", return_value="embed")
+    parse_cache = ParseCache(tmp_path / "parse_cache")
+    mocker.patch.object(llama_index_, "get_parse_cache", return_value=parse_cache)
+    for name, content in [("a.pdf", b"a"), ("copy-of-a.pdf", b"a"), ("b.pdf", b"b")]:
+        (tmp_path / name).write_bytes(content)
+    manifest.put(
+        ManifestEntry(
+            content_hash=hash_file(tmp_path / "b.pdf"),
+            file_name="b.pdf",
+            embed_model="embed",
+        )
+    )
+    parser = MagicMock()
+    parser.aload_data = AsyncMock(
+        side_effect=lambda path, extra_info: [Document(text=path, metadata=extra_info)]
+    )
+    documents = await llama_index_.parse_files_if_needed(
+        {name: str(tmp_path / name) for name in ["a.pdf", "copy-of-a.pdf", "b.pdf"]},
+        parser,
+    )
+    assert [d.metadata["file_name"] for d in documents] == ["a.pdf"]
+    assert documents[0].metadata["content_hash"] == hash_file(tmp_path / "a.pdf")
+    assert hash_file(tmp_path / "a.pdf") in parse_cache
+
+    # Re-embedding with another model reads the parsed content from the cache.
+    mocker.patch.object(llama_index_, "get_embed_model_name", return_value="other")
+    documents = await llama_index_.parse_files_if_needed(
+        {"a.pdf": str(tmp_path / "a.pdf")}, parser
+    )
+    assert [d.text for d in documents] == [str(tmp_path / "a.pdf")]
+    assert parser.aload_data.await_count == 1
+
+
+def test_uploads_replace_only_the_nodes_of_their_source(
+    tmp_path: Path, mocker: MockerFixture
+):
+    manifest = IngestionManifest(KVStore(tmp_path / "kv.sqlite3"))
+    mocker.patch.object(llama_index_, "get_ingestion_manifest", return_value=manifest)
+    mocker.patch.object(llama_index_, "get_embed_model_name", return_value="embed")
+    mocker.patch.object(
+        llama_index_, "get_parse_cache", return_value=ParseCache(tmp_path)
+    )
+    keyword_index = KeywordIndex(tmp_path / "keywords.sqlite3")
+    mocker.patch.object(llama_index_, "get_keyword_index", return_value=keyword_index)
+    index = MagicMock()
+    alice = source_id("user:alice", "report.pdf")
+    bob = source_id("user:bob", "report.pdf")
+
+    def upload(source: str, text: str) -> TextNode:
+        node = TextNode(
+            text=text, metadata={"file_name": "report.pdf", "content_hash": text}
+        )
+        llama_index_.record_ingested_nodes(index, [node])
+        llama_index_.record_sources(index, {source: text})
+        return node
+
+    old = upload(alice, "old")
+    upload(bob, "other")
+    new = upload(alice, "new")
+    index.delete_nodes.assert_called_once_with([old.node_id])
+    assert "old" not in manifest
+    entry = manifest.get_by_source(alice)
+    assert entry is not None and entry.node_ids == [new.node_id]
+    assert manifest.get_by_source(bob) == manifest.get("other")
+    assert keyword_index.search("old", 1) == []
+    assert [n.node.node_id for n in keyword_index.search("new", 1)] == [new.node_id]
+
+    # Re-embedding a content replaces its nodes and keeps its sources.
+    mocker.patch.object(llama_index_, "get_embed_model_name", return_value="other")
+    reembedded = TextNode(
+        text="new", metadata={"file_name": "report.pdf", "content_hash": "new"}
+    )
+    llama_index_.record_ingested_nodes(index, [reembedded])
+    index.delete_nodes.assert_called_with([new.node_id])
+    entry = manifest.get_by_source(alice)
+    assert entry is not None and entry.node_ids == [reembedded.node_id]
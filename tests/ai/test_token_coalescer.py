@@ -0,0 +1,65 @@
+import asyncio
+
+import pytest
+
+from copilot.ai.token_coalescer import TokenCoalescer
+
+
+class Clock:
+    def __init__(self) -> None:
+        self.now = 0.0
+
+    def __call__(self) -> float:
+        return self.now
+
+
+@pytest.mark.asyncio
+async def test_first_token_is_sent_and_the_rest_is_coalesced():
+    sent: list[str] = []
+
+    async def send(text: str) -> None:
+        sent.append(text)
+
+    clock = Clock()
+    coalescer = TokenCoalescer(send, interval=10, max_chars=100, clock=clock)
+    await coalescer.push("Hello")
+    for token in [",", " wor", "ld"]:
+        await coalescer.push(token)
+    assert sent == ["Hello"]
+    clock.now = 10
+    await coalescer.push("!")
+    assert sent == ["Hello", ", world!"]
+    await coalescer.push("")
+    await coalescer.flush()
+    assert coalescer.sends == 2
+
+
+@pytest.mark.asyncio
+async def test_full_buffer_and_flush_send_right_away():
+    sent: list[str] = []
+
+    async def send(text: str) -> None:
+        sent.append(text)
+
+    coalescer = TokenCoalescer(send, interval=10, max_chars=4, clock=Clock())
+    for token in "abcdefg":
+        await coalescer.push(token)
+    assert sent == ["a", "bcde"]
+    await coalescer.flush()
+    assert sent == ["a", "bcde", "fg"]
+
+
+@pytest.mark.asyncio
+async def test_buffer_is_sent_after_the_interval_without_new_tokens():
+    sent: list[str] = []
+
+    async def send(text: str) -> None:
+        sent.append(text)
+
+    coalescer = TokenCoalescer(send, interval=0.05)
+    await coalescer.push("a")
+    await coalescer.push("b")
+    await coalescer.push("c")
+    assert sent == ["a"]
+    await asyncio.sleep(0.1)
+    assert sent == ["a", "bc"]
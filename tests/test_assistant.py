@@ -11,7 +11,7 @@ from llama_index.core.node_parser import MarkdownElementNodeParser
 from pytest_mock import MockerFixture
 
 from copilot.ai.assistant_event_handler import EventHandler
-from copilot.ai.llama_index_ import load_parser, initialize_llama_index
+from copilot.ai.llama_index_ import IndexCache, load_parser, initialize_llama_index
 from copilot.ai.openai_.clients import create_assistant, get_async_openai_client
 from copilot.resources import RESOURCES_ROOT
 
@@ -117,6 +117,12 @@ class MockStep:
         self.start = None
         self.end = None
         self.language = None
+        self.output = ""
+        self.streaming = False
+
+    async def stream_token(self, token: str) -> None:
+        self.streaming = True
+        self.output += token
 
     async def send(self) -> "MockStep":
         return self
@@ -162,7 +168,10 @@ async def test_assistant(
     mock_chainlit: tuple[type[MockMessage], type[MockStep]],
     mocker: MockerFixture,
 ):
-    mocker.patch("copilot.ai.tools.pdf_qa.load_index", return_value=vector_store)
+    mocker.patch(
+        "copilot.ai.tools.pdf_qa.get_index_cache",
+        return_value=IndexCache(index_factory=lambda _: vector_store),
+    )
     handler = EventHandler(assistant_name="TestCopilot", client=openai_client)
     async with openai_client.beta.threads.runs.stream(
         thread_id=thread_id,
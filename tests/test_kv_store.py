@@ -0,0 +1,78 @@
+import json
+import multiprocessing
+from pathlib import Path
+
+import pytest
+
+from copilot.kv_store import KVStore, Namespace
+
+PROCESSES = 4
+INCREMENTS = 50
+
+
+def _increment(path: Path, worker: int) -> None:
+    counters = Namespace(KVStore(path), "counters")
+    for i in range(INCREMENTS):
+        counters.update("total", lambda total: (total or 0) + 1)
+        counters.put(f"{worker}-{i}", i)
+
+
+def test_values_are_typed_and_persisted(tmp_path: Path):
+    store = KVStore(tmp_path / "kv.sqlite3")
+    settings = Namespace(store, "settings", encode=str, decode=str)
+    entries: Namespace[dict] = Namespace(store, "entries")
+    settings.put("thread", "thread_1")
+    entries.put_many({"a": {"n": 1}, "b": {"n": 2}})
+    entries.delete("a")
+    reloaded = KVStore(tmp_path / "kv.sqlite3")
+    assert Namespace(reloaded, "settings", str, str).get("thread") == "thread_1"
+    assert Namespace(reloaded, "entries").items() == {"b": {"n": 2}}
+    assert Namespace(reloaded, "missing").get("thread") is None
+
+
+def test_cache_sees_writes_of_other_connections(tmp_path: Path):
+    first = Namespace(KVStore(tmp_path / "kv.sqlite3"), "settings")
+    second = Namespace(KVStore(tmp_path / "kv.sqlite3"), "settings")
+    assert first.get("key") is None
+    second.put("key", "value")
+    assert first.get("key") == "value"
+
+
+def test_failed_transactions_are_rolled_back(tmp_path: Path):
+    store = KVStore(tmp_path / "kv.sqlite3")
+    settings = Namespace(store, "settings")
+    settings.put("key", "old")
+    with pytest.raises(RuntimeError):
+        with store.transaction() as transaction:
+            settings.put("key", "new", transaction)
+            raise RuntimeError
+    assert settings.get("key") == "old"
+    assert Namespace(KVStore(tmp_path / "kv.sqlite3"), "settings").get("key") == "old"
+
+
+def test_legacy_json_is_imported_once(tmp_path: Path):
+    legacy_path = tmp_path / "settings.json"
+    legacy_path.write_text(json.dumps({"thread": "old", "assistant_id": "asst"}))
+    settings = Namespace(KVStore(tmp_path / "kv.sqlite3"), "settings", str, str)
+    settings.put("thread", "new")
+    settings.import_json(legacy_path)
+    assert settings.items() == {"thread": "new", "assistant_id": "asst"}
+    assert not legacy_path.exists()
+
+
+def test_concurrent_processes_do_not_lose_updates(tmp_path: Path):
+    path = tmp_path / "kv.sqlite3"
+    KVStore(path)
+    context = multiprocessing.get_context("spawn")
+    processes = [
+        context.Process(target=_increment, args=(path, worker))
+        for worker in range(PROCESSES)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+        assert process.exitcode == 0
+    counters = Namespace(KVStore(path), "counters")
+    assert counters.get("total") == PROCESSES * INCREMENTS
+    assert len(counters) == PROCESSES * INCREMENTS + 1
@@ -0,0 +1,100 @@
+import asyncio
+import typing as t
+from pathlib import Path
+
+import pytest
+
+from copilot.tracing import (
+    NOOP_SPAN,
+    LocalSpanExporter,
+    Span,
+    Tracer,
+    current_span,
+    summarize_traces,
+)
+
+
+class ListExporter:
+    def __init__(self) -> None:
+        self.traces: list[list[Span]] = []
+
+    def export(self, spans: t.Sequence[Span]) -> None:
+        self.traces.append(list(spans))
+
+
+def test_disabled_tracer_records_nothing():
+    tracer = Tracer()
+    with tracer.span("turn", owner="alice") as span:
+        assert span is NOOP_SPAN
+        span.set_attribute("thread_id", "thread_1")
+        assert current_span() is NOOP_SPAN
+    assert NOOP_SPAN.attributes == {}
+
+
+def test_spans_of_a_trace_are_exported_when_its_root_ends():
+    exporter = ListExporter()
+    tracer = Tracer([exporter])
+    with tracer.span("turn", new_trace=True) as turn:
+        first_token = tracer.start_span("time_to_first_token")
+        with tracer.span("run") as run:
+            run.add_event("thread.run.created")
+            first_token.end()
+        assert exporter.traces == []
+    [spans] = exporter.traces
+    assert [span.name for span in spans] == ["time_to_first_token", "run", "turn"]
+    assert {span.trace_id for span in spans} == {turn.trace_id}
+    assert run.parent_id == first_token.parent_id == turn.span_id
+    assert turn.parent_id is None
+    assert run.status == turn.status == "ok"
+    assert [name for name, _ in run.events] == ["thread.run.created"]
+    assert turn.duration >= run.duration > 0
+
+
+def test_errors_and_late_spans():
+    exporter = ListExporter()
+    tracer = Tracer([exporter])
+    with pytest.raises(ValueError):
+        with tracer.span("turn") as turn:
+            late = tracer.start_span("background")
+            raise ValueError("boom")
+    assert turn.status == "error"
+    assert turn.attributes["exception"] == "ValueError('boom')"
+    late.end()
+    late.end()
+    assert [[span.name for span in spans] for spans in exporter.traces] == [
+        ["turn"],
+        ["background"],
+    ]
+
+
+@pytest.mark.asyncio
+async def test_concurrent_tasks_have_their_own_current_span():
+    exporter = ListExporter()
+    tracer = Tracer([exporter])
+
+    async def turn(name: str) -> None:
+        with tracer.span(name, new_trace=True):
+            await asyncio.sleep(0.01)
+            with tracer.span(f"{name}.run"):
+                await asyncio.sleep(0.01)
+
+    await asyncio.gather(turn("a"), turn("b"))
+    assert sorted([span.name for span in spans] for spans in exporter.traces) == [
+        ["a.run", "a"],
+        ["b.run", "b"],
+    ]
+
+
+def test_local_exporter_writes_breakdowns_and_summaries(tmp_path: Path):
+    path = tmp_path / "traces.jsonl"
+    tracer = Tracer([LocalSpanExporter(path)])
+    for _ in range(3):
+        with tracer.span("turn", new_trace=True) as turn:
+            turn.add_event("thread_locked")
+            with tracer.span("run", thread_id="thread_1"):
+                pass
+    summary = summarize_traces(path)
+    assert list(summary) == ["run", "turn", "turn.thread_locked"]
+    assert summary["run"]["count"] == 3
+    assert 0 <= summary["run"]["p50_ms"] <= summary["run"]["p95_ms"]
+    assert summary["run"]["p95_ms"] <= summary["turn"]["max_ms"]